@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from backend.utils.security import verify_admin
+from backend.utils.profiling import profile_store
+from backend.utils.memory import cache_sizes, process_rss, tracemalloc_top
+from backend.utils.rag import rag_system
+from backend.logger import get_logger
+
+logger = get_logger("AdminRoutes")
+router = APIRouter(prefix="/api/admin", tags=["Admin"], dependencies=[Depends(verify_admin)])
+
+@router.get("/profiles")
+async def list_profiles():
+    """List recently recorded request profiles"""
+    return profile_store.list()
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """Get the span tree and CPU samples of a recorded request"""
+    profile = profile_store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+@router.get("/memory")
+def memory_report(
+    tracemalloc_top_n: int = Query(default=0, ge=0, le=200, alias="tracemalloc_top"),
+    tracemalloc_seconds: float = Query(default=5.0, gt=0, le=60)
+):
+    """
+    Report bytes used by the vector store, model and in-process caches
+    
+    A plain def: walking the caches and taking tracemalloc snapshots is
+    CPU-bound, so it runs in the threadpool instead of on the event loop.
+    Unless TRACEMALLOC=1, ``tracemalloc_top`` traces for
+    ``tracemalloc_seconds`` and then stops tracing again.
+    """
+    report = {
+        "process_rss_bytes": process_rss(),
+        "vector_store": rag_system.vector_store.memory_usage(),
+        "caches": cache_sizes()
+    }
+    
+    if tracemalloc_top_n:
+        report["tracemalloc"] = tracemalloc_top(tracemalloc_top_n, tracemalloc_seconds)
+    
+    return report
@@ -1,8 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from backend.models import ChatRequest, ChatResponse
+from fastapi.concurrency import run_in_threadpool
+from backend.models import ChatRequest, ChatResponse, ChatSession, ChatSessionSummary
 from backend.db import Database
 from backend.utils.security import verify_token
 from backend.utils.rag import rag_system
+from backend.utils.admission import llm_admission, AdmissionRejected
+from backend.utils.metrics import timed, MONGO_QUERY_SECONDS
+from backend.utils.responses import MongoJSONResponse, projection
 from backend.logger import get_logger
 from datetime import datetime
 from bson import ObjectId
@@ -19,11 +23,10 @@ async def send_message(
     """Send a message and get RAG-enhanced LLM response"""
     try:
         db = Database.get_db()
-        users_collection = db["users"]
         sessions_collection = db["chat_sessions"]
         
-        # Get user
-        user = users_collection.find_one({"email": user_email})
+        # Get user and health profile in one round-trip
+        user = rag_system.get_user_with_profile(user_email)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -33,10 +36,11 @@ async def send_message(
         
         # Create or get session
         if chat_request.session_id:
-            session = sessions_collection.find_one({
-                "_id": ObjectId(chat_request.session_id),
-                "user_id": user_id_str
-            })
+            with timed(MONGO_QUERY_SECONDS, query="session"):
+                session = sessions_collection.find_one({
+                    "_id": ObjectId(chat_request.session_id),
+                    "user_id": user_id_str
+                })
             if not session:
                 raise HTTPException(status_code=404, detail="Session not found")
             session_id = chat_request.session_id
@@ -50,17 +54,27 @@ async def send_message(
                 "updated_at": datetime.utcnow(),
                 "messages": []
             }
-            sessions_collection.insert_one(session)
+            with timed(MONGO_QUERY_SECONDS, query="session_insert"):
+                sessions_collection.insert_one(session)
         
         # Get conversation history
         conversation_history = session.get("messages", [])
         
-        # CRITICAL: Pass user_id_str for profile lookup
-        assistant_response = rag_system.generate_response(
+        # Turn the request away before retrieval if the LLM queue is full
+        llm_admission.check(user_id_str)
+        
+        # CRITICAL: Pass user_id_str for profile lookup. Runs in the threadpool
+        # so waiting for an LLM slot does not block the event loop
+        timings, turn_status = {}, {}
+        assistant_response = await run_in_threadpool(
+            rag_system.generate_response,
             query=chat_request.message,
             user_id=user_id_str,
             session_id=session_id,
-            conversation_history=conversation_history
+            conversation_history=conversation_history,
+            timings=timings,
+            user=user,
+            status=turn_status
         )
         
         # Save messages
@@ -75,33 +89,44 @@ async def send_message(
             "content": assistant_response,
             "timestamp": datetime.utcnow()
         }
-        
-        sessions_collection.update_one(
-            {"_id": ObjectId(session_id)},
-            {
-                "$push": {
-                    "messages": {"$each": [user_message, assistant_message]}
-                },
-                "$set": {"updated_at": datetime.utcnow()}
-            }
-        )
+        if turn_status.get("degraded"):
+            assistant_message["degraded"] = turn_status["degraded"]
+        
+        with timed(MONGO_QUERY_SECONDS, query="session_update"):
+            sessions_collection.update_one(
+                {"_id": ObjectId(session_id)},
+                {
+                    "$push": {
+                        "messages": {"$each": [user_message, assistant_message]}
+                    },
+                    "$set": {"updated_at": datetime.utcnow()}
+                }
+            )
         
         return ChatResponse(
             response=assistant_response,
-            session_id=session_id
+            session_id=session_id,
+            timings=timings,
+            degraded=turn_status.get("degraded")
         )
         
     except HTTPException:
         raise
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="The assistant is busy, please try again shortly",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
-        logger.error(f"Chat error: {e}")
+        logger.exception(f"Chat error: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
+            detail="Failed to process message"
         )
 
 # Keep the rest of the routes the same...
-@router.get("/sessions", response_model=List[dict])
+@router.get("/sessions", response_model=List[ChatSessionSummary])
 async def get_sessions(user_email: str = Depends(verify_token)):
     """Get all chat sessions for the user"""
     try:
@@ -116,13 +141,10 @@ async def get_sessions(user_email: str = Depends(verify_token)):
         user_id = str(user["_id"])
         sessions = list(sessions_collection.find(
             {"user_id": user_id},
-            {"messages": 0}
+            projection(ChatSessionSummary)
         ).sort("updated_at", -1))
         
-        for session in sessions:
-            session["id"] = str(session.pop("_id"))
-        
-        return sessions
+        return MongoJSONResponse(sessions)
         
     except HTTPException:
         raise
@@ -133,7 +155,7 @@ async def get_sessions(user_email: str = Depends(verify_token)):
             detail="Failed to fetch sessions"
         )
 
-@router.get("/session/{session_id}", response_model=dict)
+@router.get("/session/{session_id}", response_model=ChatSession)
 async def get_session(
     session_id: str,
     user_email: str = Depends(verify_token)
@@ -149,16 +171,16 @@ async def get_session(
             raise HTTPException(status_code=404, detail="User not found")
         
         user_id = str(user["_id"])
-        session = sessions_collection.find_one({
-            "_id": ObjectId(session_id),
-            "user_id": user_id
-        })
+        session = sessions_collection.find_one(
+            {"_id": ObjectId(session_id), "user_id": user_id},
+            projection(ChatSession)
+        )
         
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        session["id"] = str(session.pop("_id"))
-        return session
+        # History is the largest payload; render the document with orjson
+        return MongoJSONResponse(session)
         
     except HTTPException:
         raise
@@ -0,0 +1,234 @@
+"""
+Chat over a WebSocket.
+
+The REST endpoint looks up the user, profile and session on every turn. A
+socket authenticates once, loads the user with their profile once, and keeps
+the current session's recent messages in connection state, so a turn in an
+ongoing conversation costs one database write.
+
+Protocol (JSON text frames):
+
+    client  {"type": "auth", "token": "<JWT>"}                 first frame
+    server  {"type": "ready", "username": "..."}
+    client  {"type": "message", "message": "...", "session_id": "..."}
+    server  {"type": "start", "session_id": "..."}
+    server  {"type": "delta", "text": "..."}                     repeated
+    server  {"type": "done", "session_id": "...", "timings": {...}, "degraded": null}
+    server  {"type": "error", "detail": "...", "retry_after": 3}
+
+A message without session_id starts a new session. The profile is read when
+the socket connects; reconnect to pick up profile changes. The token's
+expiry is checked on every incoming frame: once it has passed the socket is
+closed with code 4401 and the client reconnects with a fresh token.
+"""
+import os
+import time
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
+from backend.db import Database
+from backend.utils.security import decode_token
+from backend.utils.rag import rag_system, HISTORY_MESSAGES
+from backend.utils.admission import llm_admission, AdmissionRejected
+from backend.utils.metrics import timed, MONGO_QUERY_SECONDS, CHAT_WS_CONNECTIONS, CHAT_WS_TURNS
+from backend.logger import get_logger
+
+logger = get_logger("ChatWS")
+router = APIRouter(prefix="/api/chat", tags=["Chat"])
+
+# Seconds a new socket has to send its auth frame
+AUTH_TIMEOUT = float(os.getenv("CHAT_WS_AUTH_TIMEOUT", 10))
+
+# Close code sent when the token used to authenticate has expired
+WS_TOKEN_EXPIRED = 4401
+
+
+class ChatConnection:
+    def __init__(self, websocket: WebSocket, user: Dict, expires_at: Optional[float] = None):
+        """
+        State of one authenticated chat socket
+
+        Args:
+            websocket: Accepted socket
+            user: User document with its profile (see get_user_with_profile)
+            expires_at: Unix time the auth token expires (None = never)
+        """
+        self.websocket = websocket
+        self.user = user
+        self.expires_at = expires_at
+        self.user_id = str(user["_id"])
+        self.session_id: Optional[str] = None
+        # Last HISTORY_MESSAGES messages of the current session
+        self.history: List[Dict] = []
+
+    def load_session(self, session_id: str) -> bool:
+        """
+        Switch to an existing session, reading only its recent messages
+
+        Returns:
+            False if the session does not exist or belongs to another user
+        """
+        if not ObjectId.is_valid(session_id):
+            return False
+        db = Database.get_db()
+        with timed(MONGO_QUERY_SECONDS, query="session"):
+            session = db["chat_sessions"].find_one(
+                {"_id": ObjectId(session_id), "user_id": self.user_id},
+                {"messages": {"$slice": -HISTORY_MESSAGES}}
+            )
+        if not session:
+            return False
+        self.session_id = session_id
+        self.history = session.get("messages", [])
+        return True
+
+    def save_turn(self, query: str, response: str, degraded: Optional[str]):
+        """Append a turn to the session in one write, creating the session if new"""
+        now = datetime.utcnow()
+        user_message = {"role": "user", "content": query, "timestamp": now}
+        assistant_message = {"role": "assistant", "content": response, "timestamp": now}
+        if degraded:
+            assistant_message["degraded"] = degraded
+
+        db = Database.get_db()
+        with timed(MONGO_QUERY_SECONDS, query="session_upsert"):
+            db["chat_sessions"].update_one(
+                {"_id": ObjectId(self.session_id), "user_id": self.user_id},
+                {
+                    "$push": {"messages": {"$each": [user_message, assistant_message]}},
+                    "$set": {"updated_at": now},
+                    "$setOnInsert": {"title": query[:50], "created_at": now}
+                },
+                upsert=True
+            )
+        self.history = (self.history + [user_message, assistant_message])[-HISTORY_MESSAGES:]
+
+    def token_expired(self) -> bool:
+        return self.expires_at is not None and time.time() >= self.expires_at
+
+    async def send(self, payload: Dict):
+        await self.websocket.send_json(payload)
+
+    async def handle_message(self, query: str, session_id: Optional[str]):
+        """Answer one message, streaming the response"""
+        if session_id is None:
+            self.session_id, self.history = str(ObjectId()), []
+        elif session_id != self.session_id:
+            if not await run_in_threadpool(self.load_session, session_id):
+                await self.send({"type": "error", "detail": "Session not found"})
+                return
+
+        try:
+            # Turn the message away before retrieval if the LLM queue is full
+            llm_admission.check(self.user_id)
+            await self.send({"type": "start", "session_id": self.session_id})
+
+            timings, turn_status, parts = {}, {}, []
+            deltas = rag_system.stream_response(
+                query=query,
+                user_id=self.user_id,
+                session_id=self.session_id,
+                conversation_history=self.history,
+                timings=timings,
+                user=self.user,
+                status=turn_status
+            )
+            try:
+                async for delta in iterate_in_threadpool(deltas):
+                    parts.append(delta)
+                    await self.send({"type": "delta", "text": delta})
+            finally:
+                # Releases the LLM slot if the client went away mid-stream
+                await run_in_threadpool(deltas.close)
+
+            degraded = turn_status.get("degraded")
+            await run_in_threadpool(self.save_turn, query, "".join(parts), degraded)
+            await self.send({
+                "type": "done",
+                "session_id": self.session_id,
+                "timings": timings,
+                "degraded": degraded
+            })
+            CHAT_WS_TURNS.labels(outcome="degraded" if degraded else "ok").inc()
+
+        except AdmissionRejected as e:
+            CHAT_WS_TURNS.labels(outcome="rejected").inc()
+            await self.send({
+                "type": "error",
+                "detail": "The assistant is busy, please try again shortly",
+                "retry_after": e.retry_after
+            })
+        except WebSocketDisconnect:
+            raise
+        except Exception as e:
+            CHAT_WS_TURNS.labels(outcome="error").inc()
+            logger.exception(f"WebSocket chat error: {e}")
+            await self.send({"type": "error", "detail": "Failed to process message"})
+
+
+async def authenticate(websocket: WebSocket) -> Tuple[Optional[Dict], Optional[float]]:
+    """
+    Read the auth frame and load the user
+
+    Returns:
+        The user (None if authentication failed) and the token's expiry
+    """
+    try:
+        frame = await asyncio.wait_for(websocket.receive_json(), AUTH_TIMEOUT)
+    except (asyncio.TimeoutError, ValueError, KeyError):
+        return None, None
+    if not isinstance(frame, dict) or frame.get("type") != "auth":
+        return None, None
+
+    claims = decode_token(str(frame.get("token", "")))
+    if not claims or not claims.get("sub"):
+        return None, None
+    expires_at = claims.get("exp")
+    user = await run_in_threadpool(rag_system.get_user_with_profile, claims["sub"])
+    return user, float(expires_at) if expires_at is not None else None
+
+
+@router.websocket("/ws")
+async def chat_socket(websocket: WebSocket):
+    """Chat session over a WebSocket, authenticated once per connection"""
+    await websocket.accept()
+    user, expires_at = await authenticate(websocket)
+    if not user:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Could not validate credentials")
+        return
+
+    connection = ChatConnection(websocket, user, expires_at)
+    CHAT_WS_CONNECTIONS.inc()
+    try:
+        await connection.send({"type": "ready", "username": user.get("username", "")})
+        while True:
+            try:
+                frame = await websocket.receive_json()
+            except (ValueError, KeyError):
+                frame = None
+
+            if connection.token_expired():
+                await websocket.close(code=WS_TOKEN_EXPIRED, reason="Token expired")
+                break
+            if frame is None:
+                await connection.send({"type": "error", "detail": "Frames must be JSON text"})
+                continue
+
+            if not isinstance(frame, dict) or frame.get("type") != "message":
+                await connection.send({"type": "error", "detail": "Expected a message frame"})
+                continue
+            message = frame.get("message")
+            if not isinstance(message, str) or not message.strip():
+                await connection.send({"type": "error", "detail": "Message is empty"})
+                continue
+
+            session_id = frame.get("session_id")
+            await connection.handle_message(message, str(session_id) if session_id else None)
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        CHAT_WS_CONNECTIONS.dec()
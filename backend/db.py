@@ -1,22 +1,35 @@
 from pymongo import MongoClient
 from pymongo.server_api import ServerApi
 import os
+import threading
 from backend.logger import get_logger
 
 logger = get_logger("Database")
 
 class Database:
     _db = None
+    _lock = threading.Lock()
 
     @classmethod
     def get_db(cls):
-        if cls._db is None:
+        if cls._db is not None:
+            return cls._db
+
+        # Chat stages call this from several threads at once
+        with cls._lock:
+            if cls._db is not None:
+                return cls._db
             try:
                 uri = os.getenv("MONGO_URI")
                 logger.info("Connecting to MongoDB")
 
-                client = MongoClient(uri, server_api=ServerApi("1"))
-                client.admin.command("ping")
+                if uri and uri.startswith("mongomock://"):
+                    # In-process stand-in used by the benchmark harness
+                    import mongomock
+                    client = mongomock.MongoClient()
+                else:
+                    client = MongoClient(uri, server_api=ServerApi("1"))
+                    client.admin.command("ping")
 
                 cls._db = client[os.getenv("MONGO_DB_NAME")]
                 logger.info("MongoDB connection successful")
@@ -1,35 +1,205 @@
-import logging
+"""
+Application logging.
+
+Loggers hand records to an in-memory queue; a single background
+QueueListener formats and writes them to stdout, so request threads never
+block on stdout. Messages use %-style arguments and are only formatted on
+the listener thread.
+
+    LOG_FORMAT=json            one JSON object per line (default)
+    LOG_FORMAT=text            the previous human-readable format
+    LOG_LEVEL=INFO
+    LOG_SAMPLE_RATES=chat.turn=0.1,retrieval=0.01
+
+Hot-path logs pass a category (``extra={"category": "chat.turn"}``). Every
+record is kept unless the category is listed in LOG_SAMPLE_RATES; INFO and
+DEBUG records in a listed category are then kept with its probability.
+Warnings and errors are never sampled. An invalid LOG_LEVEL or rate is
+reported as a warning and ignored rather than failing at import.
+"""
+import os
 import sys
-from datetime import datetime
+import json
+import math
+import atexit
+import queue
+import random
+import logging
+import threading
+from typing import List, Optional
+from logging.handlers import QueueHandler, QueueListener
+
+DEFAULT_LEVEL = "INFO"
+
+# Categories without a configured rate keep every record
+DEFAULT_SAMPLE_RATES = {}
+
+# Attributes every LogRecord has; anything else was passed via ``extra``
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_queue_handler = None
+_listener = None
+_console_handler = None
+_level = DEFAULT_LEVEL
+_setup_lock = threading.Lock()
+
+
+def parse_sample_rates(value: str, errors: Optional[List[str]] = None) -> dict:
+    """
+    Parse LOG_SAMPLE_RATES
+
+    Args:
+        value: Comma separated category=rate pairs
+        errors: Collects a message for each entry that was skipped
+
+    Returns:
+        Mapping of category to keep probability
+    """
+    rates = dict(DEFAULT_SAMPLE_RATES)
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        category, _, rate = item.partition("=")
+        try:
+            rate = float(rate)
+        except ValueError:
+            rate = math.nan
+        if not category.strip() or math.isnan(rate):
+            if errors is not None:
+                errors.append(f"Ignoring invalid LOG_SAMPLE_RATES entry {item!r}")
+            continue
+        rates[category.strip()] = max(0.0, min(1.0, rate))
+    return rates
+
+
+def parse_level(value: str, errors: Optional[List[str]] = None) -> str:
+    """
+    Parse LOG_LEVEL
+
+    Args:
+        value: Level name such as INFO or DEBUG
+        errors: Collects a message if the level is unknown
+
+    Returns:
+        The level name, or DEFAULT_LEVEL if it is unknown
+    """
+    level = value.strip().upper()
+    if isinstance(logging.getLevelName(level), int):
+        return level
+    if errors is not None:
+        errors.append(f"Unknown LOG_LEVEL {value!r}, using {DEFAULT_LEVEL}")
+    return DEFAULT_LEVEL
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates: dict):
+        """
+        Drop a fraction of low-severity records per category
+
+        Args:
+            rates: Mapping of category to keep probability
+        """
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(getattr(record, "category", None), 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _LazyQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue is in-process, so the record is passed as-is and message
+        # formatting is left to the listener thread
+        return record
+
+
+def _setup() -> QueueHandler:
+    """Create the shared queue handler and start the listener once"""
+    global _queue_handler, _listener, _level, _console_handler
+
+    with _setup_lock:
+        if _queue_handler is not None:
+            return _queue_handler
+
+        console_handler = _console_handler = logging.StreamHandler(sys.stdout)
+        if os.getenv("LOG_FORMAT", "json") == "text":
+            console_handler.setFormatter(logging.Formatter(
+                '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                datefmt='%Y-%m-%d %H:%M:%S'
+            ))
+        else:
+            console_handler.setFormatter(JSONFormatter())
+
+        errors = []
+        _level = parse_level(os.getenv("LOG_LEVEL", DEFAULT_LEVEL), errors)
+        rates = parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""), errors)
+
+        log_queue = queue.SimpleQueue()
+        _queue_handler = _LazyQueueHandler(log_queue)
+        _queue_handler.addFilter(SamplingFilter(rates))
+
+        _listener = QueueListener(log_queue, console_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        for message in errors:
+            _queue_handler.handle(logging.makeLogRecord({
+                "name": "Logger",
+                "msg": message,
+                "levelno": logging.WARNING,
+                "levelname": "WARNING"
+            }))
+
+        return _queue_handler
+
 
 def get_logger(name: str) -> logging.Logger:
     """
     Create and configure a logger instance
-    
+
     Args:
         name: Name of the logger
-        
+
     Returns:
         Configured logger instance
     """
     logger = logging.getLogger(name)
-    
-   
+
     if logger.handlers:
         return logger
-    
-    logger.setLevel(logging.INFO)
-    
-   
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
-    
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    console_handler.setFormatter(formatter)
-    
-    logger.addHandler(console_handler)
-    
-    return logger
\ No newline at end of file
+
+    handler = _setup()
+    logger.setLevel(_level)
+    logger.addHandler(handler)
+
+    return logger
+
+
+def set_stream(stream):
+    """
+    Write log output to another stream, e.g. sys.stderr in scripts that
+    print machine-readable output to stdout
+
+    Args:
+        stream: File-like object with write() and flush()
+    """
+    _setup()
+    _console_handler.setStream(stream)
@@ -2,20 +2,27 @@ import warnings
 warnings.filterwarnings("ignore")
 
 import os
+import time
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 
 from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse, RedirectResponse, Response
+from starlette.routing import Match
 from dotenv import load_dotenv
 
 from backend.auth import router as auth_router
 from backend.chat import router as chat_router
+from backend.chat_ws import router as chat_ws_router
 from backend.pdf_routes import router as pdf_router
 from backend.profile_routes import router as profile_router  # ADD THIS
+from backend.admin_routes import router as admin_router
+from backend.utils.metrics import HTTP_REQUEST_SECONDS, render_metrics
+from backend.utils.profiling import RequestProfile, profiling_mode, profile_store
+from backend.utils.static_assets import StaticAssets, PageCache, NegotiatedGZipMiddleware
+from backend.utils.memory import register_cache
 from backend.logger import get_logger
 
 # Load environment variables
@@ -29,7 +36,8 @@ app = FastAPI(
     description="AI-powered healthcare chatbot with RAG and PDF support",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -41,17 +49,82 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="frontend/static"), name="static")
+# Compress dynamic responses above a size threshold when the client accepts
+# gzip (q > 0); precompressed static assets and pages already carry
+# Content-Encoding and pass through untouched
+app.add_middleware(
+    NegotiatedGZipMiddleware,
+    minimum_size=int(os.getenv("GZIP_MIN_SIZE", 1024)),
+    compresslevel=int(os.getenv("GZIP_LEVEL", 6))
+)
 
-# Templates
+def route_template(request: Request) -> str:
+    """Path template of the matched route, keeps metric labels bounded"""
+    for route in app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", request.url.path)
+    return "unmatched"
+
+@app.middleware("http")
+async def record_request_time(request: Request, call_next):
+    """Record total request time per route template"""
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        HTTP_REQUEST_SECONDS.labels(
+            method=request.method,
+            route=route_template(request),
+            status=str(status_code)
+        ).observe(time.perf_counter() - start)
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """Record a span tree for admin-requested or sampled requests"""
+    mode = profiling_mode(request.headers, os.getenv("ADMIN_TOKEN"))
+    if mode is None:
+        return await call_next(request)
+
+    profile = RequestProfile(f"{request.method} {request.url.path}", cpu=(mode == "cpu"))
+    profile.start()
+    try:
+        response = await call_next(request)
+    finally:
+        profile.finish()
+        profile_store.add(profile)
+
+    response.headers["X-Profile-Id"] = profile.id
+    response.headers["Server-Timing"] = profile.server_timing()
+    return response
+
+# Static files are hashed and precompressed once, then served from memory
+static_assets = StaticAssets("frontend/static")
+app.mount("/static", static_assets, name="static")
+
+# Templates link assets through static_url() to get the hashed names
 templates = Jinja2Templates(directory="frontend/templates")
+templates.env.globals["static_url"] = static_assets.url
+
+# Pages do not depend on the request, so render them once
+pages = PageCache(templates, {
+    "signin": "signin.html",
+    "signup": "signup.html",
+    "chat": "chat.html",
+    "profile": "profile.html"
+})
+register_cache("static_assets", lambda: static_assets.nbytes())
 
 # Include routers
 app.include_router(auth_router)
 app.include_router(chat_router)
+app.include_router(chat_ws_router)
 app.include_router(pdf_router)
 app.include_router(profile_router)  # ADD THIS
+app.include_router(admin_router)
 
 # Frontend routes
 @app.get("/")
@@ -62,23 +135,23 @@ async def root():
 @app.get("/signin")
 async def signin_page(request: Request):
     """Render signin page"""
-    return templates.TemplateResponse("signin.html", {"request": request})
+    return pages.response("signin", request.headers)
 
 @app.get("/signup")
 async def signup_page(request: Request):
     """Render signup page"""
-    return templates.TemplateResponse("signup.html", {"request": request})
+    return pages.response("signup", request.headers)
 
 @app.get("/chat")
 async def chat_page(request: Request):
     """Render chat page"""
-    return templates.TemplateResponse("chat.html", {"request": request})
+    return pages.response("chat", request.headers)
 
 # ADD THIS PROFILE ROUTE
 @app.get("/profile")
 async def profile_page(request: Request):
     """Render profile page"""
-    return templates.TemplateResponse("profile.html", {"request": request})
+    return pages.response("profile", request.headers)
 
 @app.get("/health")
 async def health_check():
@@ -88,6 +161,12 @@ async def health_check():
         "environment": "docker" if os.path.exists("/.dockerenv") else "local"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics endpoint"""
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
 @app.on_event("startup")
 async def startup_event():
     """Run on application startup"""
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 class UserSignUp(BaseModel):
@@ -28,6 +28,7 @@ class ChatMessage(BaseModel):
     role: str 
     content: str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
+    degraded: Optional[str] = None
 
 class ChatRequest(BaseModel):
     message: str
@@ -36,11 +37,24 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str
     session_id: str
+    timings: Optional[Dict[str, float]] = None
+    # Set when the LLM was unavailable: cache, documents or status
+    degraded: Optional[str] = None
 
-class ChatSession(BaseModel):
+class ChatSessionSummary(BaseModel):
     id: str
     user_id: str
     title: str
     created_at: datetime
     updated_at: datetime
-    messages: List[ChatMessage] = []
\ No newline at end of file
+
+class ChatSession(ChatSessionSummary):
+    messages: List[ChatMessage] = []
+
+class DocumentInfo(BaseModel):
+    id: str
+    filename: str
+    chunks_count: int
+    uploaded_at: datetime
+    # pending, ready or failed; None for documents without a summary
+    summary_status: Optional[str] = None
\ No newline at end of file
@@ -1,26 +1,131 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from typing import BinaryIO, Dict, List, Optional, Tuple
 import os
+import zlib
 import shutil
+import zipfile
 from backend.db import Database
 from backend.utils.security import verify_token
+from backend.models import DocumentInfo
+from backend.utils.responses import MongoJSONResponse, projection
 from backend.utils.pdf_processor import PDFProcessor
 from backend.utils.rag import rag_system
+from backend.utils.summaries import SUMMARY_ENABLED, RETRY_AFTER as SUMMARY_RETRY_AFTER
+from backend.utils.metrics import INGESTION_JOBS
 from backend.logger import get_logger
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
 
 logger = get_logger("PDFRoutes")
 router = APIRouter(prefix="/api/pdf", tags=["PDF Management"])
 
-pdf_processor = PDFProcessor()
+pdf_processor = PDFProcessor(upload_dir=os.getenv("DOCUMENTS_DIR", "backend/documents"))
+
+BULK_MAX_FILES = int(os.getenv("BULK_UPLOAD_MAX_FILES", 100))
+BULK_MAX_FILE_BYTES = int(os.getenv("BULK_UPLOAD_MAX_FILE_MB", 50)) * 1024 * 1024
+BULK_MAX_TOTAL_BYTES = int(os.getenv("BULK_UPLOAD_MAX_TOTAL_MB", 500)) * 1024 * 1024
+BULK_EMBED_BATCH_SIZE = int(os.getenv("BULK_EMBED_BATCH_SIZE", 128))
+
+COPY_BLOCK_BYTES = 1024 * 1024
+
+class UploadTooLarge(Exception):
+    pass
+
+def save_bulk_uploads(files: List[UploadFile], user_id: str) -> Tuple[Dict[str, str], List[Dict]]:
+    """
+    Write uploaded PDFs and the PDFs inside uploaded zips to the upload dir
+    
+    Bytes are counted while they are written, so a zip member's declared
+    size is not trusted: a member is dropped once it passes
+    BULK_MAX_FILE_BYTES, and every file is dropped once the batch passes
+    BULK_MAX_TOTAL_BYTES. A file that fails mid-copy is deleted, and if
+    anything unexpected goes wrong every file written so far is deleted.
+    
+    Args:
+        files: Uploaded PDF or zip files
+        user_id: Owner of the files
+        
+    Returns:
+        (filename -> saved path, list of rejected files with the reason)
+    """
+    saved, failed = {}, []
+    total_bytes = 0
+    
+    def copy(stream: BinaryIO, buffer: BinaryIO, max_bytes: Optional[int]):
+        nonlocal total_bytes
+        size = 0
+        while block := stream.read(COPY_BLOCK_BYTES):
+            size += len(block)
+            total_bytes += len(block)
+            if max_bytes is not None and size > max_bytes:
+                raise UploadTooLarge("File too large")
+            if total_bytes > BULK_MAX_TOTAL_BYTES:
+                raise UploadTooLarge(f"Batch size limit of {BULK_MAX_TOTAL_BYTES // (1024 * 1024)} MB reached")
+            buffer.write(block)
+    
+    def save(filename: str, stream: BinaryIO, max_bytes: Optional[int] = None):
+        if filename in saved:
+            failed.append({"filename": filename, "error": "Duplicate filename in batch"})
+        elif len(saved) >= BULK_MAX_FILES:
+            failed.append({"filename": filename, "error": f"Batch limit of {BULK_MAX_FILES} files reached"})
+        else:
+            file_path = os.path.join(pdf_processor.upload_dir, f"{user_id}_{filename}")
+            try:
+                with open(file_path, "wb") as buffer:
+                    copy(stream, buffer, max_bytes)
+            except UploadTooLarge as e:
+                os.remove(file_path)
+                failed.append({"filename": filename, "error": str(e)})
+            except (zipfile.BadZipFile, zlib.error, EOFError):
+                # Corrupt member, e.g. a CRC mismatch found at the end of the copy
+                os.remove(file_path)
+                failed.append({"filename": filename, "error": "Corrupt archive member"})
+            except BaseException:
+                os.remove(file_path)
+                raise
+            else:
+                saved[filename] = file_path
+    
+    try:
+        for upload in files:
+            name = os.path.basename(upload.filename or "")
+            
+            if name.lower().endswith(".pdf"):
+                save(name, upload.file)
+            elif name.lower().endswith(".zip"):
+                try:
+                    with zipfile.ZipFile(upload.file) as archive:
+                        for member in archive.infolist():
+                            # Flatten paths so members cannot escape the upload dir
+                            member_name = os.path.basename(member.filename)
+                            if member.is_dir() or not member_name.lower().endswith(".pdf"):
+                                continue
+                            # Cheap early rejection; the copy enforces the real limit
+                            if member.file_size > BULK_MAX_FILE_BYTES:
+                                failed.append({"filename": member_name, "error": "File too large"})
+                                continue
+                            with archive.open(member) as stream:
+                                save(member_name, stream, BULK_MAX_FILE_BYTES)
+                except zipfile.BadZipFile:
+                    failed.append({"filename": name, "error": "Invalid zip archive"})
+            else:
+                failed.append({"filename": name, "error": "Only PDF and zip files are allowed"})
+    except BaseException:
+        for file_path in saved.values():
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        raise
+    
+    return saved, failed
 
 @router.post("/upload")
 async def upload_pdf(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     user_email: str = Depends(verify_token)
 ):
-    """Upload and process a PDF file"""
+    """Upload and process a PDF file, then summarize it in the background"""
     try:
         # Validate file type
         if not file.filename.endswith('.pdf'):
@@ -59,8 +164,17 @@ async def upload_pdf(
             "chunks_count": len(chunks),
             "uploaded_at": datetime.utcnow()
         }
+        if SUMMARY_ENABLED and chunks:
+            pdf_metadata["summary_status"] = "pending"
+            pdf_metadata["summary_queued_at"] = pdf_metadata["uploaded_at"]
         
-        db["pdf_documents"].insert_one(pdf_metadata)
+        result = db["pdf_documents"].insert_one(pdf_metadata)
+        INGESTION_JOBS.labels(status="success").inc()
+        
+        if SUMMARY_ENABLED and chunks:
+            background_tasks.add_task(
+                rag_system.summarizer.summarize_document, result.inserted_id, file.filename, chunks
+            )
         
         return {
             "message": "PDF uploaded and processed successfully",
@@ -71,13 +185,102 @@ async def upload_pdf(
     except HTTPException:
         raise
     except Exception as e:
+        INGESTION_JOBS.labels(status="failed").inc()
         logger.error(f"PDF upload error: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to process PDF: {str(e)}"
         )
 
-@router.get("/documents")
+@router.post("/upload/bulk")
+async def upload_pdfs_bulk(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    user_email: str = Depends(verify_token)
+):
+    """
+    Upload several PDFs, or zip archives of PDFs, in one request
+    
+    Text is extracted in parallel worker processes, all chunks are embedded
+    in one batched encode, and the index and document metadata are written
+    once for the whole batch. Summaries are built in the background.
+    """
+    saved: Dict[str, str] = {}
+    try:
+        db = Database.get_db()
+        users_collection = db["users"]
+        user = users_collection.find_one({"email": user_email})
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        
+        user_id = str(user["_id"])
+        
+        saved, failed = await run_in_threadpool(save_bulk_uploads, files, user_id)
+        if not saved:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"message": "No PDF files to process", "failed": failed}
+            )
+        
+        logger.info(f"Bulk upload of {len(saved)} PDFs for user {user_email}")
+        
+        # Extract and chunk in parallel
+        results = await run_in_threadpool(pdf_processor.process_many, list(saved.values()))
+        
+        all_chunks, processed, chunks_by_file = [], [], {}
+        for filename, (file_path, chunks) in zip(saved, results):
+            if isinstance(chunks, str):
+                INGESTION_JOBS.labels(status="failed").inc()
+                failed.append({"filename": filename, "error": chunks})
+                os.remove(file_path)
+                continue
+            all_chunks.extend(chunks)
+            chunks_by_file[filename] = chunks
+            processed.append({"filename": filename, "file_path": file_path, "chunks_count": len(chunks)})
+        
+        if processed:
+            # One encode and one index write for the whole batch
+            await run_in_threadpool(
+                rag_system.vector_store.add_documents, all_chunks, user_id, BULK_EMBED_BATCH_SIZE
+            )
+            
+            uploaded_at = datetime.utcnow()
+            records = [
+                {"user_id": user_id, "uploaded_at": uploaded_at, **doc}
+                for doc in processed
+            ]
+            summarized = [record for record in records if SUMMARY_ENABLED and record["chunks_count"]]
+            for record in summarized:
+                record["summary_status"] = "pending"
+                record["summary_queued_at"] = uploaded_at
+            # insert_many sets _id on each record
+            db["pdf_documents"].insert_many(records)
+            INGESTION_JOBS.labels(status="success").inc(len(processed))
+            
+            if summarized:
+                background_tasks.add_task(rag_system.summarizer.summarize_documents, summarized, chunks_by_file)
+        
+        return {
+            "message": f"Processed {len(processed)} of {len(processed) + len(failed)} files",
+            "files": [{"filename": doc["filename"], "chunks_count": doc["chunks_count"]} for doc in processed],
+            "failed": failed,
+            "chunks_count": len(all_chunks)
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        for file_path in saved.values():
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        INGESTION_JOBS.labels(status="failed").inc()
+        logger.error(f"Bulk upload error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to process uploaded files"
+        )
+
+@router.get("/documents", response_model=List[DocumentInfo])
 async def get_user_documents(user_email: str = Depends(verify_token)):
     """Get list of uploaded PDFs for user"""
     try:
@@ -91,14 +294,10 @@ async def get_user_documents(user_email: str = Depends(verify_token)):
         
         documents = list(db["pdf_documents"].find(
             {"user_id": user_id},
-            {"_id": 1, "filename": 1, "chunks_count": 1, "uploaded_at": 1}
+            projection(DocumentInfo)
         ).sort("uploaded_at", -1))
         
-        # Convert ObjectId to string
-        for doc in documents:
-            doc["id"] = str(doc.pop("_id"))
-        
-        return documents
+        return MongoJSONResponse(documents)
         
     except HTTPException:
         raise
@@ -109,6 +308,76 @@ async def get_user_documents(user_email: str = Depends(verify_token)):
             detail="Failed to fetch documents"
         )
 
+@router.post("/document/{document_id}/summary")
+async def retry_document_summary(
+    document_id: str,
+    background_tasks: BackgroundTasks,
+    user_email: str = Depends(verify_token)
+):
+    """
+    Queue a document's summary again
+    
+    Allowed when the last attempt failed, when it has been pending for
+    SUMMARY_RETRY_AFTER seconds (the job was lost, e.g. in a restart), or
+    when the document was uploaded before summaries were enabled.
+    """
+    if not SUMMARY_ENABLED:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Summaries are disabled")
+    if not ObjectId.is_valid(document_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    try:
+        db = Database.get_db()
+        users_collection = db["users"]
+        user = users_collection.find_one({"email": user_email})
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        
+        user_id = str(user["_id"])
+        
+        document = db["pdf_documents"].find_one(
+            {"_id": ObjectId(document_id), "user_id": user_id},
+            {"filename": 1, "file_path": 1}
+        )
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        chunks = await run_in_threadpool(
+            rag_system.vector_store.document_chunks, user_id, os.path.basename(document["file_path"])
+        )
+        if not chunks:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Document has no text to summarize")
+        
+        # Claimed with one conditional write so concurrent retries queue one job
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=SUMMARY_RETRY_AFTER)
+        claimed = db["pdf_documents"].update_one(
+            {
+                "_id": document["_id"],
+                "$or": [
+                    {"summary_status": {"$in": ["failed", None]}},
+                    {"summary_status": "pending", "summary_queued_at": {"$lt": stale}},
+                    {"summary_status": "pending", "summary_queued_at": {"$exists": False}, "uploaded_at": {"$lt": stale}}
+                ]
+            },
+            {"$set": {"summary_status": "pending", "summary_queued_at": now}}
+        )
+        if not claimed.modified_count:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Summary is ready or already in progress")
+        
+        background_tasks.add_task(
+            rag_system.summarizer.summarize_document, document["_id"], document["filename"], chunks
+        )
+        return {"message": "Summary queued", "summary_status": "pending"}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Summary retry error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to queue summary"
+        )
+
 @router.delete("/document/{document_id}")
 async def delete_document(
     document_id: str,
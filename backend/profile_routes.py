@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from backend.db import Database
 from backend.utils.security import verify_token
+from backend.utils.responses import MongoJSONResponse, projection
 from backend.logger import get_logger
 from datetime import datetime
 from typing import List, Optional
@@ -44,7 +45,17 @@ class Medication(BaseModel):
     frequency: str
     prescribed_for: Optional[str] = None
 
-@router.get("")
+class UserProfile(BaseModel):
+    user_id: str
+    basic_info: Optional[BasicInfo] = None
+    medical_history: Optional[MedicalHistory] = None
+    medications: List[Medication] = []
+    allergies: Optional[Allergies] = None
+    lifestyle: Optional[Lifestyle] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+@router.get("", response_model=UserProfile)
 async def get_profile(user_email: str = Depends(verify_token)):
     """Get complete user health profile"""
     try:
@@ -59,20 +70,12 @@ async def get_profile(user_email: str = Depends(verify_token)):
         user_id = str(user["_id"])
         
         # Get profile or return empty
-        profile = profiles_collection.find_one({"user_id": user_id})
+        profile = profiles_collection.find_one({"user_id": user_id}, projection(UserProfile))
         
         if not profile:
-            return {
-                "user_id": user_id,
-                "basic_info": None,
-                "medical_history": None,
-                "medications": [],
-                "allergies": None,
-                "lifestyle": None
-            }
+            return UserProfile(user_id=user_id)
         
-        profile["_id"] = str(profile["_id"])
-        return profile
+        return MongoJSONResponse(profile)
         
     except HTTPException:
         raise
@@ -0,0 +1,259 @@
+"""
+Admission control for LLM calls.
+
+At most LLM_MAX_CONCURRENCY chat completions are in flight per process, and
+at most LLM_MAX_CONCURRENCY_PER_USER of them for one user. Requests over
+either limit wait in a per-user queue. When a slot frees, the users with
+waiting requests are served round-robin, so one user submitting repeatedly
+cannot starve the others. A request that waits longer than
+LLM_MAX_QUEUE_WAIT seconds is rejected. When the queue is full (in total, or
+LLM_MAX_QUEUE_PER_USER for that user), requests are rejected immediately.
+Rejections carry a Retry-After estimate and map to HTTP 429.
+"""
+import os
+import math
+import time
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict
+from backend.utils.metrics import (
+    LLM_IN_FLIGHT,
+    LLM_QUEUE_DEPTH,
+    LLM_QUEUE_WAIT_SECONDS,
+    LLM_ADMISSION_REJECTIONS,
+)
+from backend.logger import get_logger
+
+logger = get_logger("Admission")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        """
+        Raised when a request cannot be admitted
+
+        Args:
+            reason: queue_full, user_queue_full or timeout
+            retry_after: Suggested seconds before retrying
+        """
+        super().__init__(f"LLM capacity exhausted ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    __slots__ = ("user_id", "event", "granted")
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.event = threading.Event()
+        self.granted = False
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_per_user: int,
+        max_queue: int,
+        max_queue_per_user: int,
+        max_wait: float
+    ):
+        """
+        Bound concurrent calls globally and per user, with a fair queue
+
+        Args:
+            max_concurrency: Calls in flight across all users
+            max_per_user: Calls in flight for one user
+            max_queue: Requests allowed to wait across all users
+            max_queue_per_user: Requests allowed to wait for one user
+            max_wait: Seconds a request may wait before it is rejected
+        """
+        self.max_concurrency = max_concurrency
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.max_wait = max_wait
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._user_in_flight: Dict[str, int] = {}
+        # Users with waiting requests, in round-robin order
+        self._waiting: "OrderedDict[str, Deque[_Ticket]]" = OrderedDict()
+        self._queued = 0
+        # Moving average of how long a call holds its slot, for Retry-After
+        self._hold_seconds = 1.0
+
+    def _can_run(self, user_id: str) -> bool:
+        return self._in_flight < self.max_concurrency and self._user_in_flight.get(user_id, 0) < self.max_per_user
+
+    def _grant(self, ticket: _Ticket):
+        self._in_flight += 1
+        self._user_in_flight[ticket.user_id] = self._user_in_flight.get(ticket.user_id, 0) + 1
+        ticket.granted = True
+        ticket.event.set()
+
+    def _dispatch(self):
+        """Hand free slots to waiting requests, one user at a time"""
+        granted = True
+        while granted and self._in_flight < self.max_concurrency:
+            granted = False
+            for user_id in list(self._waiting):
+                if self._user_in_flight.get(user_id, 0) >= self.max_per_user:
+                    continue
+                queue = self._waiting.pop(user_id)
+                self._queued -= 1
+                self._grant(queue.popleft())
+                if queue:
+                    # Back of the rotation
+                    self._waiting[user_id] = queue
+                granted = True
+                break
+        self._update_gauges()
+
+    def _update_gauges(self):
+        LLM_IN_FLIGHT.set(self._in_flight)
+        LLM_QUEUE_DEPTH.set(self._queued)
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue is expected to drain, 1-60"""
+        estimate = self._hold_seconds * (self._queued + 1) / self.max_concurrency
+        return max(1, min(60, math.ceil(estimate)))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        LLM_ADMISSION_REJECTIONS.labels(reason=reason).inc()
+        logger.warning(f"LLM request rejected: {reason} ({self._in_flight} in flight, {self._queued} queued)")
+        return AdmissionRejected(reason, self.retry_after())
+
+    def check(self, user_id: str):
+        """
+        Reject early, before any work is done, if the queue is already full
+
+        Raises:
+            AdmissionRejected: The request would be rejected by acquire()
+        """
+        with self._lock:
+            if self._can_run(user_id) and user_id not in self._waiting:
+                return
+            if self._queued >= self.max_queue:
+                raise self._reject("queue_full")
+            if len(self._waiting.get(user_id, ())) >= self.max_queue_per_user:
+                raise self._reject("user_queue_full")
+
+    def try_acquire(self, user_id: str) -> bool:
+        """
+        Take a slot only if one is free now and nobody is waiting for one
+
+        Never queues. A slot taken this way is freed with release().
+
+        Returns:
+            Whether a slot was taken
+        """
+        with self._lock:
+            if self._queued or not self._can_run(user_id):
+                return False
+            self._grant(_Ticket(user_id))
+            self._update_gauges()
+            return True
+
+    def acquire(self, user_id: str) -> float:
+        """
+        Wait for a slot
+
+        Args:
+            user_id: Caller, for per-user limits and fairness
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            AdmissionRejected: Queue full or max_wait exceeded
+        """
+        start = time.perf_counter()
+        with self._lock:
+            if self._can_run(user_id) and user_id not in self._waiting:
+                self._grant(_Ticket(user_id))
+                self._update_gauges()
+                LLM_QUEUE_WAIT_SECONDS.labels(outcome="admitted").observe(0)
+                return 0.0
+
+            if self._queued >= self.max_queue:
+                raise self._reject("queue_full")
+            queue = self._waiting.get(user_id)
+            if queue is not None and len(queue) >= self.max_queue_per_user:
+                raise self._reject("user_queue_full")
+
+            ticket = _Ticket(user_id)
+            self._waiting.setdefault(user_id, deque()).append(ticket)
+            self._queued += 1
+            self._update_gauges()
+
+        ticket.event.wait(self.max_wait)
+        waited = time.perf_counter() - start
+
+        with self._lock:
+            if not ticket.granted:
+                queue = self._waiting.get(user_id)
+                queue.remove(ticket)
+                if not queue:
+                    del self._waiting[user_id]
+                self._queued -= 1
+                self._update_gauges()
+                LLM_QUEUE_WAIT_SECONDS.labels(outcome="timeout").observe(waited)
+                raise self._reject("timeout")
+
+        LLM_QUEUE_WAIT_SECONDS.labels(outcome="admitted").observe(waited)
+        return waited
+
+    def release(self, user_id: str, held_seconds: float = None):
+        """
+        Free a slot and admit the next waiting request
+
+        Args:
+            user_id: Caller passed to acquire()
+            held_seconds: How long the slot was held
+        """
+        with self._lock:
+            self._in_flight -= 1
+            remaining = self._user_in_flight.get(user_id, 1) - 1
+            if remaining:
+                self._user_in_flight[user_id] = remaining
+            else:
+                self._user_in_flight.pop(user_id, None)
+            if held_seconds is not None:
+                self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * held_seconds
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, user_id: str):
+        """
+        Hold a slot for the duration of a block
+
+        Yields:
+            Seconds spent waiting for the slot
+        """
+        waited = self.acquire(user_id)
+        start = time.perf_counter()
+        try:
+            yield waited
+        finally:
+            self.release(user_id, time.perf_counter() - start)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "queued": self._queued,
+                "waiting_users": len(self._waiting),
+                "avg_hold_seconds": round(self._hold_seconds, 3)
+            }
+
+
+llm_admission = AdmissionController(
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+    max_per_user=int(os.getenv("LLM_MAX_CONCURRENCY_PER_USER", "2")),
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", "64")),
+    max_queue_per_user=int(os.getenv("LLM_MAX_QUEUE_PER_USER", "2")),
+    max_wait=float(os.getenv("LLM_MAX_QUEUE_WAIT", "10"))
+)
@@ -0,0 +1,133 @@
+"""
+Recent answers per user, for degraded mode.
+
+Every answered question is kept as text, up to ANSWER_CACHE_PER_USER per
+user, ANSWER_CACHE_USERS users and ANSWER_CACHE_MB of question and answer
+text in total (least recently active users dropped first).
+Lookups only happen while the LLM is unavailable: the question and the
+user's cached questions are embedded together, and the closest cached
+answer is returned if its question is similar enough. Nothing is embedded
+on the normal path.
+"""
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Optional, Tuple
+import numpy as np
+from backend.utils.memory import register_cache
+from backend.utils.metrics import record_cache
+
+
+def normalize(query: str) -> str:
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+
+def _entry_bytes(entry: Tuple[str, str]) -> int:
+    return sys.getsizeof(entry) + sys.getsizeof(entry[0]) + sys.getsizeof(entry[1])
+
+
+class AnswerCache:
+    def __init__(self, per_user: int = 20, max_users: int = 2000, max_bytes: int = 32 * 1024 * 1024):
+        """
+        Initialize answer cache
+
+        Args:
+            per_user: Answers kept per user
+            max_users: Users kept
+            max_bytes: Bytes of cached entries kept across all users
+        """
+        self.per_user = per_user
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._users: "OrderedDict[str, deque]" = OrderedDict()
+        self._bytes = 0
+
+    def add(self, user_id: str, query: str, response: str):
+        """Remember an answer to a user's question"""
+        key = normalize(query)
+        entry = (key, response)
+        with self._lock:
+            answers = self._users.pop(user_id, None)
+            if answers is None:
+                answers = deque()
+            else:
+                # Newest answer for a repeated question replaces the old one
+                for item in list(answers):
+                    if item[0] == key:
+                        answers.remove(item)
+                        self._bytes -= _entry_bytes(item)
+            answers.append(entry)
+            self._bytes += _entry_bytes(entry)
+            while len(answers) > self.per_user:
+                self._bytes -= _entry_bytes(answers.popleft())
+            self._users[user_id] = answers
+
+            # Least recently active users go first; the current one is kept
+            while len(self._users) > self.max_users or (self._bytes > self.max_bytes and len(self._users) > 1):
+                _, dropped = self._users.popitem(last=False)
+                self._bytes -= sum(_entry_bytes(item) for item in dropped)
+            # A single user over the budget loses their oldest answers
+            while self._bytes > self.max_bytes and len(answers) > 1:
+                self._bytes -= _entry_bytes(answers.popleft())
+
+    def lookup(
+        self,
+        user_id: str,
+        query: str,
+        encode: Callable,
+        threshold: float
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Closest earlier answer to a question
+
+        Args:
+            user_id: Owner of the answers
+            query: New question
+            encode: Sentence encoder, texts -> embeddings
+            threshold: Minimum cosine similarity between the questions
+
+        Returns:
+            (earlier question, answer), or None
+        """
+        result = self._closest(user_id, query, encode, threshold)
+        record_cache("answer", result is not None)
+        return result
+
+    def _closest(self, user_id: str, query: str, encode: Callable, threshold: float) -> Optional[Tuple[str, str]]:
+        key = normalize(query)
+        with self._lock:
+            answers = list(self._users.get(user_id, ()))
+        if not answers:
+            return None
+
+        for cached_query, response in reversed(answers):
+            if cached_query == key:
+                return cached_query, response
+
+        embeddings = np.asarray(encode([key] + [cached_query for cached_query, _ in answers]), dtype="float32")
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        similarity = embeddings[1:] @ embeddings[0]
+        best = int(np.argmax(similarity))
+        if similarity[best] < threshold:
+            return None
+        return answers[best]
+
+    def nbytes(self) -> int:
+        """Bytes of cached entries plus the per-user containers holding them"""
+        with self._lock:
+            containers = sys.getsizeof(self._users) + sum(
+                sys.getsizeof(user_id) + sys.getsizeof(answers)
+                for user_id, answers in self._users.items()
+            )
+            return self._bytes + containers
+
+
+answer_cache = AnswerCache(
+    per_user=int(os.getenv("ANSWER_CACHE_PER_USER", "20")),
+    max_users=int(os.getenv("ANSWER_CACHE_USERS", "2000")),
+    max_bytes=int(os.getenv("ANSWER_CACHE_MB", "32")) * 1024 * 1024
+)
+register_cache("answer_cache", answer_cache.nbytes)
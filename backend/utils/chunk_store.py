@@ -0,0 +1,238 @@
+"""
+Columnar storage for chunk metadata.
+
+Row ``i`` of the store describes vector ``i`` of the FAISS index. Instead of
+one dict per chunk, user IDs and source filenames are interned into small
+tables and referenced from int32 columns, and chunk texts live in a single
+UTF-8 buffer addressed by offsets. Dicts are only materialised for chunks
+that are actually returned.
+"""
+import json
+from itertools import groupby
+import numpy as np
+from typing import Dict, List, Optional
+
+
+class ChunkStore:
+    def __init__(self):
+        self.user_table: List[str] = []
+        self.source_table: List[str] = []
+        self._user_lookup: Dict[str, int] = {}
+        self._source_lookup: Dict[str, int] = {}
+
+        self.user_idx = np.zeros(0, dtype="int32")
+        self.source_idx = np.zeros(0, dtype="int32")
+        self.chunk_ids = np.zeros(0, dtype="int32")
+        self.total_chunks = np.zeros(0, dtype="int32")
+        self.text_offsets = np.zeros(1, dtype="int64")
+        self.text_buffer = bytearray()
+
+        # Per-user chunk counts, indexed by interned user id
+        self.user_counts = np.zeros(0, dtype="int64")
+        # Rows grouped by user (CSR layout), rebuilt lazily after writes
+        self._user_order: Optional[np.ndarray] = None
+        self._user_offsets: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.user_idx)
+
+    def __getitem__(self, position: int) -> Dict:
+        return self.get(position)
+
+    def _intern(self, value: str, table: List[str], lookup: Dict[str, int]) -> int:
+        idx = lookup.get(value)
+        if idx is None:
+            idx = len(table)
+            table.append(value)
+            lookup[value] = idx
+        return idx
+
+    def append(self, chunks: List[Dict], user_id: str):
+        """
+        Append chunks owned by a user
+
+        Args:
+            chunks: List of chunk dictionaries (text, source, chunk_id, total_chunks)
+            user_id: User ID for ownership tracking
+        """
+        if not chunks:
+            return
+
+        uid = self._intern(user_id, self.user_table, self._user_lookup)
+        sources = [self._intern(c.get("source", ""), self.source_table, self._source_lookup) for c in chunks]
+
+        encoded = [c["text"].encode("utf-8") for c in chunks]
+        lengths = np.fromiter((len(e) for e in encoded), dtype="int64", count=len(encoded))
+        offsets = self.text_offsets[-1] + np.cumsum(lengths)
+        for e in encoded:
+            self.text_buffer.extend(e)
+
+        count = len(chunks)
+        self.user_idx = np.concatenate([self.user_idx, np.full(count, uid, dtype="int32")])
+        self.source_idx = np.concatenate([self.source_idx, np.asarray(sources, dtype="int32")])
+        self.chunk_ids = np.concatenate([self.chunk_ids, np.fromiter((c.get("chunk_id", 0) for c in chunks), dtype="int32", count=count)])
+        self.total_chunks = np.concatenate([self.total_chunks, np.fromiter((c.get("total_chunks", 0) for c in chunks), dtype="int32", count=count)])
+        self.text_offsets = np.concatenate([self.text_offsets, offsets])
+
+        if uid >= len(self.user_counts):
+            self.user_counts = np.concatenate([self.user_counts, np.zeros(uid + 1 - len(self.user_counts), dtype="int64")])
+        self.user_counts[uid] += count
+        self._user_order = None
+
+    def copy(self) -> "ChunkStore":
+        """
+        Copy that can be appended to without affecting this store
+
+        Column arrays are shared: append() replaces them rather than writing
+        into them. Tables, counts and the text buffer are copied.
+        """
+        store = ChunkStore()
+        store.user_table = list(self.user_table)
+        store.source_table = list(self.source_table)
+        store._user_lookup = dict(self._user_lookup)
+        store._source_lookup = dict(self._source_lookup)
+
+        store.user_idx = self.user_idx
+        store.source_idx = self.source_idx
+        store.chunk_ids = self.chunk_ids
+        store.total_chunks = self.total_chunks
+        store.text_offsets = self.text_offsets
+        store.text_buffer = bytearray(self.text_buffer)
+        store.user_counts = self.user_counts.copy()
+        return store
+
+    def text(self, position: int) -> str:
+        start, end = self.text_offsets[position], self.text_offsets[position + 1]
+        return self.text_buffer[start:end].decode("utf-8")
+
+    def texts(self) -> List[str]:
+        return [self.text(i) for i in range(len(self))]
+
+    def get(self, position: int) -> Dict:
+        """Materialise one chunk as a dictionary"""
+        return {
+            "text": self.text(position),
+            "source": self.source_table[self.source_idx[position]],
+            "chunk_id": int(self.chunk_ids[position]),
+            "total_chunks": int(self.total_chunks[position]),
+            "user_id": self.user_table[self.user_idx[position]]
+        }
+
+    def user_index(self, user_id: str) -> Optional[int]:
+        return self._user_lookup.get(user_id)
+
+    def user_chunk_count(self, user_id: str) -> int:
+        """Number of chunks owned by a user, O(1)"""
+        uid = self._user_lookup.get(user_id)
+        if uid is None or uid >= len(self.user_counts):
+            return 0
+        return int(self.user_counts[uid])
+
+    def user_positions(self, user_id: str) -> np.ndarray:
+        """Row positions owned by a user"""
+        uid = self._user_lookup.get(user_id)
+        if uid is None:
+            return np.zeros(0, dtype="int64")
+
+        if self._user_order is None:
+            self._user_order = np.argsort(self.user_idx, kind="stable")
+            self._user_offsets = np.concatenate([[0], np.cumsum(np.bincount(self.user_idx, minlength=len(self.user_table)))])
+
+        return self._user_order[self._user_offsets[uid]:self._user_offsets[uid + 1]]
+
+    def owner_mask(self, user_id: str, source: str = None) -> np.ndarray:
+        """Boolean mask of rows owned by a user, optionally for one source"""
+        uid = self._user_lookup.get(user_id)
+        if uid is None:
+            return np.zeros(len(self), dtype=bool)
+
+        mask = self.user_idx == uid
+        if source is not None:
+            sid = self._source_lookup.get(source)
+            if sid is None:
+                return np.zeros(len(self), dtype=bool)
+            mask &= self.source_idx == sid
+        return mask
+
+    def keep(self, mask: np.ndarray) -> "ChunkStore":
+        """
+        Build a new store containing only the rows selected by mask
+
+        Args:
+            mask: Boolean mask over rows
+
+        Returns:
+            Compacted ChunkStore
+        """
+        store = ChunkStore()
+        store.user_table = list(self.user_table)
+        store.source_table = list(self.source_table)
+        store._user_lookup = dict(self._user_lookup)
+        store._source_lookup = dict(self._source_lookup)
+
+        store.user_idx = self.user_idx[mask]
+        store.source_idx = self.source_idx[mask]
+        store.chunk_ids = self.chunk_ids[mask]
+        store.total_chunks = self.total_chunks[mask]
+
+        starts = self.text_offsets[:-1][mask]
+        ends = self.text_offsets[1:][mask]
+        buffer = bytearray()
+        view = memoryview(self.text_buffer)
+        for start, end in zip(starts, ends):
+            buffer.extend(view[start:end])
+        store.text_buffer = buffer
+        store.text_offsets = np.concatenate([[0], np.cumsum(ends - starts)]).astype("int64")
+
+        store.user_counts = np.bincount(store.user_idx, minlength=len(store.user_table)).astype("int64")
+        return store
+
+    def nbytes(self) -> int:
+        """Approximate bytes held by the store"""
+        arrays = (self.user_idx, self.source_idx, self.chunk_ids, self.total_chunks, self.text_offsets, self.user_counts)
+        tables = sum(len(v) + 49 for v in self.user_table) + sum(len(v) + 49 for v in self.source_table)
+        return sum(a.nbytes for a in arrays) + len(self.text_buffer) + tables
+
+    def save(self, path: str):
+        """Save the store as a single .npz file"""
+        tables = json.dumps({"users": self.user_table, "sources": self.source_table})
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                user_idx=self.user_idx,
+                source_idx=self.source_idx,
+                chunk_ids=self.chunk_ids,
+                total_chunks=self.total_chunks,
+                text_offsets=self.text_offsets,
+                text_buffer=np.frombuffer(bytes(self.text_buffer), dtype="uint8"),
+                tables=np.frombuffer(tables.encode("utf-8"), dtype="uint8")
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "ChunkStore":
+        """Load a store written by save()"""
+        store = cls()
+        with np.load(path) as data:
+            tables = json.loads(data["tables"].tobytes().decode("utf-8"))
+            store.user_table = tables["users"]
+            store.source_table = tables["sources"]
+            store.user_idx = data["user_idx"]
+            store.source_idx = data["source_idx"]
+            store.chunk_ids = data["chunk_ids"]
+            store.total_chunks = data["total_chunks"]
+            store.text_offsets = data["text_offsets"]
+            store.text_buffer = bytearray(data["text_buffer"].tobytes())
+
+        store._user_lookup = {v: i for i, v in enumerate(store.user_table)}
+        store._source_lookup = {v: i for i, v in enumerate(store.source_table)}
+        store.user_counts = np.bincount(store.user_idx, minlength=len(store.user_table)).astype("int64")
+        return store
+
+    @classmethod
+    def from_dicts(cls, chunks: List[Dict]) -> "ChunkStore":
+        """Build a store from the legacy list-of-dicts format"""
+        store = cls()
+        # Append runs of consecutive chunks per owner to keep row order
+        for user_id, run in groupby(chunks, key=lambda c: c.get("user_id", "")):
+            store.append(list(run), user_id)
+        return store
@@ -0,0 +1,161 @@
+"""
+Circuit breaker for calls to an unreliable dependency.
+
+    closed     calls pass; outcomes are recorded over a sliding window
+    open       calls fail immediately with CircuitOpenError
+    half-open  after the open period, one probe call at a time is let
+               through; a success closes the circuit, a failure reopens it
+
+The circuit opens when at least ``min_calls`` outcomes were recorded in the
+last ``window`` seconds and the failure rate reached ``failure_rate``.
+"""
+import time
+import threading
+from collections import deque
+from backend.utils.metrics import CIRCUIT_STATE, CIRCUIT_TRANSITIONS
+from backend.logger import get_logger
+
+logger = get_logger("CircuitBreaker")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        """
+        Raised instead of calling a dependency while its circuit is open
+
+        Args:
+            name: Circuit name
+            retry_after: Seconds until the next probe is allowed
+        """
+        super().__init__(f"Circuit '{name}' is open")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        min_calls: int = 10,
+        window: float = 60.0,
+        open_seconds: float = 30.0
+    ):
+        """
+        Initialize circuit breaker
+
+        Args:
+            name: Circuit name for logs and metrics
+            failure_rate: Failure fraction that opens the circuit
+            min_calls: Outcomes needed in the window before it can open
+            window: Sliding window length in seconds
+            open_seconds: Time the circuit stays open before probing
+        """
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+
+        self._lock = threading.Lock()
+        self._outcomes = deque()  # (timestamp, ok)
+        self._failures = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        CIRCUIT_STATE.labels(circuit=name).set(0)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def _transition(self, state: str):
+        if state == self._state:
+            return
+        logger.warning(f"Circuit '{self.name}' {self._state} -> {state}")
+        self._state = state
+        CIRCUIT_STATE.labels(circuit=self.name).set(_STATE_VALUES[state])
+        CIRCUIT_TRANSITIONS.labels(circuit=self.name, state=state).inc()
+
+    def acquire(self) -> bool:
+        """
+        Ask permission for a call
+
+        Returns:
+            True if the call is the half-open probe
+
+        Raises:
+            CircuitOpenError: The circuit is open, or a probe is already running
+        """
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == CLOSED:
+                return False
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            retry_after = max(1.0, self.open_seconds - (now - self._opened_at))
+            raise CircuitOpenError(self.name, retry_after)
+
+    def record(self, ok: bool, probe: bool = False):
+        """
+        Record the outcome of a call allowed by acquire()
+
+        Args:
+            ok: Whether the call succeeded
+            probe: Value returned by acquire()
+        """
+        with self._lock:
+            now = time.monotonic()
+            if probe:
+                self._probe_in_flight = False
+                if ok:
+                    self._outcomes.clear()
+                    self._failures = 0
+                    self._transition(CLOSED)
+                else:
+                    self._open(now)
+                return
+
+            self._outcomes.append((now, ok))
+            self._failures += not ok
+            while self._outcomes and now - self._outcomes[0][0] > self.window:
+                _, old_ok = self._outcomes.popleft()
+                self._failures -= not old_ok
+
+            if (
+                self._state == CLOSED
+                and len(self._outcomes) >= self.min_calls
+                and self._failures >= self.failure_rate * len(self._outcomes)
+            ):
+                self._open(now)
+
+    def abandon(self, probe: bool):
+        """Release a probe that never reached the dependency"""
+        if probe:
+            with self._lock:
+                self._probe_in_flight = False
+
+    def _open(self, now: float):
+        self._opened_at = now
+        self._transition(OPEN)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self._current_state(time.monotonic()),
+                "calls": len(self._outcomes),
+                "failures": self._failures
+            }
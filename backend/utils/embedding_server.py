@@ -0,0 +1,273 @@
+"""
+Local embedding service shared by all web workers.
+
+The server owns a single encoder (see encoders.py) and answers encode requests
+over a Unix domain socket, batching concurrent requests together. Workers
+talk to it through ``EmbeddingClient``, which exposes the same ``encode`` /
+``get_sentence_embedding_dimension`` surface that ``VectorStore`` uses on a
+SentenceTransformer, so the two are interchangeable.
+
+Run it with:
+    python -m backend.utils.embedding_server
+"""
+import os
+import json
+import socket
+import struct
+import asyncio
+import threading
+import numpy as np
+from typing import List
+from backend.logger import get_logger
+
+logger = get_logger("EmbeddingServer")
+
+DEFAULT_SOCKET_PATH = "/tmp/healthbot-embeddings.sock"
+
+_HEADER = struct.Struct("!I")
+
+
+def _pack(payload: bytes) -> bytes:
+    return _HEADER.pack(len(payload)) + payload
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        part = sock.recv(size - len(buffer))
+        if not part:
+            raise ConnectionError("Embedding server closed the connection")
+        buffer.extend(part)
+    return bytes(buffer)
+
+
+def _recv_frame(sock: socket.socket) -> bytes:
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return _recv_exact(sock, size)
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> bytes:
+    (size,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return await reader.readexactly(size)
+
+
+class EmbeddingServer:
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        backend: str = "local",
+        socket_path: str = DEFAULT_SOCKET_PATH,
+        max_batch: int = 64,
+        batch_wait_ms: float = 5.0
+    ):
+        """
+        Initialize embedding server
+
+        Args:
+            model_name: Name of the sentence transformer model
+            backend: Encoder backend used by the server (local or onnx)
+            socket_path: Unix socket the server listens on
+            max_batch: Maximum number of texts encoded in one forward pass
+            batch_wait_ms: How long to wait for more requests before encoding
+        """
+        from backend.utils.encoders import create_encoder
+
+        if backend == "server":
+            raise ValueError("Embedding server cannot use the server backend itself")
+
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait_ms / 1000.0
+
+        self.model = create_encoder(model_name, backend=backend)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+        self._queue: asyncio.Queue = None
+
+    async def _batcher(self):
+        """Collect pending requests into batches and encode them together"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            pending = [await self._queue.get()]
+            total = len(pending[0][0])
+            deadline = loop.time() + self.batch_wait
+
+            while total < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                total += len(item[0])
+
+            texts = [text for batch, _ in pending for text in batch]
+            try:
+                embeddings = await loop.run_in_executor(
+                    None,
+                    lambda: self.model.encode(
+                        texts,
+                        batch_size=self.max_batch,
+                        show_progress_bar=False
+                    )
+                )
+                embeddings = np.asarray(embeddings, dtype="float32")
+            except Exception as e:
+                logger.error(f"Batch encode failed: {e}")
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            offset = 0
+            for batch, future in pending:
+                if not future.done():
+                    future.set_result(embeddings[offset:offset + len(batch)])
+                offset += len(batch)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve requests from a single worker connection"""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    request = json.loads(await _read_frame(reader))
+                except asyncio.IncompleteReadError:
+                    break
+
+                op = request.get("op")
+                if op == "info":
+                    writer.write(_pack(json.dumps({"dimension": self.dimension}).encode()))
+                elif op == "encode":
+                    texts = request.get("texts", [])
+                    future = loop.create_future()
+                    await self._queue.put((texts, future))
+                    try:
+                        embeddings = await future
+                    except Exception as e:
+                        writer.write(_pack(json.dumps({"error": str(e)}).encode()))
+                    else:
+                        header = {"shape": list(embeddings.shape)}
+                        writer.write(_pack(json.dumps(header).encode()))
+                        writer.write(_pack(embeddings.tobytes()))
+                else:
+                    writer.write(_pack(json.dumps({"error": f"Unknown op: {op}"}).encode()))
+
+                await writer.drain()
+        except Exception as e:
+            logger.error(f"Embedding connection error: {e}")
+        finally:
+            writer.close()
+
+    async def serve(self):
+        """Listen on the Unix socket until cancelled"""
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        self._queue = asyncio.Queue()
+        batcher = asyncio.create_task(self._batcher())
+
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        logger.info(f"Embedding server listening on {self.socket_path}")
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+class EmbeddingClient:
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, timeout: float = 30.0):
+        """
+        Initialize client for the local embedding server
+
+        Args:
+            socket_path: Unix socket of the embedding server
+            timeout: Socket timeout in seconds
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._dimension = None
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _reset(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    def _request(self, request: dict):
+        """Send one request, reconnecting once if the socket went stale"""
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                sock.sendall(_pack(json.dumps(request).encode()))
+                header = json.loads(_recv_frame(sock))
+                if "error" in header:
+                    raise RuntimeError(f"Embedding server error: {header['error']}")
+                if "shape" in header:
+                    data = _recv_frame(sock)
+                    return np.frombuffer(data, dtype="float32").reshape(header["shape"])
+                return header
+            except (ConnectionError, OSError) as e:
+                self._reset()
+                if attempt == 1:
+                    logger.error(f"Embedding server unreachable at {self.socket_path}: {e}")
+                    raise
+
+    def get_sentence_embedding_dimension(self) -> int:
+        if self._dimension is None:
+            self._dimension = self._request({"op": "info"})["dimension"]
+        return self._dimension
+
+    def memory_bytes(self) -> int:
+        """Model weights live in the embedding server process"""
+        return 0
+
+    def encode(self, texts: List[str], show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        """
+        Encode texts on the embedding server
+
+        Args:
+            texts: List of text strings
+
+        Returns:
+            Numpy array of embeddings
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype="float32")
+        return self._request({"op": "encode", "texts": list(texts)})
+
+
+if __name__ == "__main__":
+    server = EmbeddingServer(
+        model_name=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
+        backend=os.getenv("EMBEDDING_SERVER_BACKEND", "local"),
+        socket_path=os.getenv("EMBEDDING_SOCKET", DEFAULT_SOCKET_PATH),
+        max_batch=int(os.getenv("EMBEDDING_MAX_BATCH", 64)),
+        batch_wait_ms=float(os.getenv("EMBEDDING_BATCH_WAIT_MS", 5))
+    )
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        logger.info("Embedding server stopped")
@@ -2,70 +2,123 @@ import os
 import pickle
 import numpy as np
 from typing import List, Dict, Tuple
-from sentence_transformers import SentenceTransformer
 import faiss
+from backend.utils.encoders import create_encoder
+from backend.utils.metrics import (
+    timed,
+    EMBEDDING_SECONDS,
+    VECTOR_SEARCH_SECONDS,
+    SPARSE_SEARCH_SECONDS,
+    RETRIEVAL_PATHS,
+)
+from backend.utils.chunk_store import ChunkStore
+from backend.utils.sparse_index import reciprocal_rank_fusion
+from backend.utils.shards import ShardCache, ShardGeneration, UserShard
+from backend.utils.quantization import effective_codec
+from backend.utils.memory import register_cache
+from backend.utils.singleflight import SingleFlight
 from backend.logger import get_logger
 
 logger = get_logger("Embeddings")
 
+# Loaded shards are evicted least-recently-used past this budget, and
+# dropped after sitting idle for SHARD_IDLE_SECONDS
+SHARD_CACHE_MB = int(os.getenv("SHARD_CACHE_MB", "512"))
+SHARD_IDLE_SECONDS = float(os.getenv("SHARD_IDLE_SECONDS", "1800"))
+
+# Compressed codecs fetch this many candidates per result for exact re-ranking
+RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))
+
 class VectorStore:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2", store_dir: str = "backend/vector_store"):
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        store_dir: str = "backend/vector_store",
+        encoder=None,
+        retrieval_mode: str = None,
+        show_progress: bool = None,
+        codec: str = None
+    ):
         """
         Initialize vector store with sentence transformer
         
         Args:
             model_name: Name of the sentence transformer model
             store_dir: Directory to store vector index
+            encoder: Optional pre-built encoder, overrides EMBEDDING_BACKEND
+            retrieval_mode: dense, sparse or hybrid, overrides RETRIEVAL_MODE
+            show_progress: Show a progress bar while encoding documents,
+                overrides EMBEDDING_PROGRESS_BAR (off by default in the server)
+            codec: flat, fp16, sq8 or pq vector storage, overrides VECTOR_CODEC
         """
         self.store_dir = store_dir
+        self.retrieval_mode = retrieval_mode or os.getenv("RETRIEVAL_MODE", "dense")
+        if show_progress is None:
+            show_progress = os.getenv("EMBEDDING_PROGRESS_BAR", "0") == "1"
+        self.show_progress = show_progress
+        self.codec = codec or os.getenv("VECTOR_CODEC", "flat")
+        effective_codec(self.codec, 0)
         os.makedirs(store_dir, exist_ok=True)
         
-        logger.info(f"Loading embedding model: {model_name}")
-        self.model = SentenceTransformer(model_name)
+        # Encoder backend is chosen by EMBEDDING_BACKEND (see encoders.py)
+        self.model = encoder or create_encoder(model_name)
         self.dimension = self.model.get_sentence_embedding_dimension()
         
-        # FAISS index
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.chunks = []
+        # One FAISS index and chunk store per user, plus a BM25 index unless
+        # retrieval is dense-only (see shards.py); only the manifest is read
+        # here, shards load on first use
+        self.shards = ShardCache(
+            os.path.join(store_dir, "shards"),
+            self.dimension,
+            SHARD_CACHE_MB * 1024 * 1024,
+            SHARD_IDLE_SECONDS,
+            self.codec,
+            sparse=self.retrieval_mode != "dense"
+        )
+        register_cache("vector_shards", self.shards.nbytes)
+        
+        # Concurrent searches for the same query text share one encode
+        self.query_flights = SingleFlight("embedding")
         
-        # Try to load existing index
+        # Split a pre-shard global index, if one is still on disk
         self.load_index()
     
-    def create_embeddings(self, texts: List[str]) -> np.ndarray:
+    def create_embeddings(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
         """
         Create embeddings for a list of texts
         
         Args:
             texts: List of text strings
+            batch_size: Texts per encoder forward pass
             
         Returns:
             Numpy array of embeddings
         """
         logger.info(f"Creating embeddings for {len(texts)} texts")
-        embeddings = self.model.encode(texts, show_progress_bar=True)
+        with timed(EMBEDDING_SECONDS, kind="documents"):
+            embeddings = self.model.encode(texts, show_progress_bar=self.show_progress, batch_size=batch_size)
         return embeddings
     
-    def add_documents(self, chunks: List[Dict[str, str]], user_id: str):
+    def add_documents(self, chunks: List[Dict[str, str]], user_id: str, batch_size: int = 32):
         """
         Add document chunks to vector store
         
         Args:
             chunks: List of chunk dictionaries
             user_id: User ID for ownership tracking
+            batch_size: Texts per encoder forward pass
         """
         texts = [chunk["text"] for chunk in chunks]
-        embeddings = self.create_embeddings(texts)
+        embeddings = self.create_embeddings(texts, batch_size)
         
-        # Add user_id to chunks
-        for chunk in chunks:
-            chunk["user_id"] = user_id
-        
-        # Add to FAISS index
-        self.index.add(embeddings.astype('float32'))
-        self.chunks.extend(chunks)
+        # Encoding above runs unlocked; only the owner's shard is copied,
+        # extended, published and written back
+        with self.shards.write_lock(user_id):
+            shard = self.shards.get(user_id, create=True)
+            shard.append(chunks, texts, embeddings)
+            self.save_shard(shard)
         
         logger.info(f"Added {len(chunks)} chunks to vector store")
-        self.save_index()
     
     def search(self, query: str, user_id: str, k: int = 5) -> List[Dict]:
         """
@@ -77,32 +130,78 @@ class VectorStore:
             k: Number of results to return
             
         Returns:
-            List of matching chunks with scores
+            List of matching chunks with scores. The score depends on the
+            path in "retrieval": L2 distance for dense (lower is better),
+            BM25 for sparse and reciprocal rank fusion for hybrid (higher
+            is better)
         """
-        if len(self.chunks) == 0:
-            logger.warning("No documents in vector store")
+        shard = self.shards.get(user_id)
+        if shard is None:
             return []
         
-        # Create query embedding
-        query_embedding = self.model.encode([query])
+        # One snapshot for the whole query; writers publish new generations
+        # instead of changing this one
+        generation = shard.generation
+        if len(generation) == 0:
+            return []
         
-        # Search in FAISS
-        distances, indices = self.index.search(query_embedding.astype('float32'), k * 3)
+        # Shards of a dense-only store have no postings and are searched densely
+        sparse_hits = []
+        if self.retrieval_mode != "dense" and generation.sparse is not None:
+            with timed(SPARSE_SEARCH_SECONDS):
+                sparse_hits = generation.sparse.search(query, user_id, k * 3)
         
-        # Filter by user_id and get top k
+        # Queries dominated by rare terms (drug names, lab codes) are answered
+        # from the inverted index alone and skip the encoder forward pass
+        if (self.retrieval_mode == "sparse" and generation.sparse is not None) or (
+            self.retrieval_mode == "hybrid"
+            and sparse_hits
+            and generation.sparse.is_selective(query, user_id)
+        ):
+            path, ranked = "sparse", sparse_hits[:k]
+        else:
+            dense_hits = self._dense_search(generation, query, k * 3 if sparse_hits else k)
+            if sparse_hits:
+                path = "hybrid"
+                ranked = reciprocal_rank_fusion([
+                    [row for row, _ in dense_hits],
+                    [row for row, _ in sparse_hits]
+                ])[:k]
+            else:
+                path, ranked = "dense", dense_hits[:k]
+        
+        RETRIEVAL_PATHS.labels(path=path).inc()
+        
+        # Materialise only the final top k
         results = []
-        for idx, distance in zip(indices[0], distances[0]):
-            if idx < len(self.chunks):
-                chunk = self.chunks[idx].copy()
-                if chunk.get("user_id") == user_id:
-                    chunk["score"] = float(distance)
-                    results.append(chunk)
-                    if len(results) >= k:
-                        break
-        
-        logger.info(f"Found {len(results)} matching chunks for query")
+        for idx, score in ranked:
+            chunk = generation.chunks.get(idx)
+            chunk["score"] = float(score)
+            chunk["retrieval"] = path
+            results.append(chunk)
+        
+        logger.info("Found %d matching chunks for query (%s)", len(results), path,
+                    extra={"category": "retrieval"})
         return results
     
+    def encode_query(self, query: str) -> np.ndarray:
+        """Embed a search query"""
+        with timed(EMBEDDING_SECONDS, kind="query"):
+            return self.model.encode([query])
+    
+    def _dense_search(self, generation: ShardGeneration, query: str, k: int) -> List[Tuple[int, float]]:
+        """
+        Embedding search within one snapshot of a user's shard
+        
+        Returns:
+            List of (row, L2 distance), closest first
+        """
+        query_embedding = self.query_flights.do(query, self.encode_query, query)
+        
+        # Every row in the shard belongs to the user, so no owner filtering
+        with timed(VECTOR_SEARCH_SECONDS):
+            return generation.search(query_embedding.astype('float32'), k, RERANK_FACTOR)
+    
     def delete_user_documents(self, user_id: str, filename: str = None):
         """
         Delete documents for a user
@@ -111,51 +210,109 @@ class VectorStore:
             user_id: User ID
             filename: Optional specific file to delete
         """
-        # Filter out chunks
-        if filename:
-            self.chunks = [c for c in self.chunks if not (c.get("user_id") == user_id and c.get("source") == filename)]
-        else:
-            self.chunks = [c for c in self.chunks if c.get("user_id") != user_id]
-        
-        # Rebuild index
-        if len(self.chunks) > 0:
-            texts = [chunk["text"] for chunk in self.chunks]
-            embeddings = self.create_embeddings(texts)
-            self.index = faiss.IndexFlatL2(self.dimension)
-            self.index.add(embeddings.astype('float32'))
-        else:
-            self.index = faiss.IndexFlatL2(self.dimension)
+        with self.shards.write_lock(user_id):
+            shard = self.shards.get(user_id)
+            removed = shard.generation.chunks.owner_mask(user_id, filename) if shard is not None else None
+            if removed is None or not removed.any():
+                logger.info(f"No documents to delete for user {user_id}")
+                return
+            
+            if removed.all():
+                self.shards.remove(user_id)
+            else:
+                shard.remove(removed)
+                self.save_shard(shard)
         
-        self.save_index()
         logger.info(f"Deleted documents for user {user_id}")
     
-    def save_index(self):
-        """Save FAISS index and chunks to disk"""
-        try:
-            index_path = os.path.join(self.store_dir, "faiss_index.bin")
-            chunks_path = os.path.join(self.store_dir, "chunks.pkl")
-            
-            faiss.write_index(self.index, index_path)
-            
-            with open(chunks_path, 'wb') as f:
-                pickle.dump(self.chunks, f)
+    def document_chunks(self, user_id: str, filename: str) -> List[Dict]:
+        """
+        Stored chunks of one document, in order
+        
+        Args:
+            user_id: Owner of the document
+            filename: Source of the document's chunks (the stored file's name)
             
-            logger.info("Vector store saved to disk")
+        Returns:
+            Chunk dictionaries sorted by chunk_id, empty if none are stored
+        """
+        shard = self.shards.get(user_id)
+        if shard is None:
+            return []
+        chunks = shard.generation.chunks
+        positions = np.flatnonzero(chunks.owner_mask(user_id, filename))
+        return sorted((chunks.get(int(i)) for i in positions), key=lambda chunk: chunk["chunk_id"])
+    
+    def user_chunk_count(self, user_id: str) -> int:
+        """Number of chunks stored for a user, answered from the manifest"""
+        return self.shards.user_chunk_count(user_id)
+    
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Report bytes held by the vector store
+        
+        Returns:
+            Dictionary of component sizes in bytes (loaded shards only)
+        """
+        loaded = [shard.generation for shard in self.shards.loaded().values()]
+        memory_bytes = getattr(self.model, "memory_bytes", None)
+        
+        return {
+            "chunks": self.shards.manifest.total_chunks(),
+            "users": len(self.shards.manifest),
+            "loaded_shards": len(loaded),
+            "loaded_chunks": sum(len(generation) for generation in loaded),
+            "codec": self.codec,
+            "index_vectors_bytes": sum(generation.index.ntotal * generation.index.code_size for generation in loaded),
+            "chunk_metadata_bytes": sum(generation.chunks.nbytes() for generation in loaded),
+            "sparse_index_bytes": sum(generation.sparse.nbytes() for generation in loaded if generation.sparse is not None),
+            "shard_budget_bytes": self.shards.budget_bytes,
+            "shard_loads": self.shards.loads,
+            "shard_evictions": self.shards.evictions,
+            "model_weights_bytes": memory_bytes() if memory_bytes else -1
+        }
+    
+    def save_shard(self, shard: UserShard):
+        """Save one user's shard to disk"""
+        try:
+            self.shards.save(shard)
         except Exception as e:
-            logger.error(f"Failed to save index: {e}")
+            logger.error(f"Failed to save shard: {e}")
     
     def load_index(self):
-        """Load FAISS index and chunks from disk"""
+        """Split a legacy global FAISS index and chunk file into per-user shards"""
         try:
             index_path = os.path.join(self.store_dir, "faiss_index.bin")
-            chunks_path = os.path.join(self.store_dir, "chunks.pkl")
+            chunks_path = os.path.join(self.store_dir, "chunks.npz")
+            legacy_chunks_path = os.path.join(self.store_dir, "chunks.pkl")
+            
+            if not os.path.exists(index_path):
+                return
+            if os.path.exists(chunks_path):
+                chunks = ChunkStore.load(chunks_path)
+            elif os.path.exists(legacy_chunks_path):
+                with open(legacy_chunks_path, 'rb') as f:
+                    chunks = ChunkStore.from_dicts(pickle.load(f))
+            else:
+                return
+            
+            index = faiss.read_index(index_path)
+            vectors = index.reconstruct_n(0, index.ntotal)
+            
+            for user_id in chunks.user_table:
+                positions = np.sort(chunks.user_positions(user_id))
+                if len(positions) == 0:
+                    continue
+                shard = UserShard(user_id, self.dimension, self.codec, self.shards.sparse)
+                rows = [chunks.get(int(p)) for p in positions]
+                shard.append(rows, [row["text"] for row in rows], vectors[positions])
+                self.shards.save(shard)
+            
+            # Keep the originals around, renamed, until the shards are trusted
+            for path in (index_path, chunks_path, legacy_chunks_path):
+                if os.path.exists(path):
+                    os.replace(path, path + ".migrated")
             
-            if os.path.exists(index_path) and os.path.exists(chunks_path):
-                self.index = faiss.read_index(index_path)
-                
-                with open(chunks_path, 'rb') as f:
-                    self.chunks = pickle.load(f)
-                
-                logger.info(f"Loaded {len(self.chunks)} chunks from disk")
+            logger.info(f"Migrated {len(chunks)} chunks into {len(self.shards.manifest)} user shards")
         except Exception as e:
-            logger.warning(f"Could not load existing index: {e}")
\ No newline at end of file
+            logger.warning(f"Could not migrate existing index: {e}")
@@ -0,0 +1,236 @@
+"""
+Pluggable text encoder backends for VectorStore.
+
+Every encoder exposes the SentenceTransformer surface that VectorStore relies
+on - ``encode(texts, ...)`` and ``get_sentence_embedding_dimension()`` - so
+the backend can be switched through configuration:
+
+    EMBEDDING_BACKEND=local    PyTorch via sentence-transformers (default)
+    EMBEDDING_BACKEND=onnx     ONNX Runtime on CPU
+    EMBEDDING_BACKEND=server   shared embedding server (see embedding_server.py)
+
+With the ONNX backend, EMBEDDING_QUANTIZE=int8 switches to a dynamically
+quantised copy of the model.
+"""
+import os
+import json
+import numpy as np
+from typing import List
+from backend.logger import get_logger
+
+logger = get_logger("Encoders")
+
+DEFAULT_ONNX_DIR = "backend/vector_store/onnx"
+
+
+class SentenceTransformerEncoder:
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        """
+        PyTorch encoder through sentence-transformers
+
+        Args:
+            model_name: Name of the sentence transformer model
+        """
+        from sentence_transformers import SentenceTransformer
+
+        logger.info(f"Loading embedding model: {model_name}")
+        self.model = SentenceTransformer(model_name)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the model parameters"""
+        return sum(p.numel() * p.element_size() for p in self.model.parameters())
+
+    def encode(self, texts: List[str], show_progress_bar: bool = False, batch_size: int = 32, **kwargs) -> np.ndarray:
+        embeddings = self.model.encode(
+            texts,
+            batch_size=batch_size,
+            show_progress_bar=show_progress_bar
+        )
+        return np.asarray(embeddings, dtype="float32")
+
+
+class ONNXEncoder:
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        cache_dir: str = DEFAULT_ONNX_DIR,
+        quantize: bool = False,
+        num_threads: int = 0
+    ):
+        """
+        CPU encoder running an exported copy of the model on ONNX Runtime
+
+        The model is exported from sentence-transformers on first use and
+        cached on disk, so later starts only need onnxruntime and tokenizers.
+
+        Args:
+            model_name: Name of the sentence transformer model
+            cache_dir: Directory holding exported models
+            quantize: Use dynamic int8 quantised weights
+            num_threads: Intra-op threads for ONNX Runtime (0 = runtime default)
+        """
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_dir = os.path.join(cache_dir, model_name.replace("/", "__"))
+        fp32_path = os.path.join(self.model_dir, "model.onnx")
+        int8_path = os.path.join(self.model_dir, "model.int8.onnx")
+
+        if not os.path.exists(fp32_path):
+            self._export(model_name, fp32_path)
+        if quantize and not os.path.exists(int8_path):
+            self._quantize(fp32_path, int8_path)
+
+        with open(os.path.join(self.model_dir, "encoder_config.json")) as f:
+            config = json.load(f)
+        self.dimension = config["dimension"]
+        self.normalize = config["normalize"]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=config["max_seq_length"])
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        model_path = int8_path if quantize else fp32_path
+        self.model_path = model_path
+        logger.info(f"Loading ONNX embedding model: {model_path}")
+        self.session = ort.InferenceSession(
+            model_path,
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _export(self, model_name: str, onnx_path: str):
+        """Export the transformer of a sentence-transformers model to ONNX"""
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        logger.info(f"Exporting {model_name} to ONNX")
+        os.makedirs(self.model_dir, exist_ok=True)
+
+        st_model = SentenceTransformer(model_name, device="cpu")
+        transformer = st_model[0]
+        transformer.tokenizer.save_pretrained(self.model_dir)
+
+        module_names = [type(module).__name__ for module in st_model]
+        config = {
+            "dimension": st_model.get_sentence_embedding_dimension(),
+            "max_seq_length": st_model.max_seq_length,
+            "normalize": "Normalize" in module_names
+        }
+        with open(os.path.join(self.model_dir, "encoder_config.json"), "w") as f:
+            json.dump(config, f)
+
+        model = transformer.auto_model.eval()
+        dummy = transformer.tokenizer(["export"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(dummy[name] for name in input_names),
+                onnx_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14
+            )
+        logger.info(f"Exported ONNX model to {onnx_path}")
+
+    def _quantize(self, fp32_path: str, int8_path: str):
+        """Create a dynamically quantised int8 copy of the exported model"""
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        logger.info("Quantising ONNX embedding model to int8")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def memory_bytes(self) -> int:
+        """Approximate bytes held by the model weights (size of the ONNX file)"""
+        return os.path.getsize(self.model_path)
+
+    def encode(self, texts: List[str], show_progress_bar: bool = False, batch_size: int = 32, **kwargs) -> np.ndarray:
+        """
+        Encode texts with mean pooling over the attention mask
+
+        Args:
+            texts: List of text strings
+            batch_size: Number of texts per forward pass
+
+        Returns:
+            Numpy array of embeddings
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+
+        # Sort by length so each batch pads to a similar size
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        embeddings = np.zeros((len(texts), self.dimension), dtype="float32")
+
+        for start in range(0, len(order), batch_size):
+            batch_ids = order[start:start + batch_size]
+            encodings = self.tokenizer.encode_batch([texts[i] for i in batch_ids])
+
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype="int64")
+            feeds = {
+                "input_ids": np.array([e.ids for e in encodings], dtype="int64"),
+                "attention_mask": attention_mask,
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype="int64")
+            }
+            feeds = {name: value for name, value in feeds.items() if name in self.input_names}
+
+            hidden = self.session.run(None, feeds)[0]
+            mask = attention_mask[:, :, None].astype("float32")
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+            if self.normalize:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+            embeddings[batch_ids] = pooled
+
+        return embeddings
+
+
+def create_encoder(model_name: str = "all-MiniLM-L6-v2", backend: str = None):
+    """
+    Create the encoder selected by configuration
+
+    Args:
+        model_name: Name of the sentence transformer model
+        backend: Encoder backend, defaults to EMBEDDING_BACKEND
+
+    Returns:
+        Encoder instance
+    """
+    backend = backend or os.getenv("EMBEDDING_BACKEND", "local")
+
+    if backend == "server":
+        from backend.utils.embedding_server import EmbeddingClient, DEFAULT_SOCKET_PATH
+        socket_path = os.getenv("EMBEDDING_SOCKET", DEFAULT_SOCKET_PATH)
+        logger.info(f"Using embedding server at {socket_path}")
+        return EmbeddingClient(socket_path)
+
+    if backend == "onnx":
+        return ONNXEncoder(
+            model_name,
+            cache_dir=os.getenv("EMBEDDING_ONNX_DIR", DEFAULT_ONNX_DIR),
+            quantize=os.getenv("EMBEDDING_QUANTIZE", "").lower() == "int8",
+            num_threads=int(os.getenv("EMBEDDING_THREADS", 0))
+        )
+
+    if backend not in ("local", "torch"):
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    return SentenceTransformerEncoder(model_name)
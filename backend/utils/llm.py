@@ -1,33 +1,325 @@
 import os
-from groq import Groq
+import time
+import random
+import threading
+import contextvars
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait, TimeoutError as FutureTimeoutError
+from typing import ContextManager, Iterator, Optional
+from backend.utils.llm_providers import (
+    create_provider,
+    LLMCompletion,
+    LLMRateLimitError,
+    LLMTimeoutError,
+    LLMUnavailableError,
+)
+from backend.utils.metrics import LLM_REQUEST_SECONDS, LLM_TOKENS, LLM_RETRIES, LLM_HEDGES
+from backend.utils.profiling import span
+from backend.utils.singleflight import SingleFlight, FlightTimeoutError, hash_key
+from backend.utils.admission import llm_admission, AdmissionRejected
+from backend.utils.circuit_breaker import CircuitBreaker
 from backend.logger import get_logger
 
 logger = get_logger("LLM")
 
+# Errors worth another attempt; anything else fails the turn immediately
+TRANSIENT_ERRORS = (LLMRateLimitError, LLMTimeoutError, LLMUnavailableError)
+
+
+class BudgetExhaustedError(LLMTimeoutError):
+    """The call's own time budget ran out before the provider could answer"""
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """
+    Whether a failed call counts against the provider's health
+
+    Only transient provider errors do. Request errors (4xx) and an exhausted
+    time budget say nothing about the provider and leave the breaker alone.
+
+    Args:
+        error: Raised error, or the RuntimeError _complete wraps it in
+    """
+    if isinstance(error, RuntimeError) and error.__cause__ is not None:
+        error = error.__cause__
+    return isinstance(error, TRANSIENT_ERRORS) and not isinstance(error, BudgetExhaustedError)
+
+# Successful latencies needed before hedging starts
+HEDGE_MIN_SAMPLES = 20
+
+# Admission queue hedges share; its per-user limit caps hedges in flight
+HEDGE_ADMISSION_USER = "background:hedge"
+
+
+class LatencyWindow:
+    def __init__(self, size: int = 200):
+        """
+        Recent successful request latencies
+
+        Args:
+            size: Number of latencies kept
+        """
+        self._values = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._values.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """q-th percentile of the window, or None until HEDGE_MIN_SAMPLES are seen"""
+        with self._lock:
+            if len(self._values) < HEDGE_MIN_SAMPLES:
+                return None
+            values = sorted(self._values)
+        return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+
 class GroqLLM:
-    def __init__(self):
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+    def __init__(self, provider=None):
+        # Provider is chosen by LLM_PROVIDER (see llm_providers.py)
+        self.provider = provider or create_provider()
+
+        self.model = os.getenv("LLM_MODEL", "llama-3.1-8b-instant")
+        self.temperature = 0.7
+        self.max_tokens = 1024
+
+        # Total time a chat call may take, across retries and hedges
+        self.budget = float(os.getenv("LLM_TIMEOUT_BUDGET", "30"))
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "2"))
+        self.retry_base = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+
+        # Optional second request once the first is slower than the recent p95
+        self.hedge = os.getenv("LLM_HEDGE", "0") == "1"
+        self.hedge_model = os.getenv("LLM_HEDGE_MODEL") or self.model
+        self.hedge_min_delay = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
+        # Per model, so a faster hedge model does not pull down the primary's p95
+        self.latencies = {model: LatencyWindow() for model in {self.model, self.hedge_model}}
+        self.executor = ThreadPoolExecutor(
+            int(os.getenv("LLM_HEDGE_WORKERS", "32")),
+            thread_name_prefix="llm-hedge"
+        ) if self.hedge else None
+
+        # Identical prompts in flight at once (retries, double submits) share one
+        # request; a rejected admission is the leader's own and is not shared
+        self.flights = SingleFlight("llm", unshared=(AdmissionRejected,))
 
-        self.model = "llama-3.1-8b-instant"
-    
-    def chat(self, messages: list) -> str:
+        # Fail fast while the provider is failing (raises CircuitOpenError)
+        self.breaker = CircuitBreaker(
+            "llm",
+            failure_rate=float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5")),
+            min_calls=int(os.getenv("LLM_BREAKER_MIN_CALLS", "10")),
+            window=float(os.getenv("LLM_BREAKER_WINDOW", "60")),
+            open_seconds=float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+        )
+
+    def chat(self, messages: list, admission: Optional[ContextManager] = None, deadline: Optional[float] = None) -> str:
         """
-        Send chat messages to Groq API and get response
+        Send chat messages to the LLM provider and get response
+
+        Concurrent calls with the same model settings and message list are
+        coalesced into one provider request; a caller waiting on another's
+        request gives up at its own deadline. Raises CircuitOpenError without
+        calling the provider while the circuit breaker is open.
+
+        Args:
+            messages: Chat messages
+            admission: Context manager entered around the provider request,
+                only by the call that actually makes it
+            deadline: time.monotonic() by which the call must finish,
+                defaults to LLM_TIMEOUT_BUDGET from now
         """
+        deadline = deadline or time.monotonic() + self.budget
+        key = hash_key(self.model, self.temperature, self.max_tokens, messages)
         try:
-            logger.info(f"Sending request to GROQ API with model: {self.model}")
+            return self.flights.do(key, self._chat, messages, admission, deadline, deadline=deadline)
+        except FlightTimeoutError as e:
+            logger.error(f"LLM API error: {e}")
+            raise RuntimeError("Failed to get LLM response") from e
 
-            chat_completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=1024
-            )
+    def _chat(self, messages: list, admission: Optional[ContextManager], deadline: float) -> str:
+        # Checked before admission so an open circuit costs no queue slot
+        probe = self.breaker.acquire()
+        recorded = False
+        try:
+            with admission or nullcontext():
+                try:
+                    content = self._complete(messages, deadline)
+                except Exception as e:
+                    # Anything else is neutral and abandoned below
+                    if is_provider_failure(e):
+                        self.breaker.record(False, probe)
+                        recorded = True
+                    raise
+                self.breaker.record(True, probe)
+                recorded = True
+                return content
+        finally:
+            if not recorded:
+                self.breaker.abandon(probe)
 
-            response = chat_completion.choices[0].message.content
-            logger.info("LLM response generated successfully")
-            return response
+    def _complete(self, messages: list, deadline: float) -> str:
+        """Retry transient failures with jittered backoff until the deadline"""
+        attempt = 0
+        try:
+            while True:
+                try:
+                    return self._hedged(messages, deadline).content
+                except TRANSIENT_ERRORS as e:
+                    # Full jitter keeps retries from many turns from lining up
+                    delay = random.uniform(0, min(8.0, self.retry_base * 2 ** attempt))
+                    if isinstance(e, LLMRateLimitError) and e.retry_after:
+                        delay = max(delay, e.retry_after)
+                    if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                        raise
+
+                    attempt += 1
+                    LLM_RETRIES.labels(reason=type(e).__name__).inc()
+                    logger.warning(f"LLM attempt {attempt} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+                    time.sleep(delay)
 
         except Exception as e:
             logger.error(f"LLM API error: {e}")
             raise RuntimeError("Failed to get LLM response") from e
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there is too little history"""
+        p95 = self.latencies[self.model].percentile(95)
+        return None if p95 is None else max(self.hedge_min_delay, p95)
+
+    def _hedged(self, messages: list, deadline: float) -> LLMCompletion:
+        """
+        One attempt, hedged with a second request if the first is slow
+
+        The hedge needs a free admission slot of its own (never queued, and at
+        most LLM_MAX_CONCURRENCY_PER_USER hedges at once); without one the
+        attempt just waits for the first request. The slower request is not
+        cancelled (the HTTP call cannot be interrupted); it finishes in the
+        background and its result is dropped.
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise BudgetExhaustedError("LLM time budget exhausted")
+
+        delay = self.hedge_delay() if self.hedge else None
+        if delay is None or delay >= remaining:
+            return self._call(self.model, messages, remaining)
+
+        # Each worker runs in its own copy of the caller's context
+        primary = self.executor.submit(contextvars.copy_context().run, self._call, self.model, messages, remaining)
+        try:
+            return primary.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+
+        if not llm_admission.try_acquire(HEDGE_ADMISSION_USER):
+            LLM_HEDGES.labels(outcome="skipped").inc()
+            try:
+                return primary.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                raise BudgetExhaustedError("LLM time budget exhausted")
+
+        LLM_HEDGES.labels(outcome="launched").inc()
+        hedge = self.executor.submit(
+            contextvars.copy_context().run, self._hedge_call, messages, deadline - time.monotonic()
+        )
+
+        pending, error = {primary, hedge}, None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise BudgetExhaustedError("LLM time budget exhausted")
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        LLM_HEDGES.labels(outcome="won").inc()
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _hedge_call(self, messages: list, timeout: float) -> LLMCompletion:
+        """Hedge request, holding the admission slot _hedged took until it finishes"""
+        start = time.perf_counter()
+        try:
+            return self._call(self.hedge_model, messages, timeout)
+        finally:
+            llm_admission.release(HEDGE_ADMISSION_USER, time.perf_counter() - start)
+
+    def _call(self, model: str, messages: list, timeout: float) -> LLMCompletion:
+        """Single provider request"""
+        start = time.perf_counter()
+        try:
+            with span("llm.chat", model=model):
+                completion = self.provider.complete(
+                    messages,
+                    model=model,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    timeout=timeout
+                )
+        except Exception:
+            LLM_REQUEST_SECONDS.labels(model=model, outcome="error").observe(time.perf_counter() - start)
+            raise
+
+        elapsed = time.perf_counter() - start
+        self.latencies[model].add(elapsed)
+        LLM_REQUEST_SECONDS.labels(model=model, outcome="success").observe(elapsed)
+        LLM_TOKENS.labels(model=model, kind="prompt").observe(completion.prompt_tokens)
+        LLM_TOKENS.labels(model=model, kind="completion").observe(completion.completion_tokens)
+
+        logger.info("LLM response from %s (%s): %d completion tokens",
+                    self.provider.name, model, completion.completion_tokens,
+                    extra={"category": "llm"})
+        return completion
+
+    def stream(
+        self,
+        messages: list,
+        admission: Optional[ContextManager] = None,
+        deadline: Optional[float] = None
+    ) -> Iterator[str]:
+        """
+        Stream a response from the LLM provider as text deltas
+
+        Goes through the circuit breaker like chat(), but is neither retried,
+        hedged nor coalesced: deltas may already have reached the client.
+
+        Args:
+            messages: Chat messages
+            admission: Context manager held for the whole stream
+            deadline: time.monotonic() by which the stream must finish,
+                defaults to LLM_TIMEOUT_BUDGET from now
+        """
+        probe = self.breaker.acquire()
+        recorded = False
+        try:
+            with admission or nullcontext():
+                timeout = (deadline or time.monotonic() + self.budget) - time.monotonic()
+                start = time.perf_counter()
+                try:
+                    for delta in self.provider.stream(
+                        messages,
+                        model=self.model,
+                        temperature=self.temperature,
+                        max_tokens=self.max_tokens,
+                        timeout=timeout
+                    ):
+                        yield delta
+                except GeneratorExit:
+                    # Consumer went away; says nothing about the provider
+                    raise
+                except Exception as e:
+                    LLM_REQUEST_SECONDS.labels(model=self.model, outcome="error").observe(time.perf_counter() - start)
+                    if is_provider_failure(e):
+                        self.breaker.record(False, probe)
+                        recorded = True
+                    logger.error(f"LLM streaming error: {e}")
+                    raise RuntimeError("Failed to get LLM response") from e
+
+                LLM_REQUEST_SECONDS.labels(model=self.model, outcome="success").observe(time.perf_counter() - start)
+                self.breaker.record(True, probe)
+                recorded = True
+        finally:
+            if not recorded:
+                self.breaker.abandon(probe)
@@ -0,0 +1,172 @@
+"""
+LLM provider interface.
+
+``GroqLLM`` talks to a provider selected by LLM_PROVIDER:
+
+    LLM_PROVIDER=groq        Groq API (default)
+    LLM_PROVIDER=simulator   deterministic offline simulator (llm_simulator.py)
+
+Providers translate their own failures into ``LLMRateLimitError``,
+``LLMTimeoutError`` and ``LLMUnavailableError`` so retry and admission logic
+does not depend on a specific SDK.
+"""
+import os
+from abc import ABC, abstractmethod
+from typing import Iterator, List, Optional
+from backend.logger import get_logger
+
+logger = get_logger("LLMProviders")
+
+
+class LLMProviderError(Exception):
+    """Transient or permanent failure reported by an LLM provider"""
+
+
+class LLMRateLimitError(LLMProviderError):
+    def __init__(self, message: str = "Rate limited by LLM provider", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMTimeoutError(LLMProviderError):
+    """The provider did not answer within the timeout"""
+
+
+class LLMUnavailableError(LLMProviderError):
+    """The provider could not be reached or failed with a server error"""
+
+
+class LLMCompletion:
+    __slots__ = ("content", "model", "prompt_tokens", "completion_tokens")
+
+    def __init__(self, content: str, model: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+        self.content = content
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+
+class LLMProvider(ABC):
+    name = "base"
+
+    @abstractmethod
+    def complete(
+        self,
+        messages: List[dict],
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: int = 1024,
+        timeout: Optional[float] = None
+    ) -> LLMCompletion:
+        """
+        Generate a full completion
+
+        Args:
+            messages: Chat messages
+            model: Model name
+            temperature: Sampling temperature
+            max_tokens: Maximum completion tokens
+            timeout: Request timeout in seconds
+
+        Returns:
+            LLMCompletion
+        """
+
+    @abstractmethod
+    def stream(
+        self,
+        messages: List[dict],
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: int = 1024,
+        timeout: Optional[float] = None
+    ) -> Iterator[str]:
+        """Generate a completion as a stream of text deltas"""
+
+
+class GroqProvider(LLMProvider):
+    name = "groq"
+
+    def __init__(self):
+        from groq import Groq
+
+        self.client = Groq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            base_url=os.getenv("GROQ_BASE_URL") or None
+        )
+
+    def _translate(self, error: Exception) -> Exception:
+        import groq
+
+        if isinstance(error, groq.RateLimitError):
+            retry_after = error.response.headers.get("retry-after") if error.response is not None else None
+            try:
+                retry_after = float(retry_after) if retry_after else None
+            except ValueError:
+                retry_after = None
+            return LLMRateLimitError(str(error), retry_after)
+        if isinstance(error, groq.APITimeoutError):
+            return LLMTimeoutError(str(error))
+        if isinstance(error, (groq.APIConnectionError, groq.InternalServerError)):
+            return LLMUnavailableError(str(error))
+        return error
+
+    def complete(self, messages, model, temperature=0.7, max_tokens=1024, timeout=None) -> LLMCompletion:
+        try:
+            chat_completion = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout
+            )
+        except Exception as e:
+            raise self._translate(e) from e
+
+        usage = chat_completion.usage
+        return LLMCompletion(
+            content=chat_completion.choices[0].message.content,
+            model=model,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0
+        )
+
+    def stream(self, messages, model, temperature=0.7, max_tokens=1024, timeout=None) -> Iterator[str]:
+        try:
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                stream=True
+            )
+            for chunk in response:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+        except Exception as e:
+            raise self._translate(e) from e
+
+
+def create_provider(name: str = None) -> LLMProvider:
+    """
+    Create the LLM provider selected by configuration
+
+    Args:
+        name: Provider name, defaults to LLM_PROVIDER
+
+    Returns:
+        LLMProvider instance
+    """
+    name = name or os.getenv("LLM_PROVIDER", "groq")
+
+    if name == "groq":
+        return GroqProvider()
+
+    if name == "simulator":
+        from backend.utils.llm_simulator import SimulatedProvider
+        logger.info("Using simulated LLM provider")
+        return SimulatedProvider.from_env()
+
+    raise ValueError(f"Unknown LLM provider: {name}")
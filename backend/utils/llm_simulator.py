@@ -0,0 +1,154 @@
+"""
+Deterministic offline LLM simulator.
+
+Returns completions derived from a hash of the message list, so identical
+prompts always get identical answers, and models the provider behaviour
+that matters under load: log-normal latency to first token, a fixed token
+generation rate, a requests-per-minute limit, and random rate-limit errors
+and timeouts. Latency and failure draws come from a seeded generator, so a
+given request sequence replays the same way on every run.
+"""
+import os
+import json
+import math
+import time
+import random
+import hashlib
+import threading
+from collections import deque
+from typing import Iterator, List
+from backend.utils.llm_providers import (
+    LLMProvider,
+    LLMCompletion,
+    LLMRateLimitError,
+    LLMTimeoutError,
+)
+
+VOCABULARY = (
+    "stay hydrated and rest well monitor your symptoms closely consult your "
+    "doctor if pain persists keep track of blood pressure readings maintain "
+    "a balanced diet with vegetables whole grains and lean protein regular "
+    "exercise improves heart health take medication as prescribed avoid known "
+    "allergens get enough sleep each night reduce stress where possible"
+).split()
+
+
+class SimulatedProvider(LLMProvider):
+    name = "simulator"
+
+    def __init__(
+        self,
+        seed: int = 0,
+        latency_median_ms: float = 400.0,
+        latency_sigma: float = 0.5,
+        tokens_per_second: float = 500.0,
+        completion_tokens: int = 150,
+        rate_limit_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        requests_per_minute: int = 0,
+        default_timeout: float = 30.0
+    ):
+        """
+        Initialize simulator
+
+        Args:
+            seed: Seed for latency and failure draws
+            latency_median_ms: Median time to first token
+            latency_sigma: Log-normal shape of the latency distribution
+            tokens_per_second: Generation speed after the first token
+            completion_tokens: Tokens per completion (capped by max_tokens)
+            rate_limit_rate: Probability of a random rate-limit error
+            timeout_rate: Probability that a request hangs until its timeout
+            requests_per_minute: Sliding-window request limit (0 = unlimited)
+            default_timeout: Timeout used when the caller passes none
+        """
+        self.latency_mu = math.log(max(latency_median_ms, 0.001) / 1000)
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.rate_limit_rate = rate_limit_rate
+        self.timeout_rate = timeout_rate
+        self.requests_per_minute = requests_per_minute
+        self.default_timeout = default_timeout
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = deque()
+
+    @classmethod
+    def from_env(cls) -> "SimulatedProvider":
+        return cls(
+            seed=int(os.getenv("LLM_SIM_SEED", 0)),
+            latency_median_ms=float(os.getenv("LLM_SIM_LATENCY_MS", 400)),
+            latency_sigma=float(os.getenv("LLM_SIM_LATENCY_SIGMA", 0.5)),
+            tokens_per_second=float(os.getenv("LLM_SIM_TOKENS_PER_SECOND", 500)),
+            completion_tokens=int(os.getenv("LLM_SIM_COMPLETION_TOKENS", 150)),
+            rate_limit_rate=float(os.getenv("LLM_SIM_RATE_LIMIT_RATE", 0)),
+            timeout_rate=float(os.getenv("LLM_SIM_TIMEOUT_RATE", 0)),
+            requests_per_minute=int(os.getenv("LLM_SIM_RPM", 0))
+        )
+
+    def _tokens(self, messages: List[dict], max_tokens: int) -> List[str]:
+        """Deterministic completion tokens for a message list"""
+        digest = hashlib.sha256(json.dumps(messages, sort_keys=True, default=str).encode()).digest()
+        rng = random.Random(digest)
+        count = min(self.completion_tokens, max_tokens)
+        return [rng.choice(VOCABULARY) for _ in range(count)]
+
+    def _admit(self, timeout: float) -> float:
+        """
+        Draw this request's fate and latency
+
+        Returns:
+            Time to first token in seconds
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.requests_per_minute:
+                while self._window and now - self._window[0] > 60:
+                    self._window.popleft()
+                if len(self._window) >= self.requests_per_minute:
+                    retry_after = 60 - (now - self._window[0])
+                    raise LLMRateLimitError("Simulated requests-per-minute limit reached", retry_after)
+                self._window.append(now)
+
+            failure = self._rng.random()
+            latency = self._rng.lognormvariate(self.latency_mu, self.latency_sigma)
+
+        if failure < self.rate_limit_rate:
+            time.sleep(min(latency, 0.05))
+            raise LLMRateLimitError("Simulated rate limit", retry_after=1.0)
+
+        if failure < self.rate_limit_rate + self.timeout_rate or latency > timeout:
+            time.sleep(timeout)
+            raise LLMTimeoutError(f"Simulated timeout after {timeout:.1f}s")
+
+        return latency
+
+    def complete(self, messages, model, temperature=0.7, max_tokens=1024, timeout=None) -> LLMCompletion:
+        timeout = timeout or self.default_timeout
+        latency = self._admit(timeout)
+        tokens = self._tokens(messages, max_tokens)
+
+        generation = len(tokens) / self.tokens_per_second
+        if latency + generation > timeout:
+            time.sleep(timeout)
+            raise LLMTimeoutError(f"Simulated timeout after {timeout:.1f}s")
+        time.sleep(latency + generation)
+
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+        return LLMCompletion(
+            content=" ".join(tokens),
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=len(tokens)
+        )
+
+    def stream(self, messages, model, temperature=0.7, max_tokens=1024, timeout=None) -> Iterator[str]:
+        timeout = timeout or self.default_timeout
+        time.sleep(self._admit(timeout))
+
+        interval = 1 / self.tokens_per_second
+        for i, token in enumerate(self._tokens(messages, max_tokens)):
+            yield token if i == 0 else " " + token
+            time.sleep(interval)
@@ -0,0 +1,139 @@
+"""
+Memory accounting for the vector store and in-process caches.
+
+Caches register a callable that reports their size in bytes so the admin
+memory endpoint can list them next to the index, chunk metadata and model.
+"""
+import os
+import sys
+import time
+import threading
+from collections import deque
+import tracemalloc
+from typing import Callable, Dict, List
+
+_caches: Dict[str, Callable[[], int]] = {}
+
+# Only one temporary tracing window at a time
+_window_lock = threading.Lock()
+
+
+def register_cache(name: str, size_fn: Callable[[], int]):
+    """
+    Register an in-process cache for memory reporting
+
+    Args:
+        name: Name shown in the report
+        size_fn: Callable returning the cache size in bytes
+    """
+    _caches[name] = size_fn
+
+
+def cache_sizes() -> Dict[str, int]:
+    sizes = {}
+    for name, size_fn in _caches.items():
+        try:
+            sizes[name] = int(size_fn())
+        except Exception:
+            sizes[name] = -1
+    return sizes
+
+
+def deep_sizeof(obj, seen: set = None) -> int:
+    """
+    Approximate bytes held by an object graph of builtin containers
+
+    Objects reachable several times (for example shared key strings) are
+    only counted once.
+    """
+    seen = set() if seen is None else seen
+    stack = [obj]
+    total = 0
+
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset, deque)):
+            stack.extend(current)
+
+    return total
+
+
+def process_rss() -> int:
+    """Resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    import resource
+    # ru_maxrss is the peak, in KiB on Linux and bytes on macOS
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def tracemalloc_top(limit: int = 20, window_seconds: float = 5.0) -> Dict:
+    """
+    Take a tracemalloc snapshot grouped by source line
+
+    With TRACEMALLOC=1 tracing runs from startup and the snapshot covers
+    the whole process. Otherwise tracing runs only for window_seconds
+    (one window at a time) and is stopped again, so production traffic
+    pays its overhead only while someone is looking; the snapshot then
+    covers allocations made during the window and still alive at its end.
+
+    Args:
+        limit: Number of top allocation sites returned
+        window_seconds: Length of the tracing window when not tracing already
+
+    Returns:
+        Snapshot summary
+    """
+    with _window_lock:
+        if tracemalloc.is_tracing():
+            mode = "startup"
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        else:
+            mode = "window"
+            tracemalloc.start()
+            try:
+                time.sleep(window_seconds)
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+    top: List[Dict] = []
+    for stat in snapshot.statistics("lineno")[:limit]:
+        frame = stat.traceback[0]
+        top.append({
+            "location": f"{frame.filename}:{frame.lineno}",
+            "size_bytes": stat.size,
+            "count": stat.count
+        })
+
+    summary = {
+        "mode": mode,
+        "tracing": tracemalloc.is_tracing(),
+        "traced_current_bytes": current,
+        "traced_peak_bytes": peak,
+        "top": top
+    }
+    if mode == "window":
+        summary["window_seconds"] = window_seconds
+    return summary
+
+
+if os.getenv("TRACEMALLOC") == "1" and not tracemalloc.is_tracing():
+    tracemalloc.start()
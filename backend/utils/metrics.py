@@ -0,0 +1,260 @@
+"""
+Prometheus metrics for the chat pipeline.
+
+All instruments live here so the rest of the code base only imports the
+metric it records. When PROMETHEUS_MULTIPROC_DIR is set (several uvicorn
+workers), /metrics aggregates the per-process files.
+"""
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    generate_latest,
+)
+from backend.utils.profiling import span
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+MONGO_QUERY_SECONDS = Histogram(
+    "healthbot_mongo_query_seconds",
+    "MongoDB query latency",
+    ["query"],
+    buckets=LATENCY_BUCKETS
+)
+
+EMBEDDING_SECONDS = Histogram(
+    "healthbot_embedding_seconds",
+    "Time spent encoding text",
+    ["kind"],
+    buckets=LATENCY_BUCKETS
+)
+
+VECTOR_SEARCH_SECONDS = Histogram(
+    "healthbot_vector_search_seconds",
+    "FAISS search latency",
+    buckets=LATENCY_BUCKETS
+)
+
+SPARSE_SEARCH_SECONDS = Histogram(
+    "healthbot_sparse_search_seconds",
+    "BM25 inverted index search latency",
+    buckets=LATENCY_BUCKETS
+)
+
+RETRIEVAL_PATHS = Counter(
+    "healthbot_retrieval_path_total",
+    "Searches by retrieval path (dense, sparse, hybrid)",
+    ["path"]
+)
+
+PROMPT_BUILD_SECONDS = Histogram(
+    "healthbot_prompt_build_seconds",
+    "Time spent assembling the LLM prompt",
+    buckets=LATENCY_BUCKETS
+)
+
+LLM_REQUEST_SECONDS = Histogram(
+    "healthbot_llm_request_seconds",
+    "LLM provider request latency",
+    ["model", "outcome"],
+    buckets=LATENCY_BUCKETS
+)
+
+LLM_TOKENS = Histogram(
+    "healthbot_llm_tokens",
+    "Tokens per LLM request",
+    ["model", "kind"],
+    buckets=TOKEN_BUCKETS
+)
+
+RAG_STAGE_SECONDS = Histogram(
+    "healthbot_rag_stage_seconds",
+    "Latency of each concurrent pre-LLM stage of generate_response",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+
+RAG_STAGE_TIMEOUTS = Counter(
+    "healthbot_rag_stage_timeouts_total",
+    "Pre-LLM stages abandoned after their timeout",
+    ["stage"]
+)
+
+CHAT_RESPONSE_SECONDS = Histogram(
+    "healthbot_chat_response_seconds",
+    "Total time spent in RAGSystem.generate_response",
+    buckets=LATENCY_BUCKETS
+)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "healthbot_http_request_seconds",
+    "Total HTTP request time",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+
+CACHE_REQUESTS = Counter(
+    "healthbot_cache_requests_total",
+    "Cache lookups by result",
+    ["cache", "result"]
+)
+
+INGESTION_JOBS = Counter(
+    "healthbot_ingestion_jobs_total",
+    "Document ingestion jobs by status",
+    ["status"]
+)
+
+
+LLM_RETRIES = Counter(
+    "healthbot_llm_retries_total",
+    "LLM requests retried after a transient error",
+    ["reason"]
+)
+
+LLM_HEDGES = Counter(
+    "healthbot_llm_hedges_total",
+    "Hedged LLM requests launched, skipped for lack of a free slot, and how many finished first",
+    ["outcome"]
+)
+
+LLM_IN_FLIGHT = Gauge(
+    "healthbot_llm_in_flight",
+    "LLM requests currently admitted",
+    multiprocess_mode="livesum"
+)
+
+LLM_QUEUE_DEPTH = Gauge(
+    "healthbot_llm_queue_depth",
+    "LLM requests waiting for admission",
+    multiprocess_mode="livesum"
+)
+
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "healthbot_llm_queue_wait_seconds",
+    "Time LLM requests waited for admission",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS
+)
+
+LLM_ADMISSION_REJECTIONS = Counter(
+    "healthbot_llm_admission_rejections_total",
+    "LLM requests rejected by admission control",
+    ["reason"]
+)
+
+
+SINGLEFLIGHT_SHARED = Counter(
+    "healthbot_singleflight_shared_total",
+    "Calls answered by an identical call already in flight",
+    ["kind"]
+)
+
+
+CIRCUIT_STATE = Gauge(
+    "healthbot_circuit_state",
+    "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+    ["circuit"],
+    multiprocess_mode="max"
+)
+
+CIRCUIT_TRANSITIONS = Counter(
+    "healthbot_circuit_transitions_total",
+    "Circuit breaker state changes",
+    ["circuit", "state"]
+)
+
+DEGRADED_RESPONSES = Counter(
+    "healthbot_degraded_responses_total",
+    "Chat turns answered without the LLM, by source",
+    ["source"]
+)
+
+SUMMARY_JOBS = Counter(
+    "healthbot_summary_jobs_total",
+    "Background document summaries, by status",
+    ["status"]
+)
+
+SUMMARY_SECONDS = Histogram(
+    "healthbot_summary_seconds",
+    "Time to summarize one document",
+    buckets=(1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+
+CHAT_WS_CONNECTIONS = Gauge(
+    "healthbot_chat_ws_connections",
+    "Open chat WebSocket connections",
+    multiprocess_mode="livesum"
+)
+
+CHAT_WS_TURNS = Counter(
+    "healthbot_chat_ws_turns_total",
+    "Chat turns over WebSocket, by outcome",
+    ["outcome"]
+)
+
+
+# Span recorded by timed() for each histogram when the request is profiled
+SPAN_NAMES = {
+    MONGO_QUERY_SECONDS: "mongo_query",
+    EMBEDDING_SECONDS: "embedding",
+    VECTOR_SEARCH_SECONDS: "vector_search",
+    SPARSE_SEARCH_SECONDS: "sparse_search",
+    PROMPT_BUILD_SECONDS: "prompt_build",
+    RAG_STAGE_SECONDS: "rag_stage",
+    CHAT_RESPONSE_SECONDS: "chat_response",
+    SUMMARY_SECONDS: "summary",
+}
+
+
+@contextmanager
+def timed(histogram, **labels):
+    """
+    Observe the duration of a block on a histogram
+
+    The block is also recorded as a span when the request is being profiled.
+
+    Args:
+        histogram: Histogram to record into
+        labels: Label values for the histogram
+    """
+    metric = histogram.labels(**labels) if labels else histogram
+    name = SPAN_NAMES.get(histogram, "timed")
+    if labels:
+        name += "." + ".".join(str(value) for value in labels.values())
+
+    start = time.perf_counter()
+    try:
+        with span(name):
+            yield
+    finally:
+        metric.observe(time.perf_counter() - start)
+
+
+def record_cache(cache: str, hit: bool):
+    """Count a cache lookup"""
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def render_metrics():
+    """
+    Render all metrics in the Prometheus text format
+
+    Returns:
+        Tuple of (payload, content type)
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
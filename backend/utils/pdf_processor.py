@@ -1,10 +1,33 @@
 import os
-from typing import List, Dict
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Tuple, Union
 from PyPDF2 import PdfReader
 from backend.logger import get_logger
 
 logger = get_logger("PDFProcessor")
 
+_pool = None
+
+
+def _extraction_pool() -> ProcessPoolExecutor:
+    """Process pool for bulk extraction, created on first use"""
+    global _pool
+    if _pool is None:
+        workers = int(os.getenv("PDF_WORKERS", min(4, os.cpu_count() or 1)))
+        # spawn, not fork: the server process runs several threads
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _process_pdf_safe(processor: "PDFProcessor", pdf_path: str, chunk_size: int) -> Union[List[Dict], str]:
+    """Worker entry point: chunks on success, an error message on failure"""
+    try:
+        return processor.process_pdf(pdf_path, chunk_size)
+    except Exception as e:
+        return str(e)
+
 class PDFProcessor:
     def __init__(self, upload_dir: str = "backend/documents"):
         self.upload_dir = upload_dir
@@ -99,4 +122,29 @@ class PDFProcessor:
             for idx, chunk in enumerate(chunks)
         ]
         
-        return processed_chunks
\ No newline at end of file
+        return processed_chunks
+    
+    def process_many(self, pdf_paths: List[str], chunk_size: int = 500) -> List[Tuple[str, Union[List[Dict], str]]]:
+        """
+        Process several PDFs in parallel worker processes
+        
+        Args:
+            pdf_paths: Paths to PDF files
+            chunk_size: Size of text chunks
+            
+        Returns:
+            List of (path, chunks) in input order; chunks is an error
+            message for files that could not be processed
+        """
+        if len(pdf_paths) == 1:
+            return [(pdf_paths[0], _process_pdf_safe(self, pdf_paths[0], chunk_size))]
+        
+        global _pool
+        pool = _extraction_pool()
+        try:
+            results = list(pool.map(_process_pdf_safe, [self] * len(pdf_paths), pdf_paths, [chunk_size] * len(pdf_paths)))
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool next time
+            _pool = None
+            raise
+        return list(zip(pdf_paths, results))
\ No newline at end of file
@@ -0,0 +1,267 @@
+"""
+On-demand per-request profiling.
+
+A request is profiled when it carries ``X-Profile-Request`` together with a
+valid admin token, or when it is picked by PROFILE_SAMPLE_RATE. Profiled
+requests record a span tree (DB calls, encodes, searches, LLM calls) and can
+optionally capture a sampling CPU profile as folded stacks.
+
+The CPU profile samples whichever threads are inside one of the request's
+spans: the request's context is copied into worker threads (rag stage pools,
+threadpool), so its stages are sampled wherever they run. Code outside any
+span, including the event-loop thread between spans, is not sampled, since
+that thread also runs other requests.
+
+When no profile is active, ``span()`` costs a single ContextVar lookup.
+"""
+import os
+import sys
+import hmac
+import time
+import uuid
+import random
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Set
+from backend.utils.memory import register_cache, deep_sizeof
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("profile_span", default=None)
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "end", "children")
+
+    def __init__(self, name: str, attrs: Dict = None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.start = time.perf_counter()
+        self.end = None
+        self.children: List["Span"] = []
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_dict(self, origin: float = None) -> Dict:
+        origin = self.start if origin is None else origin
+        return {
+            "name": self.name,
+            "attrs": self.attrs,
+            "offset_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration_ms, 3),
+            "children": [child.to_dict(origin) for child in self.children]
+        }
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Record a child span of the active request profile
+
+    Args:
+        name: Span name
+        attrs: Extra attributes stored on the span
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield
+        return
+
+    child = Span(name, attrs)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.enter_thread()
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.exit_thread()
+        child.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+class StackSampler(threading.Thread):
+    def __init__(self, threads: Callable[[], Set[int]], interval: float = 0.005):
+        """
+        Sample the stacks of a changing set of threads at a fixed interval
+
+        Args:
+            threads: Returns the idents of the threads to sample
+            interval: Seconds between samples
+        """
+        super().__init__(daemon=True)
+        self.threads = threads
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id in self.threads():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                # Thread name as the root frame keeps workers apart in flame graphs
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> Dict[str, int]:
+        """Stop sampling and return folded stacks with sample counts"""
+        self._stop_event.set()
+        self.join()
+        return dict(self.stacks.most_common())
+
+
+class RequestProfile:
+    def __init__(self, name: str, cpu: bool = False):
+        """
+        Profile of a single request
+
+        Args:
+            name: Name of the root span (method and path)
+            cpu: Also capture a sampling CPU profile
+        """
+        self.id = uuid.uuid4().hex[:16]
+        self.root = Span(name)
+        self.cpu = cpu
+        self.folded_stacks: Dict[str, int] = {}
+        self.created_at = time.time()
+        self._sampler: Optional[StackSampler] = None
+        self._tokens = None
+        # Thread ident -> spans of this request open on it
+        self._threads: Counter = Counter()
+        self._threads_lock = threading.Lock()
+
+    def start(self):
+        self._tokens = (_current_span.set(self.root), _current_profile.set(self if self.cpu else None))
+        if self.cpu:
+            interval = float(os.getenv("PROFILE_CPU_INTERVAL_MS", 5)) / 1000
+            self._sampler = StackSampler(self.active_threads, interval)
+            self._sampler.start()
+
+    def finish(self):
+        self.root.end = time.perf_counter()
+        if self._sampler is not None:
+            self.folded_stacks = self._sampler.stop()
+        if self._tokens is not None:
+            span_token, profile_token = self._tokens
+            _current_profile.reset(profile_token)
+            _current_span.reset(span_token)
+
+    def enter_thread(self):
+        """Mark the calling thread as working for this request"""
+        with self._threads_lock:
+            self._threads[threading.get_ident()] += 1
+
+    def exit_thread(self):
+        with self._threads_lock:
+            ident = threading.get_ident()
+            self._threads[ident] -= 1
+            if self._threads[ident] <= 0:
+                del self._threads[ident]
+
+    def active_threads(self) -> Set[int]:
+        """Threads currently inside one of this request's spans"""
+        with self._threads_lock:
+            return set(self._threads)
+
+    def server_timing(self) -> str:
+        """Server-Timing header value summarising direct and nested spans"""
+        totals: "OrderedDict[str, float]" = OrderedDict()
+        stack = list(self.root.children)
+        while stack:
+            current = stack.pop(0)
+            totals[current.name] = totals.get(current.name, 0.0) + current.duration_ms
+            stack.extend(current.children)
+
+        entries = [f"total;dur={self.root.duration_ms:.1f}"]
+        entries += [f"{name};dur={duration:.1f}" for name, duration in totals.items()]
+        return ", ".join(entries)
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "created_at": self.created_at,
+            "spans": self.root.to_dict(),
+            "cpu_samples": sum(self.folded_stacks.values()),
+            "folded_stacks": self.folded_stacks
+        }
+
+
+class ProfileStore:
+    def __init__(self, max_profiles: int = 100):
+        """
+        Keep the most recent request profiles for later retrieval
+
+        Args:
+            max_profiles: Number of profiles retained
+        """
+        self.max_profiles = max_profiles
+        self._profiles: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles[profile.id] = profile.to_dict()
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def nbytes(self) -> int:
+        with self._lock:
+            return deep_sizeof(self._profiles)
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {
+                    "id": p["id"],
+                    "name": p["spans"]["name"],
+                    "created_at": p["created_at"],
+                    "duration_ms": p["spans"]["duration_ms"]
+                }
+                for p in reversed(self._profiles.values())
+            ]
+
+
+def profiling_mode(headers, admin_token: Optional[str]) -> Optional[str]:
+    """
+    Decide whether a request should be profiled
+
+    Args:
+        headers: Request headers
+        admin_token: Configured admin token (ADMIN_TOKEN)
+
+    Returns:
+        None, "spans" or "cpu"
+    """
+    requested = headers.get("x-profile-request")
+    if requested and admin_token:
+        # Bytes, since compare_digest rejects non-ASCII str
+        if hmac.compare_digest(headers.get("x-admin-token", "").encode(), admin_token.encode()):
+            return "cpu" if requested.lower() == "cpu" else "spans"
+
+    if SAMPLE_RATE and random.random() < SAMPLE_RATE:
+        return "spans"
+    return None
+
+
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+profile_store = ProfileStore(int(os.getenv("PROFILE_STORE_SIZE", 100)))
+register_cache("request_profiles", profile_store.nbytes)
@@ -0,0 +1,92 @@
+"""
+Compressed vector codecs for shard indexes.
+
+    flat   float32, 4 bytes per dimension (exact, no re-rank)
+    fp16   float16, 2 bytes per dimension
+    sq8    8-bit scalar quantisation, 1 byte per dimension
+    pq     product quantisation, PQ_SUBQUANTIZERS bytes per vector
+
+Compressed indexes only produce candidates; the short list is re-ranked
+with exact distances against the full-precision vectors kept on disk next
+to the index (see UserShard.search). PQ codebooks need enough vectors to
+train, so shards smaller than PQ_MIN_TRAIN use fp16 until they grow.
+"""
+import os
+import numpy as np
+import faiss
+
+CODECS = ("flat", "fp16", "sq8", "pq")
+
+PQ_SUBQUANTIZERS = int(os.getenv("PQ_SUBQUANTIZERS", "48"))
+PQ_MIN_TRAIN = int(os.getenv("PQ_MIN_TRAIN", "2048"))
+
+# k-means needs at least one point per centroid (256 per 8-bit sub-quantizer)
+PQ_CENTROIDS = 256
+
+
+def effective_codec(codec: str, count: int) -> str:
+    """
+    Codec a shard of a given size is stored with
+
+    Args:
+        codec: Configured codec
+        count: Number of vectors in the shard
+
+    Returns:
+        The codec, or fp16 for PQ shards too small to train
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown vector codec '{codec}', expected one of {', '.join(CODECS)}")
+    if codec == "pq" and count < max(PQ_MIN_TRAIN, PQ_CENTROIDS):
+        return "fp16"
+    return codec
+
+
+def index_codec(index: faiss.Index) -> str:
+    """Name of the codec an index was built with"""
+    if isinstance(index, faiss.IndexPQ):
+        return "pq"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "flat"
+
+
+def _subquantizers(dimension: int) -> int:
+    """Largest sub-quantizer count up to PQ_SUBQUANTIZERS that divides the dimension"""
+    m = min(PQ_SUBQUANTIZERS, dimension)
+    while dimension % m:
+        m -= 1
+    return m
+
+
+def build_index(codec: str, dimension: int, vectors: np.ndarray = None) -> faiss.Index:
+    """
+    Create an index for a codec, trained on and filled with vectors
+
+    Args:
+        codec: One of CODECS (already resolved with effective_codec)
+        dimension: Embedding dimension
+        vectors: Optional float32 vectors to train on and add
+
+    Returns:
+        FAISS index
+    """
+    if codec == "flat":
+        index = faiss.IndexFlatL2(dimension)
+    elif codec == "fp16":
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+    elif codec == "sq8":
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    elif codec == "pq":
+        index = faiss.IndexPQ(dimension, _subquantizers(dimension), 8, faiss.METRIC_L2)
+        # Per-user shards are small; faiss's default asks for 39 points per centroid
+        index.pq.cp.min_points_per_centroid = 4
+    else:
+        raise ValueError(f"Unknown vector codec '{codec}'")
+
+    if vectors is not None and len(vectors):
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        if not index.is_trained:
+            index.train(vectors)
+        index.add(vectors)
+    return index
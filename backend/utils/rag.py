@@ -1,22 +1,114 @@
-from typing import List, Dict
+import os
+import re
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Iterator, List, Dict, Optional, Tuple
+from bson import ObjectId
 from backend.utils.llm import GroqLLM
+from backend.utils.admission import llm_admission, AdmissionRejected
+from backend.utils.circuit_breaker import CircuitOpenError
+from backend.utils.answer_cache import answer_cache
+from backend.utils.summaries import DocumentSummarizer, summary_context
 from backend.utils.embeddings import VectorStore
 from backend.db import Database
+from backend.utils.metrics import (
+    timed,
+    MONGO_QUERY_SECONDS,
+    PROMPT_BUILD_SECONDS,
+    CHAT_RESPONSE_SECONDS,
+    RAG_STAGE_SECONDS,
+    RAG_STAGE_TIMEOUTS,
+    DEGRADED_RESPONSES,
+)
 from backend.logger import get_logger
 
 logger = get_logger("RAG")
 
+# Per-stage timeouts (seconds) for the concurrent pre-LLM phase
+STAGE_TIMEOUT = float(os.getenv("RAG_STAGE_TIMEOUT", 3))
+SEARCH_TIMEOUT = float(os.getenv("RAG_SEARCH_TIMEOUT", STAGE_TIMEOUT))
+
+# Server-side limit on stage queries, so a slow Mongo frees the worker too
+STAGE_MAX_TIME_MS = int(STAGE_TIMEOUT * 1000)
+
+# Whole chat turn, including the LLM's retries and hedges
+TURN_BUDGET = float(os.getenv("CHAT_TURN_BUDGET", 30))
+
+# Cosine similarity for reusing an earlier answer while the LLM is down
+DEGRADED_CACHE_SIMILARITY = float(os.getenv("DEGRADED_CACHE_SIMILARITY", 0.9))
+
+# Precomputed summaries used for "summarize my report" style questions
+SUMMARY_CONTEXT_CHARS = int(os.getenv("SUMMARY_CONTEXT_CHARS", 6000))
+SUMMARY_MAX_DOCS = int(os.getenv("SUMMARY_MAX_DOCS", 3))
+
+# Prior messages sent to the LLM with each turn (4 exchanges)
+HISTORY_MESSAGES = 8
+
+REFUSAL = "I can't help with that. Please ask health-related questions."
+
+DEGRADED_NOTICE = (
+    "I'm having trouble reaching my language service right now, so I can't "
+    "write a new answer."
+)
+
 class RAGSystem:
     def __init__(self):
         self.llm = GroqLLM()
-        self.vector_store = VectorStore()
+        self.vector_store = VectorStore(store_dir=os.getenv("VECTOR_STORE_DIR", "backend/vector_store"))
+        self.summarizer = DocumentSummarizer(self.llm)
+        # One pool per stage, so workers stuck in a slow stage past its
+        # timeout cannot starve the other stages
+        self.stage_workers = int(os.getenv("RAG_STAGE_WORKERS", 16))
+        self.executors: Dict[str, ThreadPoolExecutor] = {}
+        self.executors_lock = threading.Lock()
+    
+    def get_user_with_profile(self, email: str) -> Optional[Dict]:
+        """
+        Fetch a user and their health profile in one round-trip
+        
+        Args:
+            email: User email
+            
+        Returns:
+            User document with its profile (or None) under "profile",
+            or None if the user does not exist
+        """
+        db = Database.get_db()
+        pipeline = [
+            {"$match": {"email": email}},
+            {"$limit": 1},
+            {"$project": {"password_hash": 0}},
+            # Profiles reference users by the string form of their ObjectId
+            {"$addFields": {"user_id": {"$toString": "$_id"}}},
+            {"$lookup": {
+                "from": "user_profiles",
+                "localField": "user_id",
+                "foreignField": "user_id",
+                "as": "profile"
+            }}
+        ]
+        with timed(MONGO_QUERY_SECONDS, query="user_with_profile"):
+            users = list(db["users"].aggregate(pipeline))
+        
+        if not users:
+            return None
+        
+        user = users[0]
+        user["profile"] = user["profile"][0] if user["profile"] else None
+        return user
     
     def get_user_info(self, user_id: str) -> Dict:
         """Get user basic info (name, email) from users collection"""
         try:
             db = Database.get_db()
             users_collection = db["users"]
-            user = users_collection.find_one({"_id": user_id})
+            if not ObjectId.is_valid(user_id):
+                return {}
+            with timed(MONGO_QUERY_SECONDS, query="user"):
+                user = users_collection.find_one({"_id": ObjectId(user_id)}, max_time_ms=STAGE_MAX_TIME_MS)
             
             if user:
                 return {
@@ -36,8 +128,26 @@ class RAGSystem:
             db = Database.get_db()
             profiles_collection = db["user_profiles"]
             
-            profile = profiles_collection.find_one({"user_id": user_id})
+            with timed(MONGO_QUERY_SECONDS, query="profile"):
+                profile = profiles_collection.find_one({"user_id": user_id}, max_time_ms=STAGE_MAX_TIME_MS)
             
+            return self.format_profile_context(profile)
+            
+        except Exception as e:
+            logger.error(f"Error loading user profile: {e}")
+            return ""
+    
+    def format_profile_context(self, profile: Optional[Dict]) -> str:
+        """
+        Format a user health profile as prompt context
+        
+        Args:
+            profile: Document from the user_profiles collection
+            
+        Returns:
+            Profile context, or an empty string if there is no profile
+        """
+        try:
             if not profile:
                 return ""
             
@@ -139,7 +249,7 @@ class RAGSystem:
             return '\n'.join(context_parts)
             
         except Exception as e:
-            logger.error(f"Error loading user profile: {e}")
+            logger.error(f"Error formatting user profile: {e}")
             return ""
     
     def build_system_prompt(self, user_profile_context: str, user_name: str = "") -> str:
@@ -260,91 +370,397 @@ IMPORTANT SAFETY RULES:
         query_lower = query.lower()
         return any(keyword in query_lower for keyword in doc_keywords)
     
+    def is_summary_query(self, query: str) -> bool:
+        """Check if asking for a summary or overview of documents"""
+        summary_keywords = ['summarize', 'summarise', 'summary', 'overview', 'key findings', 'main points', 'tl;dr']
+        query_lower = query.lower()
+        return any(keyword in query_lower for keyword in summary_keywords)
+    
+    def get_document_summaries(self, user_id: str, query: str) -> List[Dict]:
+        """
+        Precomputed summaries of the documents a summary question is about
+        
+        Documents whose name is mentioned in the query are used; otherwise
+        the most recent SUMMARY_MAX_DOCS. The budget SUMMARY_CONTEXT_CHARS is
+        shared between them.
+        
+        Returns:
+            Chunk-like dicts with "source", "text" and "document" (the
+            source of the summarized document's chunks), empty if no
+            summary is ready
+        """
+        db = Database.get_db()
+        with timed(MONGO_QUERY_SECONDS, query="summaries"):
+            documents = list(db["pdf_documents"].find(
+                {"user_id": user_id, "summary_status": "ready"},
+                {"filename": 1, "file_path": 1, "summary": 1}
+            ).sort("uploaded_at", -1).limit(50).max_time_ms(STAGE_MAX_TIME_MS))
+        if not documents:
+            return []
+        
+        query_lower = query.lower()
+        named = [
+            doc for doc in documents
+            if any(
+                len(word) >= 4 and word in query_lower
+                for word in re.split(r"[^a-z0-9]+", os.path.splitext(doc["filename"].lower())[0])
+            )
+        ]
+        documents = (named or documents)[:SUMMARY_MAX_DOCS]
+        
+        budget = SUMMARY_CONTEXT_CHARS // len(documents)
+        return [
+            {
+                "source": f"{doc['filename']} (summary)",
+                "text": summary_context(doc, budget),
+                # Search hits name their document by the stored file's name
+                "document": os.path.basename(doc["file_path"])
+            }
+            for doc in documents
+        ]
+    
     def has_user_documents(self, user_id: str) -> bool:
         """Check if user has documents"""
-        user_chunks = [c for c in self.vector_store.chunks if c.get("user_id") == user_id]
-        return len(user_chunks) > 0
+        return self.vector_store.user_chunk_count(user_id) > 0
     
-    def generate_response(
-        self, 
-        query: str, 
-        user_id: str, 
+    def stage_executor(self, name: str) -> ThreadPoolExecutor:
+        """Worker pool of one stage, created on first use"""
+        with self.executors_lock:
+            executor = self.executors.get(name)
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=self.stage_workers,
+                    thread_name_prefix=f"rag-{name}"
+                )
+                self.executors[name] = executor
+            return executor
+    
+    def _run_stage(self, name: str, func: Callable, *args) -> Tuple[Any, float]:
+        """Run one stage in a worker thread, returning (result, elapsed ms)"""
+        start = time.perf_counter()
+        with timed(RAG_STAGE_SECONDS, stage=name):
+            result = func(*args)
+        return result, (time.perf_counter() - start) * 1000
+    
+    def run_stages(
+        self,
+        stages: Dict[str, Tuple[Callable, tuple, float, Any]],
+        session_id: str = "",
+        timings: Dict[str, float] = None
+    ) -> Dict[str, Any]:
+        """
+        Run independent stages concurrently, each bounded by its own timeout
+        
+        Args:
+            stages: Mapping of stage name to (function, args, timeout seconds, fallback)
+            session_id: Session ID for log messages
+            timings: Optional dict that receives each stage's latency in ms
+            
+        Returns:
+            Mapping of stage name to its result, or its fallback on timeout/error
+        """
+        # Each stage runs in a copy of the caller's context so its spans
+        # attach to the request profile
+        futures = {
+            name: self.stage_executor(name).submit(contextvars.copy_context().run, self._run_stage, name, func, *args)
+            for name, (func, args, _, _) in stages.items()
+        }
+        
+        start = time.perf_counter()
+        results = {}
+        for name, future in futures.items():
+            _, _, timeout, fallback = stages[name]
+            remaining = max(0.0, start + timeout - time.perf_counter())
+            try:
+                results[name], elapsed = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                # Drop it if still queued; a running worker cannot be stopped
+                # (Mongo stages are bounded by STAGE_MAX_TIME_MS)
+                future.cancel()
+                RAG_STAGE_TIMEOUTS.labels(stage=name).inc()
+                logger.warning(f"[{session_id}] Stage '{name}' timed out after {timeout}s")
+                results[name], elapsed = fallback, timeout * 1000
+            except Exception as e:
+                logger.error(f"[{session_id}] Stage '{name}' failed: {e}")
+                results[name], elapsed = fallback, (time.perf_counter() - start) * 1000
+            if timings is not None:
+                timings[name] = round(elapsed, 2)
+        
+        return results
+    
+    def degraded_response(self, query: str, user_id: str, relevant_chunks: List[Dict]) -> Tuple[str, str]:
+        """
+        Answer without the LLM
+        
+        Tries, in order: an earlier answer to the same or a very similar
+        question, the passages retrieved from the user's documents, and a
+        plain status message.
+        
+        Returns:
+            Tuple of (source, response), source is cache, documents or status
+        """
+        try:
+            cached = answer_cache.lookup(
+                user_id, query, self.vector_store.model.encode, DEGRADED_CACHE_SIMILARITY
+            )
+        except Exception as e:
+            logger.warning(f"Answer cache lookup failed: {e}")
+            cached = None
+        
+        if cached:
+            earlier_query, answer = cached
+            return "cache", (
+                f"{DEGRADED_NOTICE} Here is what I told you earlier when you asked "
+                f"\"{earlier_query}\":\n\n{answer}"
+            )
+        
+        if relevant_chunks:
+            passages = "\n\n".join(
+                f"[{chunk['source']}]\n{chunk['text'][:500]}" for chunk in relevant_chunks
+            )
+            return "documents", (
+                f"{DEGRADED_NOTICE} These passages from your documents look most "
+                f"relevant to your question:\n\n{passages}"
+            )
+        
+        return "status", f"{DEGRADED_NOTICE} Please try again in a minute."
+    
+    def prepare_turn(
+        self,
+        query: str,
+        user_id: str,
         session_id: str,
-        conversation_history: List[Dict] = None
-    ) -> str:
+        conversation_history: List[Dict] = None,
+        timings: Dict[str, float] = None,
+        user: Dict = None
+    ) -> Tuple[Optional[List[Dict]], List[Dict]]:
         """
-        Generate personalized response
+        Everything before the LLM call: retrieval and prompt building
+        
+        User info, profile and document search do not depend on each other
+        and run concurrently, so this costs about as much as the slowest
+        stage. Callers that already hold the user (see
+        ``get_user_with_profile``) pass it as ``user`` and the user and
+        profile lookups are skipped.
+        
+        Returns:
+            (LLM messages, relevant chunks); messages is None when the query
+            is refused and REFUSAL should be sent instead
         """
-        # Load user info and profile
-        user_info = self.get_user_info(user_id)
-        user_name = user_info.get('username', '')
-        user_profile_context = self.get_user_profile_context(user_id)
+        start = time.perf_counter()
+        timings = timings if timings is not None else {}
         
         # Check query type
         is_greeting = self.is_greeting_or_casual(query)
         is_health = self.is_healthcare_related(query)
         is_doc_query = self.is_document_query(query)
         has_docs = self.has_user_documents(user_id)
-        has_profile = bool(user_profile_context)
+        is_summary = has_docs and self.is_summary_query(query)
         
-        # Search documents if relevant
-        relevant_chunks = []
+        # Load user info and profile, and search documents if relevant
+        stages = {}
+        if user is None:
+            stages["user_info"] = (self.get_user_info, (user_id,), STAGE_TIMEOUT, {})
+            stages["profile"] = (self.get_user_profile_context, (user_id,), STAGE_TIMEOUT, "")
         if has_docs and (is_health or is_doc_query):
-            relevant_chunks = self.vector_store.search(query, user_id, k=3)
+            stages["search"] = (self.vector_store.search, (query, user_id, 3), SEARCH_TIMEOUT, [])
+        if is_summary:
+            # Searched alongside, for documents whose summary is not ready yet
+            stages["summaries"] = (self.get_document_summaries, (user_id, query), STAGE_TIMEOUT, [])
         
-        logger.info(f"[{session_id}] User: {user_name}, Query: '{query}'")
-        logger.info(f"[{session_id}] Greeting: {is_greeting}, Health: {is_health}, Docs: {len(relevant_chunks)}, Profile: {has_profile}")
+        results = self.run_stages(stages, session_id, timings)
+        if user is None:
+            user_name = results["user_info"].get('username', '')
+            user_profile_context = results["profile"]
+        else:
+            user_name = user.get('username', '')
+            user_profile_context = self.format_profile_context(user.get("profile"))
+        # Search hits from documents without a returned summary are kept
+        summaries = results.get("summaries", [])
+        summarized = {summary["document"] for summary in summaries}
+        relevant_chunks = summaries + [
+            chunk for chunk in results.get("search", []) if chunk["source"] not in summarized
+        ]
+        has_profile = bool(user_profile_context)
+        timings["pre_llm"] = round((time.perf_counter() - start) * 1000, 2)
+        
+        logger.info(
+            "[%s] Query of %d chars - greeting: %s, health: %s, docs: %d, summaries: %d, profile: %s",
+            session_id, len(query), is_greeting, is_health, len(relevant_chunks),
+            len(summaries), has_profile,
+            extra={"category": "chat.turn", "session_id": session_id}
+        )
         
         # VERY PERMISSIVE - allow almost everything
         if not is_greeting and not is_health and not is_doc_query and not has_docs:
             # Only block truly inappropriate content
             spam_keywords = ['hack', 'crack', 'illegal', 'porn', 'xxx', 'violence', 'weapon']
             if any(word in query.lower() for word in spam_keywords):
-                return "I can't help with that. Please ask health-related questions."
+                return None, relevant_chunks
             
             # Otherwise, try to redirect gently
-            logger.info(f"[{session_id}] Borderline query - allowing with gentle redirect")
+            logger.info("[%s] Borderline query - allowing with gentle redirect", session_id,
+                        extra={"category": "chat.turn", "session_id": session_id})
         
-        # Build document context
-        document_context = ""
-        if relevant_chunks:
-            document_context = "\n=== RELEVANT MEDICAL DOCUMENTS ===\n"
-            for chunk in relevant_chunks:
-                document_context += f"\n[{chunk['source']}]\n{chunk['text']}\n"
-            document_context += "=== END DOCUMENTS ===\n"
-        
-        # Build system prompt with user info
-        system_prompt = self.build_system_prompt(user_profile_context, user_name)
-        
-        # Build conversation
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # Add recent history (last 8 messages = 4 exchanges)
-        if conversation_history and len(conversation_history) > 0:
-            recent = conversation_history[-8:]
-            for msg in recent:
-                messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
-            logger.info(f"[{session_id}] Added {len(recent)} history messages")
-        
-        # Add current query
-        if document_context:
-            user_message = f"{document_context}\n\nUser: {query}"
-        else:
-            user_message = query
+        with timed(PROMPT_BUILD_SECONDS):
+            # Build document context
+            document_context = ""
+            if relevant_chunks:
+                document_context = "\n=== RELEVANT MEDICAL DOCUMENTS ===\n"
+                for chunk in relevant_chunks:
+                    document_context += f"\n[{chunk['source']}]\n{chunk['text']}\n"
+                document_context += "=== END DOCUMENTS ===\n"
+        
+            # Build system prompt with user info
+            system_prompt = self.build_system_prompt(user_profile_context, user_name)
+        
+            # Build conversation
+            messages = [{"role": "system", "content": system_prompt}]
+        
+            # Add recent history (last 8 messages = 4 exchanges)
+            if conversation_history and len(conversation_history) > 0:
+                recent = conversation_history[-HISTORY_MESSAGES:]
+                for msg in recent:
+                    # Degraded answers were not written by the model
+                    if msg.get("degraded"):
+                        continue
+                    messages.append({
+                        "role": msg["role"],
+                        "content": msg["content"]
+                    })
+        
+            # Add current query
+            if document_context:
+                user_message = f"{document_context}\n\nUser: {query}"
+            else:
+                user_message = query
+        
+            messages.append({
+                "role": "user",
+                "content": user_message
+            })
         
-        messages.append({
-            "role": "user",
-            "content": user_message
-        })
+        return messages, relevant_chunks
+    
+    @contextmanager
+    def admitted(self, user_id: str, timings: Dict[str, float]):
+        """LLM admission slot for a user's turn, recording the queue wait"""
+        with llm_admission.slot(user_id) as waited:
+            timings["llm_queue"] = round(waited * 1000, 2)
+            yield
+    
+    def serve_degraded(self, query: str, user_id: str, session_id: str, relevant_chunks: List[Dict],
+                       status: Dict[str, Any], error: Exception) -> str:
+        """Degraded answer for a turn whose LLM call failed, recorded in ``status``"""
+        logger.warning(f"[{session_id}] LLM unavailable ({type(error).__name__}), serving degraded answer")
+        status["degraded"], response = self.degraded_response(query, user_id, relevant_chunks)
+        DEGRADED_RESPONSES.labels(source=status["degraded"]).inc()
+        return response
+    
+    @timed(CHAT_RESPONSE_SECONDS)
+    def generate_response(
+        self, 
+        query: str, 
+        user_id: str, 
+        session_id: str,
+        conversation_history: List[Dict] = None,
+        timings: Dict[str, float] = None,
+        user: Dict = None,
+        status: Dict[str, Any] = None
+    ) -> str:
+        """
+        Generate personalized response
+        
+        See ``prepare_turn`` for the pre-LLM phase. Pass a dict as
+        ``timings`` to receive per-stage latencies in milliseconds.
         
-        # Generate response
-        logger.info(f"[{session_id}] Sending to LLM with {len(messages)} messages")
-        response = self.llm.chat(messages)
+        When the LLM fails or its circuit is open, a degraded answer is
+        returned instead (see ``degraded_response``) and ``status["degraded"]``
+        names its source.
+        """
+        deadline = time.monotonic() + TURN_BUDGET
+        timings = timings if timings is not None else {}
+        status = status if status is not None else {}
+        
+        messages, relevant_chunks = self.prepare_turn(
+            query, user_id, session_id, conversation_history, timings, user
+        )
+        if messages is None:
+            return REFUSAL
+        
+        # Generate response once admitted (raises AdmissionRejected when
+        # saturated); a duplicate of a turn already in flight shares its
+        # request and takes no slot
+        llm_start = time.perf_counter()
+        try:
+            response = self.llm.chat(messages, admission=self.admitted(user_id, timings), deadline=deadline)
+        except AdmissionRejected:
+            raise
+        except (CircuitOpenError, RuntimeError) as e:
+            return self.serve_degraded(query, user_id, session_id, relevant_chunks, status, e)
+        timings["llm"] = round((time.perf_counter() - llm_start) * 1000, 2)
+        answer_cache.add(user_id, query, response)
         
-        logger.info(f"[{session_id}] Response generated: {response[:100]}...")
+        logger.info(
+            "[%s] Response of %d chars from %d messages",
+            session_id, len(response), len(messages),
+            extra={"category": "chat.turn", "session_id": session_id, "timings": timings}
+        )
         return response
+    
+    def stream_response(
+        self,
+        query: str,
+        user_id: str,
+        session_id: str,
+        conversation_history: List[Dict] = None,
+        timings: Dict[str, float] = None,
+        user: Dict = None,
+        status: Dict[str, Any] = None
+    ) -> Iterator[str]:
+        """
+        Streaming variant of ``generate_response``, yielding text deltas
+        
+        A degraded answer is yielded whole if the LLM fails before its first
+        delta. A failure after that raises RuntimeError: part of the answer
+        has already been sent.
+        """
+        start = time.perf_counter()
+        deadline = time.monotonic() + TURN_BUDGET
+        timings = timings if timings is not None else {}
+        status = status if status is not None else {}
+        
+        messages, relevant_chunks = self.prepare_turn(
+            query, user_id, session_id, conversation_history, timings, user
+        )
+        if messages is None:
+            yield REFUSAL
+            return
+        
+        llm_start = time.perf_counter()
+        parts = []
+        try:
+            for delta in self.llm.stream(messages, admission=self.admitted(user_id, timings), deadline=deadline):
+                if not parts:
+                    timings["llm_first_token"] = round((time.perf_counter() - llm_start) * 1000, 2)
+                parts.append(delta)
+                yield delta
+        except AdmissionRejected:
+            raise
+        except (CircuitOpenError, RuntimeError) as e:
+            if parts:
+                raise RuntimeError("LLM stream interrupted") from e
+            yield self.serve_degraded(query, user_id, session_id, relevant_chunks, status, e)
+            return
+        timings["llm"] = round((time.perf_counter() - llm_start) * 1000, 2)
+        response = "".join(parts)
+        answer_cache.add(user_id, query, response)
+        CHAT_RESPONSE_SECONDS.observe(time.perf_counter() - start)
+        
+        logger.info(
+            "[%s] Streamed response of %d chars from %d messages",
+            session_id, len(response), len(messages),
+            extra={"category": "chat.turn", "session_id": session_id, "timings": timings}
+        )
 
 rag_system = RAGSystem()
\ No newline at end of file
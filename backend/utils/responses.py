@@ -0,0 +1,62 @@
+"""
+Fast JSON responses for MongoDB documents.
+
+Returning a document through a route's ``response_model`` makes FastAPI
+validate and re-serialise every nested field in Python, which dominates the
+cost of large payloads such as chat histories. ``MongoJSONResponse`` hands
+the driver's documents straight to orjson instead. Since nothing filters
+the output any more, routes keep their typed ``response_model`` as the
+documented contract and read documents with ``projection(model)``, so only
+the model's top-level fields leave the database.
+"""
+from typing import Any, Dict, List, Type, Union
+import orjson
+from bson import ObjectId
+from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _expose_id(doc: Dict) -> Dict:
+    """Rename a document's "_id" to "id" in place"""
+    if "_id" in doc:
+        doc["id"] = doc.pop("_id")
+    return doc
+
+
+def projection(model: Type[BaseModel]) -> Dict[str, int]:
+    """
+    MongoDB projection of a response model's top-level fields
+
+    Args:
+        model: Response model; its "id" field is read from "_id"
+
+    Returns:
+        Projection for find / find_one
+    """
+    fields = {("_id" if name == "id" else name): 1 for name in model.model_fields}
+    fields.setdefault("_id", 0)
+    return fields
+
+
+class MongoJSONResponse(ORJSONResponse):
+    def __init__(self, content: Union[Dict, List[Dict]], **kwargs):
+        """
+        Render one document or a list of documents
+
+        Args:
+            content: Documents as returned by the driver, "_id" becomes "id"
+        """
+        if isinstance(content, list):
+            content = [_expose_id(doc) for doc in content]
+        elif isinstance(content, dict):
+            content = _expose_id(content)
+        super().__init__(content, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
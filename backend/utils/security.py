@@ -2,9 +2,10 @@ from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, status, Depends, Header
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
+import hmac
 from backend.logger import get_logger
 
 logger = get_logger("Security")
@@ -52,39 +53,66 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+def decode_token(token: str) -> Optional[dict]:
     """
-    Verify JWT token and return user email
+    Decode a JWT access token
     
     Args:
-        credentials: HTTP Authorization credentials
+        token: Encoded JWT token
         
     Returns:
-        User email from token
-        
-    Raises:
-        HTTPException: If token is invalid
+        Token claims ("sub" holds the user email, "exp" the expiry as a
+        Unix timestamp), or None if the token is invalid or expired
     """
     try:
-        token = credentials.credentials
         payload = jwt.decode(
             token,
             os.getenv("JWT_SECRET_KEY"),
             algorithms=[os.getenv("JWT_ALGORITHM")]
         )
-        email: str = payload.get("sub")
+    except JWTError as e:
+        logger.error(f"JWT verification failed: {e}")
+        return None
+    
+    return payload
+
+def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    """
+    Verify JWT token and return user email
+    
+    Args:
+        credentials: HTTP Authorization credentials
         
-        if email is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials"
-            )
+    Returns:
+        User email from token
         
-        return email
+    Raises:
+        HTTPException: If token is invalid
+    """
+    claims = decode_token(credentials.credentials)
+    email = claims.get("sub") if claims else None
     
-    except JWTError as e:
-        logger.error(f"JWT verification failed: {e}")
+    if email is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
-        )
\ No newline at end of file
+        )
+    
+    return email
+
+def verify_admin(x_admin_token: str = Header(default="")) -> bool:
+    """
+    Verify the admin token sent in the X-Admin-Token header
+    
+    Raises:
+        HTTPException: If ADMIN_TOKEN is not configured or does not match
+    """
+    admin_token = os.getenv("ADMIN_TOKEN")
+    
+    if not admin_token or not hmac.compare_digest(x_admin_token.encode(), admin_token.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    
+    return True
\ No newline at end of file
@@ -0,0 +1,497 @@
+"""
+Per-user vector index shards with lazy loading and LRU eviction.
+
+Each user's vectors and chunk metadata live in their own shard directory under ``<store_dir>/shards``. Only the manifest (user ->
+shard directory and chunk count) is read at startup; a shard is loaded on
+the user's first query, kept in an LRU bounded by a memory budget, and
+dropped after it has been idle for a while. RAM therefore follows active
+users, not registered users.
+
+The manifest is an append-only JSON-lines log (the last line for a user
+wins), so recording a write costs one line regardless of the user count.
+It is compacted at startup when it has grown well past one line per user.
+
+With a compressed VECTOR_CODEC a shard also keeps its float32 vectors in
+``vectors.npy``; they are memory-mapped, not loaded, and only the rows of a
+query's shortlist are read for the exact re-rank.
+
+The BM25 inverted index is kept only when the store searches it (sparse or
+hybrid RETRIEVAL_MODE). It is not saved; it is rebuilt from the chunk texts
+when a shard loads.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import faiss
+from backend.utils.chunk_store import ChunkStore
+from backend.utils.sparse_index import BM25Index
+from backend.utils.quantization import build_index, effective_codec, index_codec
+from backend.utils.metrics import record_cache
+from backend.logger import get_logger
+
+logger = get_logger("Shards")
+
+
+def shard_dirname(user_id: str) -> str:
+    """Filesystem-safe, stable directory name for a user's shard"""
+    return hashlib.sha1(user_id.encode("utf-8")).hexdigest()[:20]
+
+
+class ShardGeneration:
+    __slots__ = ("index", "chunks", "sparse", "vectors")
+
+    def __init__(
+        self,
+        index: faiss.Index,
+        chunks: ChunkStore,
+        sparse: Optional[BM25Index],
+        vectors: np.ndarray = None
+    ):
+        """
+        Immutable snapshot of a shard, never modified once published
+
+        Args:
+            index: FAISS index, row i is chunk i
+            chunks: Chunk metadata
+            sparse: BM25 postings over the same rows (None in dense mode)
+            vectors: Full-precision vectors for re-ranking (None for flat)
+        """
+        self.index = index
+        self.chunks = chunks
+        self.sparse = sparse
+        self.vectors = vectors
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def nbytes(self) -> int:
+        """Approximate resident bytes (codes, metadata, postings); mapped vectors are not counted"""
+        vectors = 0 if self.vectors is None or isinstance(self.vectors, np.memmap) else self.vectors.nbytes
+        sparse = 0 if self.sparse is None else self.sparse.nbytes()
+        return self.index.ntotal * self.index.code_size + self.chunks.nbytes() + sparse + vectors
+
+    def search(self, query_embedding: np.ndarray, k: int, rerank_factor: int = 4) -> List[Tuple[int, float]]:
+        """
+        Nearest rows to a query
+
+        Args:
+            query_embedding: float32 array of shape (1, dimension)
+            k: Number of rows to return
+            rerank_factor: Candidates fetched per result from compressed codes
+
+        Returns:
+            List of (row, L2 distance), closest first
+        """
+        total = self.index.ntotal
+        if total == 0:
+            return []
+
+        if self.vectors is None:
+            distances, indices = self.index.search(query_embedding, min(k, total))
+            valid = indices[0] >= 0
+            return list(zip(indices[0][valid].tolist(), distances[0][valid].tolist()))
+
+        # Shortlist on the compact codes, then exact distances for the shortlist;
+        # sorted rows keep the reads from the mapped file sequential
+        _, indices = self.index.search(query_embedding, min(k * rerank_factor, total))
+        candidates = np.sort(indices[0][indices[0] >= 0])
+        exact = ((np.asarray(self.vectors[candidates]) - query_embedding[0]) ** 2).sum(axis=1)
+        top = np.argsort(exact, kind="stable")[:k]
+        return list(zip(candidates[top].tolist(), exact[top].tolist()))
+
+
+class UserShard:
+    def __init__(self, user_id: str, dimension: int, codec: str = "flat", sparse: bool = False):
+        """
+        One user's vectors, chunk metadata and optional inverted index
+
+        Readers take ``shard.generation`` once and use only that snapshot.
+        Writers build the next generation from copies and publish it with a
+        single attribute assignment, so searches never wait for ingestion
+        and never see an index row without its metadata. Callers serialise
+        writers per shard (ShardCache.write_lock).
+
+        Args:
+            user_id: Owner of the shard
+            dimension: Embedding dimension
+            codec: Vector codec (see quantization.py)
+            sparse: Keep a BM25 index (sparse and hybrid retrieval only)
+        """
+        self.user_id = user_id
+        self.dimension = dimension
+        self.codec = codec
+        self.sparse = sparse
+        self.generation = ShardGeneration(
+            build_index(effective_codec(codec, 0), dimension),
+            ChunkStore(),
+            BM25Index() if sparse else None
+        )
+        self.version = 0
+        self.last_used = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.generation)
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    def nbytes(self) -> int:
+        return self.generation.nbytes()
+
+    def publish(self, generation: ShardGeneration):
+        """Make a new generation visible to readers"""
+        self.generation = generation
+        self.version += 1
+
+    def search(self, query_embedding: np.ndarray, k: int, rerank_factor: int = 4) -> List[Tuple[int, float]]:
+        return self.generation.search(query_embedding, k, rerank_factor)
+
+    def append(self, chunks: List[Dict], texts: List[str], embeddings: np.ndarray):
+        """
+        Publish a generation with chunks and their embeddings appended
+
+        Args:
+            chunks: Chunk dictionaries
+            texts: Chunk texts
+            embeddings: float32 embeddings, one row per chunk
+        """
+        current = self.generation
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+        start = len(current)
+
+        vectors = None
+        if self.codec == "flat":
+            index = faiss.clone_index(current.index)
+            index.add(embeddings)
+        else:
+            vectors = embeddings if current.vectors is None else np.concatenate([current.vectors, embeddings])
+            # (Re)train when the index is new or the shard grew into another codec
+            target = effective_codec(self.codec, len(vectors))
+            if not current.index.is_trained or current.index.ntotal == 0 or index_codec(current.index) != target:
+                index = build_index(target, self.dimension, vectors)
+            else:
+                index = faiss.clone_index(current.index)
+                index.add(embeddings)
+
+        store = current.chunks.copy()
+        store.append(chunks, self.user_id)
+        sparse = None
+        if self.sparse:
+            sparse = current.sparse.extended(range(start, start + len(chunks)), texts, self.user_id)
+
+        self.publish(ShardGeneration(index, store, sparse, vectors))
+
+    def remove(self, mask: np.ndarray):
+        """
+        Publish a generation without the rows selected by mask
+
+        Args:
+            mask: Boolean mask over rows
+        """
+        current = self.generation
+
+        # Remove the rows from a copy of the index (positions shift down the
+        # same way the compacted chunk store does), no re-encoding needed
+        index = faiss.clone_index(current.index)
+        index.remove_ids(np.flatnonzero(mask).astype('int64'))
+        vectors = None if current.vectors is None else np.asarray(current.vectors[~mask])
+        store = current.chunks.keep(~mask)
+        sparse = None
+        if self.sparse:
+            sparse = BM25Index()
+            sparse.rebuild(store)
+
+        self.publish(ShardGeneration(index, store, sparse, vectors))
+
+    def save(self, directory: str):
+        """Write the current generation atomically (files are replaced, never truncated)"""
+        os.makedirs(directory, exist_ok=True)
+        index_path = os.path.join(directory, "index.bin")
+        chunks_path = os.path.join(directory, "chunks.npz")
+        vectors_path = os.path.join(directory, "vectors.npy")
+        current = self.generation
+
+        faiss.write_index(current.index, index_path + ".tmp")
+        current.chunks.save(chunks_path + ".tmp")
+        if current.vectors is not None and not isinstance(current.vectors, np.memmap):
+            with open(vectors_path + ".tmp", "wb") as f:
+                np.save(f, current.vectors)
+            os.replace(vectors_path + ".tmp", vectors_path)
+            # Same rows, now served from the mapped file instead of RAM
+            mapped = np.load(vectors_path, mmap_mode="r")
+            self.publish(ShardGeneration(current.index, current.chunks, current.sparse, mapped))
+        os.replace(index_path + ".tmp", index_path)
+        os.replace(chunks_path + ".tmp", chunks_path)
+
+    @classmethod
+    def load(cls, directory: str, user_id: str, dimension: int, codec: str = "flat", sparse: bool = False) -> "UserShard":
+        shard = cls(user_id, dimension, codec, sparse)
+        index = faiss.read_index(os.path.join(directory, "index.bin"))
+        chunks = ChunkStore.load(os.path.join(directory, "chunks.npz"))
+        postings = None
+        if sparse:
+            postings = BM25Index()
+            postings.add(range(len(chunks)), chunks.texts(), user_id)
+
+        vectors = None
+        vectors_path = os.path.join(directory, "vectors.npy")
+        if codec != "flat" and os.path.exists(vectors_path):
+            vectors = np.load(vectors_path, mmap_mode="r")
+
+        # Re-encode shards written with another codec (e.g. after VECTOR_CODEC changed)
+        target = effective_codec(codec, index.ntotal)
+        recoded = index_codec(index) != target
+        if recoded:
+            if vectors is None or len(vectors) != index.ntotal:
+                vectors = index.reconstruct_n(0, index.ntotal)
+            vectors = np.asarray(vectors)
+            index = build_index(target, dimension, vectors)
+            if codec == "flat":
+                vectors = None
+
+        shard.generation = ShardGeneration(index, chunks, postings, vectors)
+        if recoded:
+            shard.save(directory)
+            logger.info(f"Re-encoded shard with {len(shard)} chunks as {target}")
+        return shard
+
+
+class ShardManifest:
+    def __init__(self, path: str):
+        """
+        Append-only record of which users have shards and how many chunks
+
+        Args:
+            path: Path of the JSON-lines manifest
+        """
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        lines = 0
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    lines += 1
+                    if entry["chunks"] > 0:
+                        self.entries[entry["user_id"]] = entry
+                    else:
+                        self.entries.pop(entry["user_id"], None)
+
+        if lines > 2 * len(self.entries) + 100:
+            self.compact()
+
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        return self.entries.get(user_id)
+
+    def users(self) -> Iterator[str]:
+        return iter(list(self.entries))
+
+    def total_chunks(self) -> int:
+        return sum(entry["chunks"] for entry in self.entries.values())
+
+    def record(self, user_id: str, chunks: int):
+        """Record a user's current chunk count (0 removes the user)"""
+        entry = {"user_id": user_id, "dir": shard_dirname(user_id), "chunks": int(chunks)}
+        with self._lock:
+            if chunks > 0:
+                self.entries[user_id] = entry
+            else:
+                self.entries.pop(user_id, None)
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def compact(self):
+        """Rewrite the log with one line per user"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+        logger.info(f"Compacted shard manifest to {len(self.entries)} users")
+
+
+class ShardCache:
+    def __init__(
+        self,
+        shards_dir: str,
+        dimension: int,
+        budget_bytes: int,
+        idle_seconds: float,
+        codec: str = "flat",
+        sparse: bool = False
+    ):
+        """
+        LRU of loaded shards bounded by a memory budget and an idle timeout
+
+        Args:
+            shards_dir: Directory holding one subdirectory per shard
+            dimension: Embedding dimension
+            budget_bytes: Resident bytes allowed across loaded shards
+            idle_seconds: Shards unused for this long are dropped
+            codec: Vector codec for new and loaded shards
+            sparse: Keep BM25 indexes in new and loaded shards
+        """
+        self.shards_dir = shards_dir
+        self.dimension = dimension
+        self.codec = codec
+        self.sparse = sparse
+        self.budget_bytes = budget_bytes
+        self.idle_seconds = idle_seconds
+        os.makedirs(shards_dir, exist_ok=True)
+
+        self.manifest = ShardManifest(os.path.join(shards_dir, "manifest.jsonl"))
+        self._loaded: "OrderedDict[str, UserShard]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+        self._writing: Dict[str, threading.Lock] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def path(self, user_id: str) -> str:
+        return os.path.join(self.shards_dir, shard_dirname(user_id))
+
+    def get(self, user_id: str, create: bool = False) -> Optional[UserShard]:
+        """
+        Return a user's shard, loading it from disk on first use
+
+        Args:
+            user_id: Owner of the shard
+            create: Return a new empty shard if the user has none
+
+        Returns:
+            UserShard, or None if the user has no shard and create is False
+        """
+        with self._lock:
+            self._evict_idle()
+            shard = self._loaded.get(user_id)
+            if shard is not None:
+                self._loaded.move_to_end(user_id)
+                shard.touch()
+                record_cache("vector_shards", True)
+                return shard
+            if user_id not in self.manifest:
+                if not create:
+                    return None
+                shard = UserShard(user_id, self.dimension, self.codec, self.sparse)
+                self._put(shard)
+                return shard
+            loading = self._loading.setdefault(user_id, threading.Lock())
+
+        # Load outside the cache lock so other users are not held up; the
+        # per-user lock keeps concurrent first queries from loading twice and
+        # excludes remove()
+        with loading:
+            try:
+                with self._lock:
+                    shard = self._loaded.get(user_id)
+                    if shard is not None:
+                        return shard
+                    if user_id not in self.manifest:
+                        # Removed while this call waited for the lock
+                        if not create:
+                            return None
+                        shard = UserShard(user_id, self.dimension, self.codec, self.sparse)
+                        self._put(shard)
+                        return shard
+
+                record_cache("vector_shards", False)
+                start = time.perf_counter()
+                shard = UserShard.load(self.path(user_id), user_id, self.dimension, self.codec, self.sparse)
+                logger.info(f"Loaded shard with {len(shard)} chunks in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+                with self._lock:
+                    self.loads += 1
+                    self._put(shard)
+                return shard
+            finally:
+                with self._lock:
+                    self._loading.pop(user_id, None)
+
+    def write_lock(self, user_id: str) -> threading.Lock:
+        """Lock serialising writers of one user's shard; readers never take it"""
+        with self._lock:
+            return self._writing.setdefault(user_id, threading.Lock())
+
+    def _put(self, shard: UserShard):
+        # The tail of the LRU must be its most recently used shard (see _evict_idle)
+        shard.touch()
+        self._loaded[shard.user_id] = shard
+        self._loaded.move_to_end(shard.user_id)
+        self._enforce_budget()
+
+    def _enforce_budget(self):
+        """Drop least recently used shards until the budget is met (keeps the newest)"""
+        total = sum(shard.nbytes() for shard in self._loaded.values())
+        while total > self.budget_bytes and len(self._loaded) > 1:
+            _, shard = self._loaded.popitem(last=False)
+            total -= shard.nbytes()
+            self.evictions += 1
+
+    def _evict_idle(self):
+        """Drop shards idle past the timeout; the LRU head is always the oldest"""
+        cutoff = time.monotonic() - self.idle_seconds
+        while self._loaded:
+            user_id, shard = next(iter(self._loaded.items()))
+            if shard.last_used >= cutoff:
+                break
+            self._loaded.popitem(last=False)
+            self.evictions += 1
+
+    def save(self, shard: UserShard):
+        """Persist a shard and record it in the manifest"""
+        if len(shard):
+            shard.save(self.path(shard.user_id))
+        self.manifest.record(shard.user_id, len(shard))
+        # Re-insert: if the shard was evicted mid-write, a copy loaded from
+        # disk in the meantime is older than this one
+        with self._lock:
+            self._put(shard)
+
+    def remove(self, user_id: str):
+        """Forget a user's shard (files are removed, manifest updated)"""
+        with self._lock:
+            loading = self._loading.setdefault(user_id, threading.Lock())
+
+        # Under the loading lock so a get() cannot load the shard back from
+        # files that are being deleted
+        with loading:
+            try:
+                with self._lock:
+                    self._loaded.pop(user_id, None)
+                self.manifest.record(user_id, 0)
+                directory = self.path(user_id)
+                for name in ("index.bin", "chunks.npz", "vectors.npy"):
+                    path = os.path.join(directory, name)
+                    if os.path.exists(path):
+                        os.remove(path)
+            finally:
+                with self._lock:
+                    self._loading.pop(user_id, None)
+
+    def user_chunk_count(self, user_id: str) -> int:
+        entry = self.manifest.get(user_id)
+        return entry["chunks"] if entry else 0
+
+    def loaded(self) -> Dict[str, UserShard]:
+        with self._lock:
+            return dict(self._loaded)
+
+    def nbytes(self) -> int:
+        return sum(shard.nbytes() for shard in self.loaded().values())
@@ -0,0 +1,103 @@
+"""
+Single-flight deduplication of identical concurrent calls.
+
+The first caller for a key runs the call; callers arriving with the same key
+while it is in flight wait for it and receive the same result (or the same
+exception). Nothing is cached: once the call finishes, the next caller runs
+it again.
+
+Waiting callers give up at their own deadline. An error that only concerns
+the caller who ran the call (see ``unshared``) is not handed on: the waiting
+callers run the call again themselves.
+"""
+import time
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+from backend.utils.metrics import SINGLEFLIGHT_SHARED, record_cache
+
+
+def hash_key(*parts: Any) -> str:
+    """Stable digest of JSON-serialisable parts, e.g. a model name and its messages"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class FlightTimeoutError(TimeoutError):
+    """Raised to a waiting caller whose deadline passed before the shared call finished"""
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, kind: str, unshared: Tuple[Type[BaseException], ...] = ()):
+        """
+        Group of deduplicated calls
+
+        Args:
+            kind: Label for the shared-call metric (e.g. llm, embedding)
+            unshared: Errors specific to the caller that ran the call, such as
+                its admission being rejected; waiting callers retry instead
+        """
+        self.kind = kind
+        self.unshared = unshared
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+
+    def do(self, key: str, func: Callable, *args, deadline: Optional[float] = None, **kwargs) -> Any:
+        """
+        Run func, or wait for an identical call already in flight
+
+        Args:
+            key: Identity of the call
+            func: Callable to run if no call with this key is in flight
+            deadline: time.monotonic() after which a waiting caller raises
+                FlightTimeoutError; not passed to func
+
+        Returns:
+            The result of the single underlying call
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+
+            # A shared call counts as a hit on the "singleflight_<kind>" cache
+            record_cache(f"singleflight_{self.kind}", not leader)
+            if leader:
+                break
+
+            SINGLEFLIGHT_SHARED.labels(kind=self.kind).inc()
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not call.event.wait(timeout):
+                raise FlightTimeoutError(f"Timed out waiting for a shared {self.kind} call")
+            if call.error is None:
+                return call.result
+            if not isinstance(call.error, self.unshared):
+                raise call.error
+            # The leader's own failure; run (or join) the call again
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
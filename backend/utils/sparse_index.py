@@ -0,0 +1,192 @@
+"""
+In-process BM25 inverted index with per-user postings.
+
+Complements the dense FAISS index with exact term matching for drug names,
+lab codes and dosages. Postings are keyed by user so a query only touches
+the caller's documents, and IDF is computed over the user's own corpus.
+Rows are the same positions used by the FAISS index and ChunkStore.
+"""
+import re
+import math
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in is it "
+    "my of on or should the this to was what when where which who why will "
+    "with you your me about any please tell".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, keeping codes like hba1c, ldl-c or 5.5 intact"""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class _UserPostings:
+    __slots__ = ("postings", "doc_len", "total_len")
+
+    def __init__(self):
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.doc_len: Dict[int, int] = {}
+        self.total_len = 0
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.2, b: float = 0.75, rare_df_ratio: float = 0.1):
+        """
+        Initialize sparse index
+
+        Args:
+            k1: BM25 term frequency saturation
+            b: BM25 length normalisation
+            rare_df_ratio: Terms in at most this fraction of a user's chunks count as rare
+        """
+        self.k1 = k1
+        self.b = b
+        self.rare_df_ratio = rare_df_ratio
+        self.users: Dict[str, _UserPostings] = {}
+
+    def add(self, rows: Iterable[int], texts: Iterable[str], user_id: str):
+        """
+        Index chunks owned by a user
+
+        Args:
+            rows: Row positions of the chunks
+            texts: Chunk texts
+            user_id: Owner of the chunks
+        """
+        user = self.users.setdefault(user_id, _UserPostings())
+        for row, text in zip(rows, texts):
+            terms = Counter(tokenize(text))
+            length = sum(terms.values())
+            user.doc_len[int(row)] = length
+            user.total_len += length
+            for term, tf in terms.items():
+                user.postings[term].append((int(row), tf))
+
+    def extended(self, rows: Iterable[int], texts: Iterable[str], user_id: str) -> "BM25Index":
+        """
+        New index with chunks added, leaving this one untouched
+
+        Posting lists of terms the new chunks do not contain are shared with
+        this index, so the cost follows the new chunks, not the corpus.
+
+        Args:
+            rows: Row positions of the chunks
+            texts: Chunk texts
+            user_id: Owner of the chunks
+
+        Returns:
+            BM25Index
+        """
+        index = BM25Index(self.k1, self.b, self.rare_df_ratio)
+        index.users = dict(self.users)
+
+        old = self.users.get(user_id)
+        user = _UserPostings()
+        if old is not None:
+            user.postings.update(old.postings)
+            user.doc_len = dict(old.doc_len)
+            user.total_len = old.total_len
+        index.users[user_id] = user
+
+        added: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for row, text in zip(rows, texts):
+            terms = Counter(tokenize(text))
+            length = sum(terms.values())
+            user.doc_len[int(row)] = length
+            user.total_len += length
+            for term, tf in terms.items():
+                added[term].append((int(row), tf))
+
+        for term, postings in added.items():
+            user.postings[term] = user.postings.get(term, []) + postings
+        return index
+
+    def rebuild(self, chunk_store):
+        """Rebuild all postings from a ChunkStore (after rows were removed)"""
+        self.users = {}
+        for user_id in chunk_store.user_table:
+            rows = chunk_store.user_positions(user_id)
+            if len(rows):
+                self.add(rows, (chunk_store.text(r) for r in rows), user_id)
+
+    def _idf(self, user: _UserPostings, df: int) -> float:
+        n = len(user.doc_len)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, user_id: str, k: int = 5) -> List[Tuple[int, float]]:
+        """
+        Score a user's chunks against a query
+
+        Args:
+            query: Search query
+            user_id: Owner whose chunks are searched
+            k: Number of results to return
+
+        Returns:
+            List of (row, score) sorted by descending score
+        """
+        user = self.users.get(user_id)
+        if user is None or not user.doc_len:
+            return []
+
+        avgdl = user.total_len / len(user.doc_len)
+        scores: Dict[int, float] = defaultdict(float)
+
+        for term in set(tokenize(query)):
+            postings = user.postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf(user, len(postings))
+            for row, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * user.doc_len[row] / avgdl)
+                scores[row] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def is_selective(self, query: str, user_id: str) -> bool:
+        """
+        True when the query is dominated by rare terms of the user's corpus
+
+        Such queries (drug names, lab codes, dosages) are answered well by
+        the sparse index alone, so the dense encode can be skipped.
+        """
+        user = self.users.get(user_id)
+        terms = set(tokenize(query))
+        if user is None or not terms or not user.doc_len:
+            return False
+
+        limit = max(1, int(self.rare_df_ratio * len(user.doc_len)))
+        rare = [t for t in terms if 0 < len(user.postings.get(t, ())) <= limit]
+        return len(rare) * 2 >= len(terms)
+
+    def nbytes(self) -> int:
+        """Approximate bytes held by postings (tuples and list slots)"""
+        total = 0
+        for user in self.users.values():
+            for term, postings in user.postings.items():
+                total += len(term) + 49 + 56 + len(postings) * (8 + 64)
+            total += len(user.doc_len) * 100
+        return total
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Fuse several ranked row lists with RRF
+
+    Args:
+        rankings: Ranked lists of rows, best first
+        k: RRF damping constant
+
+    Returns:
+        List of (row, fused score) sorted by descending score
+    """
+    scores: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            scores[row] += 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
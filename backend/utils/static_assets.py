@@ -0,0 +1,258 @@
+"""
+Precompressed, content-hashed static assets and pre-rendered pages.
+
+At startup every file under the static directory is read once, given a
+content-hashed name (``css/chat.css`` -> ``css/chat.3f2a9c1b04de.css``) and
+compressed with gzip and, when the ``brotli`` package is installed, brotli.
+Templates link assets through ``static_url()`` so hashed URLs can be cached
+forever (``immutable``); the unhashed paths keep working with revalidation.
+
+Pages that do not depend on the request are rendered once and served with
+an ETag, so a reload costs a 304 with no body.
+"""
+import os
+import gzip
+import hashlib
+import mimetypes
+from typing import Dict, Optional
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from backend.utils.metrics import record_cache
+from backend.logger import get_logger
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = get_logger("StaticAssets")
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# Compressing tiny files costs more in headers than it saves
+MIN_COMPRESS_BYTES = 512
+
+
+def parse_accept_encoding(value: str) -> Dict[str, float]:
+    """
+    Parse an Accept-Encoding header
+
+    Args:
+        value: Header value, e.g. "gzip;q=0.8, br, *;q=0"
+
+    Returns:
+        Mapping of lower-cased coding (or "*") to its q-value
+    """
+    codings = {}
+    for item in value.split(","):
+        coding, *params = (part.strip() for part in item.split(";"))
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, number = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = max(0.0, min(1.0, float(number)))
+                except ValueError:
+                    q = 0.0
+        codings[coding.lower()] = q
+    return codings
+
+
+def accepts_encoding(accept_encoding: str, coding: str) -> bool:
+    """Whether an Accept-Encoding header allows a coding (q > 0, directly or via *)"""
+    accepted = parse_accept_encoding(accept_encoding)
+    return accepted.get(coding, accepted.get("*", 0.0)) > 0
+
+
+class NegotiatedGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that honours q-values
+
+    Starlette's middleware compresses whenever the header contains the
+    substring "gzip", so ``gzip;q=0`` still got gzip. Responses that already
+    carry a Content-Encoding (precompressed assets) pass through either way.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and accepts_encoding(Headers(scope=scope).get("accept-encoding", ""), "gzip"):
+            responder = GZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+class CompressedBody:
+    __slots__ = ("identity", "gzip", "br", "digest", "etag", "media_type")
+
+    def __init__(self, body: bytes, media_type: str):
+        """
+        Hold a response body with its precompressed variants
+
+        Args:
+            body: Uncompressed body
+            media_type: Content type
+        """
+        self.identity = body
+        self.media_type = media_type
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.etag = f'"{self.digest[:16]}"'
+        self.gzip = None
+        self.br = None
+
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.gzip = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.br = brotli.compress(body, quality=11)
+
+    def nbytes(self) -> int:
+        return sum(len(b) for b in (self.identity, self.gzip, self.br) if b)
+
+    def choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        """
+        Pick the precompressed variant the client prefers
+
+        Args:
+            accept_encoding: Accept-Encoding header value
+
+        Returns:
+            "br" or "gzip", or None to send the body uncompressed
+        """
+        accepted = parse_accept_encoding(accept_encoding)
+        default = accepted.get("*", 0.0)
+        best, best_q = None, 0.0
+        # br is listed first so it wins a tie
+        for encoding in ("br", "gzip"):
+            q = accepted.get(encoding, default)
+            if getattr(self, encoding) is not None and q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    def response(self, request_headers, cache_control: str) -> Response:
+        """
+        Build a response, negotiating encoding and honouring If-None-Match
+
+        Args:
+            request_headers: Request headers
+            cache_control: Cache-Control header value
+
+        Returns:
+            200 with the best encoding the client accepts, or 304
+        """
+        headers = {
+            "ETag": self.etag,
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding"
+        }
+
+        if_none_match = request_headers.get("if-none-match", "")
+        if self.etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")) or if_none_match == "*":
+            return Response(status_code=304, headers=headers)
+
+        encoding = self.choose_encoding(request_headers.get("accept-encoding", ""))
+        if encoding:
+            body, headers["Content-Encoding"] = getattr(self, encoding), encoding
+        else:
+            body = self.identity
+
+        return Response(content=body, media_type=self.media_type, headers=headers)
+
+
+class StaticAssets:
+    def __init__(self, directory: str):
+        """
+        Load, hash and compress every file under a directory
+
+        Args:
+            directory: Static files directory
+        """
+        self.directory = directory
+        self.urls: Dict[str, str] = {}
+        self.files: Dict[str, CompressedBody] = {}
+        self.hashed = set()
+        self.load()
+
+    def load(self):
+        """(Re)load all assets from disk"""
+        urls, files, hashed = {}, {}, set()
+
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                full_path = os.path.join(root, name)
+                path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+                with open(full_path, "rb") as f:
+                    body = CompressedBody(f.read(), mimetypes.guess_type(name)[0] or "application/octet-stream")
+
+                stem, ext = os.path.splitext(path)
+                hashed_path = f"{stem}.{body.digest[:12]}{ext}"
+
+                urls[path] = hashed_path
+                files[path] = body
+                files[hashed_path] = body
+                hashed.add(hashed_path)
+
+        self.urls, self.files, self.hashed = urls, files, hashed
+        logger.info(f"Loaded {len(urls)} static assets (brotli: {brotli is not None})")
+
+    def url(self, path: str) -> str:
+        """
+        Public URL of an asset
+
+        Args:
+            path: Path relative to the static directory, e.g. css/chat.css
+
+        Returns:
+            Content-hashed URL, or the plain URL for unknown files
+        """
+        return "/static/" + self.urls.get(path.lstrip("/"), path.lstrip("/"))
+
+    def nbytes(self) -> int:
+        return sum(self.files[path].nbytes() for path in self.urls)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        """ASGI app serving assets from memory, mounted under /static"""
+        # Mount puts its prefix in root_path; strip it to get the asset path
+        path, root_path = scope["path"], scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        path = path.lstrip("/")
+
+        body = self.files.get(path)
+        if body is None or scope["method"] not in ("GET", "HEAD"):
+            status = 404 if body is None else 405
+            response = Response(status_code=status)
+        else:
+            cache_control = IMMUTABLE_CACHE if path in self.hashed else REVALIDATE_CACHE
+            response = body.response(Headers(scope=scope), cache_control)
+            # A 304 means the browser's copy was still current
+            record_cache("static_assets", response.status_code == 304)
+
+        await response(scope, receive, send)
+
+
+class PageCache:
+    def __init__(self, templates, pages: Dict[str, str]):
+        """
+        Render request-independent templates once
+
+        Args:
+            templates: Jinja2Templates instance
+            pages: Mapping of page name to template file
+        """
+        self.pages: Dict[str, CompressedBody] = {}
+        for name, template in pages.items():
+            html = templates.get_template(template).render()
+            self.pages[name] = CompressedBody(html.encode("utf-8"), "text/html; charset=utf-8")
+
+    def response(self, name: str, request_headers) -> Optional[Response]:
+        """Serve a pre-rendered page, or a 304 if the client copy is current"""
+        page = self.pages.get(name)
+        if page is None:
+            return None
+        response = page.response(request_headers, REVALIDATE_CACHE)
+        record_cache("pages", response.status_code == 304)
+        return response
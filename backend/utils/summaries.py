@@ -0,0 +1,229 @@
+"""
+Hierarchical document summaries.
+
+A document is split into sections of consecutive pages (at most
+SUMMARY_SECTION_CHARS characters each). Each section is summarized, and the
+section summaries are combined into a document summary, in rounds when there
+are too many to combine at once. The result is stored on the document's
+``pdf_documents`` record once, after upload, so summary questions are answered
+from it instead of from the three chunks vector search returns.
+
+Summaries are built in the background and go through LLM admission as a
+single "user", so they never take more than its per-user share of slots.
+Jobs are not retried automatically. A failed summary, one stuck in
+"pending" for SUMMARY_RETRY_AFTER seconds (e.g. lost in a restart), or a
+document uploaded before summaries existed can be queued again through
+``POST /api/pdf/document/{id}/summary``.
+"""
+import os
+import re
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from bson import ObjectId
+from backend.db import Database
+from backend.utils.admission import llm_admission, AdmissionRejected
+from backend.utils.circuit_breaker import CircuitOpenError
+from backend.utils.metrics import timed, MONGO_QUERY_SECONDS, SUMMARY_JOBS, SUMMARY_SECONDS
+from backend.logger import get_logger
+
+logger = get_logger("Summaries")
+
+SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "1") == "1"
+
+# Characters of document text per section summary
+SECTION_CHARS = int(os.getenv("SUMMARY_SECTION_CHARS", 6000))
+
+# Admission queue the background summaries share
+ADMISSION_USER = "background:summaries"
+
+# Attempts per LLM call while the LLM is busy or its circuit is open
+MAX_ATTEMPTS = int(os.getenv("SUMMARY_MAX_ATTEMPTS", 5))
+
+# Seconds after which a summary still "pending" counts as lost and may be queued again
+RETRY_AFTER = int(os.getenv("SUMMARY_RETRY_AFTER", 1800))
+
+PAGE_MARKER = re.compile(r"--- Page (\d+) ---")
+
+SECTION_PROMPT = (
+    "Summarize this part of the medical document \"{filename}\" ({pages}) in at "
+    "most 120 words. Keep test names, values with units, reference ranges, "
+    "diagnoses, medications and dates. Use only what the text says."
+)
+
+DOCUMENT_PROMPT = (
+    "These are summaries of consecutive parts of the medical document "
+    "\"{filename}\". Combine them into one summary of at most 200 words. Lead "
+    "with the most important findings, keep values with units and flag "
+    "anything outside its reference range. Use only what the summaries say."
+)
+
+
+def split_sections(chunks: List[Dict], max_chars: int = SECTION_CHARS) -> List[Dict]:
+    """
+    Group a document's chunks into sections of consecutive pages
+
+    Args:
+        chunks: Chunks of one document in order (see PDFProcessor.process_pdf)
+        max_chars: Largest section, in characters
+
+    Returns:
+        List of {"pages": [first, last], "text": str}
+    """
+    sections, current, size = [], None, 0
+    page = 1
+    for chunk in chunks:
+        text = chunk["text"]
+        # A chunk starts on the page of the last marker seen before it
+        start = page
+        markers = [int(number) for number in PAGE_MARKER.findall(text)]
+        if markers:
+            if text.startswith("--- Page"):
+                start = markers[0]
+            page = markers[-1]
+
+        if current is None or size + len(text) > max_chars:
+            current = {"pages": [start, page], "parts": []}
+            sections.append(current)
+            size = 0
+        current["pages"][1] = page
+        current["parts"].append(text)
+        size += len(text)
+
+    return [{"pages": section["pages"], "text": "\n".join(section["parts"])} for section in sections]
+
+
+def page_label(pages: List[int]) -> str:
+    first, last = pages
+    return f"page {first}" if first == last else f"pages {first}-{last}"
+
+
+class DocumentSummarizer:
+    def __init__(self, llm):
+        """
+        Initialize summarizer
+
+        Args:
+            llm: GroqLLM used for the summaries
+        """
+        self.llm = llm
+
+    def _complete(self, messages: List[Dict]) -> str:
+        """LLM call that waits out a busy queue or an open circuit"""
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                return self.llm.chat(messages, admission=llm_admission.slot(ADMISSION_USER))
+            except (AdmissionRejected, CircuitOpenError) as e:
+                if attempt == MAX_ATTEMPTS:
+                    raise
+                time.sleep(e.retry_after)
+
+    def summarize(self, filename: str, chunks: List[Dict]) -> Dict:
+        """
+        Summarize a document, section by section
+
+        Args:
+            filename: Document name shown to the LLM
+            chunks: Chunks of the document in order
+
+        Returns:
+            {"text": document summary, "sections": [{"pages", "summary"}]}
+        """
+        sections = []
+        for section in split_sections(chunks):
+            summary = self._complete([
+                {"role": "system", "content": SECTION_PROMPT.format(
+                    filename=filename, pages=page_label(section["pages"])
+                )},
+                {"role": "user", "content": section["text"]}
+            ])
+            sections.append({"pages": section["pages"], "summary": summary.strip()})
+
+        if len(sections) == 1:
+            return {"text": sections[0]["summary"], "sections": sections}
+
+        # Combine in rounds so no single prompt exceeds a section's size
+        summaries = [section["summary"] for section in sections]
+        while len(summaries) > 1:
+            groups, group, size = [], [], 0
+            for summary in summaries:
+                if group and size + len(summary) > SECTION_CHARS:
+                    groups.append(group)
+                    group, size = [], 0
+                group.append(summary)
+                size += len(summary)
+            groups.append(group)
+
+            summaries = [
+                self._complete([
+                    {"role": "system", "content": DOCUMENT_PROMPT.format(filename=filename)},
+                    {"role": "user", "content": "\n\n".join(group)}
+                ]).strip()
+                for group in groups
+            ]
+
+        return {"text": summaries[0], "sections": sections}
+
+    def summarize_document(self, document_id: ObjectId, filename: str, chunks: List[Dict]):
+        """
+        Build a document's summary and store it on its pdf_documents record
+
+        Meant to run as a background task after upload; failures are logged
+        and recorded as summary_status "failed".
+        """
+        db = Database.get_db()
+        try:
+            with timed(SUMMARY_SECONDS):
+                summary = self.summarize(filename, chunks)
+            summary["created_at"] = datetime.utcnow()
+            update = {"summary_status": "ready", "summary": summary}
+            SUMMARY_JOBS.labels(status="success").inc()
+            logger.info(f"Summarized {filename}: {len(summary['sections'])} sections")
+        except Exception as e:
+            update = {"summary_status": "failed"}
+            SUMMARY_JOBS.labels(status="failed").inc()
+            logger.error(f"Summary of {filename} failed: {e}")
+
+        with timed(MONGO_QUERY_SECONDS, query="summary_update"):
+            db["pdf_documents"].update_one({"_id": document_id}, {"$set": update})
+
+    def summarize_documents(self, documents: List[Dict], chunks: Dict[str, List[Dict]]):
+        """
+        Summarize newly uploaded documents one after another
+
+        Args:
+            documents: pdf_documents records with _id and filename
+            chunks: filename -> chunks of that document
+        """
+        for document in documents:
+            self.summarize_document(document["_id"], document["filename"], chunks[document["filename"]])
+
+
+def summary_context(document: Dict, max_chars: int) -> Optional[str]:
+    """
+    Render a stored summary as prompt context within a character budget
+
+    The document summary comes first; section summaries follow while they fit.
+    """
+    summary = document.get("summary")
+    if not summary:
+        return None
+
+    text = summary["text"]
+    if len(text) >= max_chars:
+        return text[:max_chars]
+
+    # A one-section document's summary is that section's summary
+    sections = summary.get("sections", [])
+    if len(sections) == 1:
+        sections = []
+
+    lines = [text]
+    size = len(text)
+    for section in sections:
+        line = f"- {page_label(section['pages']).capitalize()}: {section['summary']}"
+        if size + len(line) > max_chars:
+            break
+        lines.append(line)
+        size += len(line)
+    return "\n".join(lines)
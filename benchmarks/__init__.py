@@ -0,0 +1 @@
+"""Benchmarks and evaluation tools"""
\ No newline at end of file
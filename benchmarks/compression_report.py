@@ -0,0 +1,135 @@
+"""
+Vector codec memory vs recall report.
+
+Encodes a synthetic multi-tenant corpus (synthetic_corpus.py) once, then
+builds every user's shard with each codec and runs the labelled queries
+through the dense path. For each codec and re-rank factor it reports bytes
+per vector held in RAM, overlap with the exact float32 top k, recall@k and
+MRR against the labels, and search latency. A re-rank factor of 1 scores
+only the compressed top k, so it shows what the exact re-rank buys.
+
+Usage:
+    python -m benchmarks.compression_report --users 10 --chunks-per-user 2500 --k 5
+"""
+import json
+import time
+import argparse
+import numpy as np
+from backend.utils import quantization
+from backend.utils.quantization import CODECS, effective_codec
+from backend.utils.shards import UserShard
+from backend.utils.encoders import create_encoder
+from benchmarks.synthetic_corpus import generate
+
+
+def percentile(values: list, q: float) -> float:
+    return round(float(np.percentile(values, q)) * 1000, 3) if values else 0.0
+
+
+def build_shards(corpus: list, embeddings: dict, codec: str, dimension: int) -> dict:
+    shards = {}
+    for user_id, chunks, _ in corpus:
+        shard = UserShard(user_id, dimension, codec)
+        shard.append(chunks, [chunk["text"] for chunk in chunks], embeddings[user_id])
+        shards[user_id] = shard
+    return shards
+
+
+def evaluate(corpus: list, shards: dict, query_embeddings: dict, exact: dict, k: int, rerank_factor: int) -> dict:
+    latencies, overlap, hits, rr = [], 0.0, 0, 0.0
+    queries = 0
+
+    for user_id, _, user_queries in corpus:
+        for i, query in enumerate(user_queries):
+            vector = query_embeddings[user_id][i:i + 1]
+            start = time.perf_counter()
+            rows = [row for row, _ in shards[user_id].search(vector, k, rerank_factor)]
+            latencies.append(time.perf_counter() - start)
+
+            # Rows are in corpus order, so a row is the chunk's index
+            overlap += len(set(rows) & exact[user_id][i]) / k
+            rank = next((r + 1 for r, row in enumerate(rows) if row in set(query["relevant"])), None)
+            hits += rank is not None
+            rr += 1 / rank if rank else 0.0
+            queries += 1
+
+    return {
+        f"overlap@{k}": round(overlap / queries, 4),
+        f"recall@{k}": round(hits / queries, 4),
+        "mrr": round(rr / queries, 4),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--backend", default=None, help="Encoder backend (defaults to EMBEDDING_BACKEND)")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--chunks-per-user", type=int, default=2500)
+    parser.add_argument("--queries-per-user", type=int, default=20)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rerank-factors", default="1,4", help="Comma separated candidates per result")
+    parser.add_argument("--pq-min-train", type=int, default=quantization.PQ_MIN_TRAIN)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    quantization.PQ_MIN_TRAIN = args.pq_min_train
+    factors = [int(f) for f in args.rerank_factors.split(",")]
+
+    encoder = create_encoder(args.model, args.backend)
+    dimension = encoder.get_sentence_embedding_dimension()
+    corpus = list(generate(args.users, args.chunks_per_user, args.queries_per_user, args.seed))
+
+    start = time.perf_counter()
+    embeddings = {
+        user_id: np.asarray(encoder.encode([chunk["text"] for chunk in chunks], batch_size=128), dtype="float32")
+        for user_id, chunks, _ in corpus
+    }
+    query_embeddings = {
+        user_id: np.asarray(encoder.encode([query["query"] for query in queries]), dtype="float32")
+        for user_id, _, queries in corpus
+    }
+    encode_seconds = time.perf_counter() - start
+
+    # Exact float32 neighbours are the reference for overlap@k
+    exact_shards = build_shards(corpus, embeddings, "flat", dimension)
+    exact = {
+        user_id: [
+            {row for row, _ in exact_shards[user_id].search(query_embeddings[user_id][i:i + 1], args.k)}
+            for i in range(len(queries))
+        ]
+        for user_id, _, queries in corpus
+    }
+
+    report = {
+        "chunks": sum(len(chunks) for _, chunks, _ in corpus),
+        "dimension": dimension,
+        "encode_seconds": round(encode_seconds, 2),
+        "codecs": {}
+    }
+
+    for codec in CODECS:
+        start = time.perf_counter()
+        shards = build_shards(corpus, embeddings, codec, dimension)
+        build_seconds = time.perf_counter() - start
+
+        indexes = [shard.generation.index for shard in shards.values()]
+        vectors = sum(index.ntotal for index in indexes)
+        code_bytes = sum(index.ntotal * index.code_size for index in indexes)
+        entry = {
+            "stored_as": sorted({effective_codec(codec, len(shard)) for shard in shards.values()}),
+            "bytes_per_vector": round(code_bytes / vectors, 1),
+            "compression": round(vectors * dimension * 4 / code_bytes, 1),
+            "build_seconds": round(build_seconds, 2),
+        }
+        for factor in ([1] if codec == "flat" else factors):
+            entry[f"rerank_x{factor}"] = evaluate(corpus, shards, query_embeddings, exact, args.k, factor)
+        report["codecs"][codec] = entry
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Encoder throughput benchmark.
+
+Measures the PyTorch sentence-transformers encoder and the ONNX Runtime
+encoders (fp32 and int8): single-query latency and texts/second for bulk
+(PDF ingestion sized) workloads. Embedding parity between the backends is
+checked by tests/test_encoder_parity.py.
+
+Usage:
+    python -m benchmarks.encoder_benchmark --texts 512
+"""
+import json
+import time
+import random
+import argparse
+from backend.utils.encoders import SentenceTransformerEncoder, ONNXEncoder
+
+SAMPLE_SENTENCES = [
+    "Patient reports intermittent chest pain radiating to the left arm.",
+    "HbA1c 7.8% indicates suboptimal glycaemic control.",
+    "Metformin 500mg twice daily with meals.",
+    "LDL cholesterol 162 mg/dL, HDL 38 mg/dL, triglycerides 210 mg/dL.",
+    "No known drug allergies. Penicillin tolerated in the past.",
+    "Blood pressure 148/92 mmHg on two separate readings.",
+    "MRI of the lumbar spine shows mild disc bulge at L4-L5.",
+    "Recommend follow-up TSH and free T4 in six weeks.",
+    "Complete blood count within normal limits.",
+    "Patient advised to reduce sodium intake and increase physical activity.",
+]
+
+
+def build_texts(count: int, seed: int = 13) -> list:
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        sentences = rng.sample(SAMPLE_SENTENCES, rng.randint(1, 5))
+        texts.append(" ".join(sentences))
+    return texts
+
+
+def throughput(encoder, texts: list, batch_size: int) -> dict:
+    encoder.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+
+    start = time.perf_counter()
+    for text in texts[:64]:
+        encoder.encode([text])
+    single = (time.perf_counter() - start) / min(len(texts), 64)
+
+    start = time.perf_counter()
+    encoder.encode(texts, batch_size=batch_size)
+    bulk = time.perf_counter() - start
+
+    return {
+        "query_latency_ms": round(single * 1000, 3),
+        "bulk_texts_per_second": round(len(texts) / bulk, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    texts = build_texts(args.texts)
+
+    report = {"torch": throughput(SentenceTransformerEncoder(args.model), texts, args.batch_size)}
+
+    for name, quantize in (("onnx", False), ("onnx-int8", True)):
+        encoder = ONNXEncoder(args.model, quantize=quantize)
+        report[name] = throughput(encoder, texts, args.batch_size)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
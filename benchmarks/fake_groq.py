@@ -0,0 +1,183 @@
+"""
+Fake Groq-compatible chat completions server.
+
+Serves ``POST /openai/v1/chat/completions`` with configurable latency and
+token rate so the app can be load tested without calling the real API.
+Supports both regular and ``stream: true`` (server-sent events) responses.
+
+Usage:
+    python -m benchmarks.fake_groq --port 8900 --latency-ms 300 --tokens-per-second 600
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "rest hydrate monitor symptoms consult physician daily balanced diet "
+    "exercise sleep blood pressure glucose medication dosage follow-up"
+).split()
+
+
+class FakeGroqServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8900,
+        latency_ms: float = 300.0,
+        jitter_ms: float = 100.0,
+        tokens_per_second: float = 600.0,
+        completion_tokens: int = 200,
+        error_rate: float = 0.0
+    ):
+        """
+        Initialize fake Groq server
+
+        Args:
+            host: Bind address
+            port: Bind port (0 picks a free port)
+            latency_ms: Time to first token
+            jitter_ms: Uniform jitter added to latency_ms
+            tokens_per_second: Generation speed after the first token
+            completion_tokens: Tokens generated per completion
+            error_rate: Fraction of requests answered with HTTP 429
+        """
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.requests = 0
+
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.httpd.server_address[0]}:{self.port}"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                server.requests += 1
+
+                if server.error_rate and random.random() < server.error_rate:
+                    self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}}, {"retry-after": "1"})
+                    return
+
+                prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+                tokens = [random.choice(WORDS) for _ in range(min(server.completion_tokens, body.get("max_tokens") or server.completion_tokens))]
+
+                time.sleep(server.latency + random.uniform(0, server.jitter))
+
+                if body.get("stream"):
+                    self._stream(body.get("model", "fake"), tokens)
+                    return
+
+                time.sleep(len(tokens) / server.tokens_per_second)
+                self._send_json(200, {
+                    "id": f"chatcmpl-{random.getrandbits(48):x}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": " ".join(tokens)},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": len(tokens),
+                        "total_tokens": prompt_tokens + len(tokens)
+                    }
+                })
+
+            def _send_json(self, status: int, payload: dict, headers: dict = None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, model: str, tokens: list):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                interval = 1 / server.tokens_per_second
+                for i, token in enumerate(tokens):
+                    chunk = {
+                        "id": "chatcmpl-stream",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"content": token if i == 0 else " " + token},
+                            "finish_reason": None
+                        }]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(interval)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return Handler
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Groq-compatible server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--tokens-per-second", type=float, default=600)
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeGroqServer(
+        host=args.host,
+        port=args.port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate
+    )
+    print(f"Fake Groq listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
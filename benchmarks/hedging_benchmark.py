@@ -0,0 +1,75 @@
+"""
+Hedged LLM request benchmark.
+
+Sends the same sequence of distinct prompts through GroqLLM against the
+offline simulator (llm_simulator.py), once with hedging off and once on, and
+reports p50/p95/p99 chat latency plus the extra provider requests hedging
+cost. Both runs replay the same seeded latency draws.
+
+Usage:
+    python -m benchmarks.hedging_benchmark --requests 400 --concurrency 8 --sigma 1.0
+"""
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from backend.utils.llm import GroqLLM
+from backend.utils.llm_simulator import SimulatedProvider
+
+
+class CountingProvider(SimulatedProvider):
+    calls = 0
+
+    def complete(self, *args, **kwargs):
+        self.calls += 1
+        return super().complete(*args, **kwargs)
+
+
+def run(args, hedge: bool) -> dict:
+    os.environ["LLM_HEDGE"] = "1" if hedge else "0"
+    provider = CountingProvider(
+        seed=args.seed,
+        latency_median_ms=args.latency_ms,
+        latency_sigma=args.sigma,
+        tokens_per_second=2000,
+        completion_tokens=50
+    )
+    llm = GroqLLM(provider=provider)
+
+    def one(i: int) -> float:
+        start = time.perf_counter()
+        llm.chat([{"role": "user", "content": f"question {i}"}])
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        latencies = list(pool.map(one, range(args.requests)))
+
+    ms = np.asarray(latencies) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(ms, 95)), 1),
+        "p99_ms": round(float(np.percentile(ms, 99)), 1),
+        "provider_requests": provider.calls,
+        "extra_request_fraction": round(provider.calls / args.requests - 1, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--sigma", type=float, default=1.0, help="Log-normal latency spread (tail heaviness)")
+    parser.add_argument("--hedge-min-delay", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    os.environ["LLM_HEDGE_MIN_DELAY"] = str(args.hedge_min_delay)
+    report = {"baseline": run(args, hedge=False), "hedged": run(args, hedge=True)}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
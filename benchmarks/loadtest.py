@@ -0,0 +1,347 @@
+"""
+Reproducible load test for the chat API.
+
+Boots ``backend.main:app`` in a uvicorn subprocess against a local Mongo
+stand-in (mongomock by default, or any --mongo-uri) and the fake Groq server,
+then drives a weighted mix of signin, chat, upload and session-history
+traffic from concurrent virtual users. Reports throughput and p50/p95/p99
+latency per endpoint as JSON.
+
+Usage:
+    python -m benchmarks.loadtest --users 20 --duration 60 --output report.json
+    python -m benchmarks.loadtest --baseline report.json --max-regression 0.2
+
+With --baseline, exits non-zero if any endpoint's p95 grew by more than
+--max-regression (relative) compared to the baseline report.
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+import httpx
+from benchmarks.fake_groq import FakeGroqServer
+
+DEFAULT_MIX = {
+    "signin": 0.10,
+    "chat": 0.50,
+    "sessions": 0.20,
+    "session_detail": 0.15,
+    "upload": 0.05,
+}
+
+CHAT_PROMPTS = [
+    "Hi, how are you?",
+    "What does my blood test report say about cholesterol?",
+    "Is it safe to take ibuprofen with my current medications?",
+    "Summarize my lab report",
+    "How much sleep should I get with high blood pressure?",
+    "What foods should I avoid with diabetes?",
+]
+
+
+def build_pdf(lines: list) -> bytes:
+    """Build a minimal single-page PDF containing the given text lines"""
+    stream = "BT /F1 11 Tf 50 780 Td 14 TL " + " ".join(
+        "(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") '" for line in lines
+    ) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def sample_report(seed: int) -> bytes:
+    rng = random.Random(seed)
+    lines = [
+        "Laboratory Report",
+        f"HbA1c: {rng.uniform(5.0, 9.0):.1f} %",
+        f"LDL cholesterol: {rng.randint(80, 190)} mg/dL",
+        f"Blood pressure: {rng.randint(110, 160)}/{rng.randint(70, 100)} mmHg",
+        f"Medication: Metformin {rng.choice([500, 850, 1000])} mg twice daily",
+        "Recommendation: follow-up in three months.",
+    ]
+    return build_pdf(lines * 6)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        if ok:
+            self.latencies[endpoint].append(seconds * 1000)
+        else:
+            self.errors[endpoint] += 1
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            values = self.latencies[endpoint]
+            endpoints[endpoint] = {
+                "requests": len(values),
+                "errors": self.errors[endpoint],
+                "throughput_rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        return {
+            "elapsed_seconds": round(elapsed, 2),
+            "total_requests": total,
+            "total_errors": sum(self.errors.values()),
+            "throughput_rps": round(total / elapsed, 2),
+            "endpoints": endpoints,
+        }
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, index: int, recorder: Recorder, mix: dict):
+        self.client = client
+        self.email = f"bench{index}@example.com"
+        self.username = f"bench_user_{index}"
+        self.password = "bench-password"
+        self.recorder = recorder
+        self.mix = mix
+        self.token = None
+        self.session_ids = []
+        self.rng = random.Random(index)
+
+    async def timed(self, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.recorder.record(endpoint, time.perf_counter() - start, ok)
+        return response
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+    async def setup(self):
+        await self.client.post("/api/auth/signup", json={
+            "username": self.username,
+            "email": self.email,
+            "password": self.password
+        })
+        await self.signin()
+
+    async def signin(self):
+        response = await self.timed("signin", "POST", "/api/auth/signin", json={
+            "email": self.email,
+            "password": self.password
+        })
+        if response is not None and response.status_code == 200:
+            self.token = response.json()["access_token"]
+
+    async def chat(self):
+        payload = {"message": self.rng.choice(CHAT_PROMPTS)}
+        if self.session_ids and self.rng.random() < 0.7:
+            payload["session_id"] = self.rng.choice(self.session_ids)
+        response = await self.timed("chat", "POST", "/api/chat/message", json=payload, headers=self.headers)
+        if response is not None and response.status_code == 200:
+            session_id = response.json()["session_id"]
+            if session_id not in self.session_ids:
+                self.session_ids.append(session_id)
+
+    async def sessions(self):
+        await self.timed("sessions", "GET", "/api/chat/sessions", headers=self.headers)
+
+    async def session_detail(self):
+        if not self.session_ids:
+            return await self.chat()
+        session_id = self.rng.choice(self.session_ids)
+        await self.timed("session_detail", "GET", f"/api/chat/session/{session_id}", headers=self.headers)
+
+    async def upload(self):
+        files = {"file": (f"report_{self.rng.randint(0, 10**6)}.pdf", sample_report(self.rng.randint(0, 10**6)), "application/pdf")}
+        await self.timed("upload", "POST", "/api/pdf/upload", files=files, headers=self.headers)
+
+    async def run(self, deadline: float):
+        operations = list(self.mix)
+        weights = [self.mix[op] for op in operations]
+        while time.perf_counter() < deadline:
+            operation = self.rng.choices(operations, weights)[0]
+            await getattr(self, operation)()
+
+
+async def drive(base_url: str, users: int, duration: float, mix: dict) -> dict:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=users * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        virtual_users = [VirtualUser(client, i, recorder, mix) for i in range(users)]
+        await asyncio.gather(*(user.setup() for user in virtual_users))
+        recorder.latencies.clear()
+        recorder.errors.clear()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user.run(start + duration) for user in virtual_users))
+        elapsed = time.perf_counter() - start
+
+    return recorder.report(elapsed)
+
+
+def wait_for_app(base_url: str, process: subprocess.Popen, timeout: float = 300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Application process exited during startup")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("Application did not become healthy in time")
+
+
+def compare(report: dict, baseline: dict, max_regression: float) -> list:
+    regressions = []
+    for endpoint, stats in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(endpoint)
+        if not previous or not previous["p95_ms"]:
+            continue
+        change = (stats["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"]
+        if change > max_regression:
+            regressions.append(f"{endpoint}: p95 {previous['p95_ms']}ms -> {stats['p95_ms']}ms (+{change:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="Measured run time in seconds")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--mix", type=json.loads, default=DEFAULT_MIX, help="JSON endpoint weights")
+    parser.add_argument("--mongo-uri", default="mongomock://localhost", help="Mongo URI, mongomock:// for in-process")
+    parser.add_argument("--llm-provider", choices=["fake-groq", "simulator"], default="fake-groq",
+                        help="HTTP fake Groq server, or the in-process LLM simulator")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=600)
+    parser.add_argument("--llm-completion-tokens", type=int, default=200)
+    parser.add_argument("--app-url", help="Benchmark an already running app instead of booting one")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="Baseline report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.mongo_uri.startswith("mongomock://") and args.workers > 1 and not args.app_url:
+        parser.error("mongomock keeps data per process; use --workers 1 or a real --mongo-uri")
+
+    fake_groq = None
+    process = None
+    workdir = tempfile.mkdtemp(prefix="healthbot-bench-")
+    base_url = args.app_url
+
+    try:
+        if not base_url:
+            fake_groq = FakeGroqServer(
+                port=0,
+                latency_ms=args.llm_latency_ms,
+                jitter_ms=args.llm_jitter_ms,
+                tokens_per_second=args.llm_tokens_per_second,
+                completion_tokens=args.llm_completion_tokens
+            ).start()
+
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            env = dict(
+                os.environ,
+                MONGO_URI=args.mongo_uri,
+                MONGO_DB_NAME="healthbot_bench",
+                JWT_SECRET_KEY="bench-secret",
+                JWT_ALGORITHM="HS256",
+                GROQ_API_KEY="bench-key",
+                GROQ_BASE_URL=fake_groq.base_url,
+                VECTOR_STORE_DIR=os.path.join(workdir, "vector_store"),
+                DOCUMENTS_DIR=os.path.join(workdir, "documents"),
+            )
+            if args.llm_provider == "simulator":
+                env.update(
+                    LLM_PROVIDER="simulator",
+                    LLM_SIM_LATENCY_MS=str(args.llm_latency_ms),
+                    LLM_SIM_TOKENS_PER_SECOND=str(args.llm_tokens_per_second),
+                    LLM_SIM_COMPLETION_TOKENS=str(args.llm_completion_tokens),
+                )
+            process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "backend.main:app",
+                 "--host", "127.0.0.1", "--port", str(port),
+                 "--workers", str(args.workers), "--log-level", "warning"],
+                env=env
+            )
+            wait_for_app(base_url, process)
+
+        report = asyncio.run(drive(base_url, args.users, args.duration, args.mix))
+        report["config"] = {
+            "users": args.users,
+            "duration": args.duration,
+            "workers": args.workers,
+            "mix": args.mix,
+            "llm_provider": args.llm_provider,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_tokens_per_second": args.llm_tokens_per_second,
+        }
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        if fake_groq is not None:
+            fake_groq.stop()
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        if regressions:
+            print("Regressions detected:\n  " + "\n  ".join(regressions), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
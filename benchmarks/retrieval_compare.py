@@ -0,0 +1,107 @@
+"""
+Dense vs sparse vs hybrid retrieval comparison.
+
+Ingests a synthetic multi-tenant corpus (synthetic_corpus.py) into a fresh
+VectorStore and runs its labelled queries under each RETRIEVAL_MODE,
+reporting recall@k, MRR and search latency, split into exact-term queries
+(drug names, lab codes) and paraphrases. For hybrid mode it also reports the
+fraction of queries answered by the sparse index alone, which skip the
+query encode.
+
+Usage:
+    python -m benchmarks.retrieval_compare --users 20 --chunks-per-user 200 --k 5
+"""
+import json
+import time
+import tempfile
+import argparse
+import numpy as np
+from backend.utils.embeddings import VectorStore
+from backend.utils.encoders import create_encoder
+from benchmarks.synthetic_corpus import generate
+
+MODES = ("dense", "sparse", "hybrid")
+
+
+def percentile(values: list, q: float) -> float:
+    return round(float(np.percentile(values, q)) * 1000, 3) if values else 0.0
+
+
+def evaluate(store: VectorStore, corpus: list, mode: str, k: int) -> dict:
+    store.retrieval_mode = mode
+    results = {}
+
+    for user_id, chunks, queries in corpus:
+        docs = max(1, len(chunks) // 8)
+        for query in queries:
+            start = time.perf_counter()
+            hits = store.search(query["query"], user_id, k=k)
+            elapsed = time.perf_counter() - start
+
+            # (source, chunk_id) identifies the chunk's index in the user's corpus
+            positions = [
+                int(hit["source"].rsplit("_", 1)[1].split(".")[0]) + hit["chunk_id"] * docs
+                for hit in hits
+            ]
+            relevant = set(query["relevant"])
+            rank = next((i + 1 for i, pos in enumerate(positions) if pos in relevant), None)
+
+            for kind in ("all", query["kind"]):
+                bucket = results.setdefault(kind, {"latencies": [], "hits": 0, "rr": 0.0, "sparse_only": 0})
+                bucket["latencies"].append(elapsed)
+                bucket["hits"] += rank is not None
+                bucket["rr"] += 1 / rank if rank else 0.0
+                bucket["sparse_only"] += bool(hits) and hits[0].get("retrieval") == "sparse"
+
+    report = {}
+    for kind, bucket in results.items():
+        n = len(bucket["latencies"])
+        report[kind] = {
+            "queries": n,
+            f"recall@{k}": round(bucket["hits"] / n, 4),
+            "mrr": round(bucket["rr"] / n, 4),
+            "p50_ms": percentile(bucket["latencies"], 50),
+            "p95_ms": percentile(bucket["latencies"], 95),
+            "sparse_only_fraction": round(bucket["sparse_only"] / n, 4)
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--backend", default=None, help="Encoder backend (defaults to EMBEDDING_BACKEND)")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--chunks-per-user", type=int, default=200)
+    parser.add_argument("--queries-per-user", type=int, default=10)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    corpus = list(generate(args.users, args.chunks_per_user, args.queries_per_user, args.seed))
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        # Built for hybrid so the shards keep BM25 postings; evaluate() switches modes
+        store = VectorStore(
+            store_dir=store_dir,
+            encoder=create_encoder(args.model, args.backend),
+            retrieval_mode="hybrid"
+        )
+
+        start = time.perf_counter()
+        for user_id, chunks, _ in corpus:
+            store.add_documents(chunks, user_id)
+        ingest_seconds = time.perf_counter() - start
+
+        report = {
+            "chunks": store.memory_usage()["chunks"],
+            "ingest_seconds": round(ingest_seconds, 2),
+            "memory": store.memory_usage(),
+            "modes": {mode: evaluate(store, corpus, mode, args.k) for mode in MODES}
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
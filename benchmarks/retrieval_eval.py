@@ -0,0 +1,297 @@
+"""
+Retrieval quality and latency regression harness.
+
+Ingests a synthetic multi-tenant medical corpus (synthetic_corpus.py),
+generated at any scale or loaded from a file written with --save-corpus,
+into a fresh VectorStore. Its labelled queries are then run through
+VectorStore.search. The JSON report covers:
+
+    quality   recall@k and MRR, overall and for exact-term / paraphrase queries
+    ingest    chunks per second, encode time and index build time, all
+              measured inside VectorStore.add_documents
+    memory    process RSS growth and peak, and VectorStore.memory_usage()
+    latency   p50 / p95 / p99 search latency and single-thread QPS
+
+A hit counts as relevant if it contains the labelled fact of a relevant
+chunk, so the labels survive --rechunk. That option joins each synthetic
+document back together and splits it with PDFProcessor.chunk_text, so
+chunking changes can be compared too. The corpus is generated and ingested
+one user at a time, so 1M chunks need only the store itself in memory.
+
+With --baseline, the report is compared to an earlier one. The exit status
+is 1 if quality, p99 latency or ingest throughput regressed beyond the
+given tolerances.
+
+Logs go to stderr, so stdout carries only the JSON report.
+
+Usage:
+    python -m benchmarks.retrieval_eval --users 50 --chunks-per-user 400 --output report.json
+    python -m benchmarks.retrieval_eval --users 1000 --chunks-per-user 1000 --codec sq8 --shard-cache-mb 2048
+    python -m benchmarks.retrieval_eval --corpus corpus.jsonl --rechunk --chunk-size 400 --baseline report.json
+"""
+import sys
+import json
+import time
+import resource
+import tempfile
+import argparse
+from collections import defaultdict
+from typing import Dict, Iterator, List, Tuple
+import numpy as np
+from backend.logger import set_stream
+from backend.utils.embeddings import VectorStore
+from backend.utils.encoders import create_encoder
+from backend.utils.memory import process_rss
+from backend.utils.pdf_processor import PDFProcessor
+from benchmarks import synthetic_corpus
+from benchmarks.synthetic_corpus import fact
+
+
+class TimedEncoder:
+    def __init__(self, encoder):
+        """
+        Encoder wrapper that adds up the time spent encoding
+
+        Args:
+            encoder: Encoder used by the VectorStore
+        """
+        self.encoder = encoder
+        self.seconds = 0.0
+
+    def encode(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.encoder.encode(*args, **kwargs)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def __getattr__(self, name):
+        return getattr(self.encoder, name)
+
+
+def percentile(values: list, q: float) -> float:
+    return round(float(np.percentile(values, q)) * 1000, 3) if values else 0.0
+
+
+def peak_rss() -> int:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def rechunk(chunks: List[Dict], processor: PDFProcessor, chunk_size: int, overlap: int) -> List[Dict]:
+    """Rejoin a user's synthetic documents and split them with PDFProcessor.chunk_text"""
+    documents = defaultdict(list)
+    for chunk in sorted(chunks, key=lambda chunk: chunk["chunk_id"]):
+        documents[chunk["source"]].append(chunk["text"])
+
+    result = []
+    for source, texts in documents.items():
+        pieces = processor.chunk_text(" ".join(texts), chunk_size, overlap)
+        result.extend(
+            {"text": text, "source": source, "chunk_id": i, "total_chunks": len(pieces)}
+            for i, text in enumerate(pieces)
+        )
+    return result
+
+
+def ingest(store: VectorStore, corpus: Iterator, args) -> Tuple[List[Tuple], Dict]:
+    """
+    Add every user's chunks to the store
+
+    Returns:
+        (labelled queries as (user_id, query, kind, relevant facts), ingest stats)
+    """
+    processor = PDFProcessor(upload_dir=tempfile.gettempdir()) if args.rechunk else None
+    queries, chunks_added, seconds = [], 0, 0.0
+
+    # Only add_documents is timed; generating and re-chunking the corpus is not ingest
+    for user_id, chunks, user_queries in corpus:
+        for query in user_queries:
+            facts = {fact(chunks[i]["text"]) for i in query["relevant"]}
+            queries.append((user_id, query["query"], query["kind"], facts))
+
+        if processor:
+            chunks = rechunk(chunks, processor, args.chunk_size, args.overlap)
+        start = time.perf_counter()
+        store.add_documents(chunks, user_id, args.batch_size)
+        seconds += time.perf_counter() - start
+        chunks_added += len(chunks)
+
+    encode_seconds = store.model.seconds
+    return queries, {
+        "chunks": chunks_added,
+        "seconds": round(seconds, 2),
+        "chunks_per_second": round(chunks_added / seconds, 1) if seconds else 0.0,
+        "encode_seconds": round(encode_seconds, 2),
+        "index_build_seconds": round(seconds - encode_seconds, 2)
+    }
+
+
+def evaluate(store: VectorStore, queries: List[Tuple], k: int) -> Tuple[Dict, Dict]:
+    """
+    Run the labelled queries
+
+    Returns:
+        (quality per query kind, latency stats)
+    """
+    buckets = defaultdict(lambda: {"queries": 0, "hits": 0, "rr": 0.0})
+    latencies = []
+
+    for user_id, query, kind, facts in queries:
+        start = time.perf_counter()
+        hits = store.search(query, user_id, k=k)
+        latencies.append(time.perf_counter() - start)
+
+        rank = next(
+            (i + 1 for i, hit in enumerate(hits) if any(f in hit["text"] for f in facts)),
+            None
+        )
+        for name in ("all", kind):
+            bucket = buckets[name]
+            bucket["queries"] += 1
+            bucket["hits"] += rank is not None
+            bucket["rr"] += 1 / rank if rank else 0.0
+
+    quality = {
+        name: {
+            "queries": bucket["queries"],
+            f"recall@{k}": round(bucket["hits"] / bucket["queries"], 4),
+            "mrr": round(bucket["rr"] / bucket["queries"], 4)
+        }
+        for name, bucket in buckets.items()
+    }
+    latency = {
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "qps": round(len(latencies) / sum(latencies), 1) if latencies else 0.0
+    }
+    return quality, latency
+
+
+def compare(report: Dict, baseline: Dict, args) -> Dict:
+    """Differences from a baseline report, and the ones beyond tolerance"""
+    recall = f"recall@{report['config']['k']}"
+    current = {
+        recall: report["quality"]["all"][recall],
+        "mrr": report["quality"]["all"]["mrr"],
+        "p99_ms": report["latency"]["p99_ms"],
+        "chunks_per_second": report["ingest"]["chunks_per_second"]
+    }
+    previous = {
+        recall: baseline["quality"]["all"].get(recall),
+        "mrr": baseline["quality"]["all"]["mrr"],
+        "p99_ms": baseline["latency"]["p99_ms"],
+        "chunks_per_second": baseline["ingest"]["chunks_per_second"]
+    }
+    regressed = {
+        recall: lambda now, before: before - now > args.max_quality_drop,
+        "mrr": lambda now, before: before - now > args.max_quality_drop,
+        "p99_ms": lambda now, before: now > before * (1 + args.max_latency_increase),
+        "chunks_per_second": lambda now, before: now < before * (1 - args.max_throughput_drop)
+    }
+
+    deltas, regressions = {}, []
+    for name, now in current.items():
+        before = previous[name]
+        # A baseline run with a different k has no comparable recall
+        if before is None:
+            continue
+        deltas[name] = round(now - before, 4)
+        if regressed[name](now, before):
+            regressions.append(name)
+    return {"deltas": deltas, "regressions": regressions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--backend", default=None, help="Encoder backend (defaults to EMBEDDING_BACKEND)")
+    parser.add_argument("--codec", default=None, help="flat, fp16, sq8 or pq (defaults to VECTOR_CODEC)")
+    parser.add_argument("--retrieval-mode", default=None, help="dense, sparse or hybrid (defaults to RETRIEVAL_MODE)")
+    parser.add_argument("--shard-cache-mb", type=int, default=None, help="Loaded shard budget (defaults to SHARD_CACHE_MB)")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--chunks-per-user", type=int, default=400)
+    parser.add_argument("--queries-per-user", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--corpus", default=None, help="Load the corpus from this file instead of generating it")
+    parser.add_argument("--save-corpus", default=None, help="Also write the generated corpus to this file")
+    parser.add_argument("--rechunk", action="store_true", help="Re-split documents with PDFProcessor.chunk_text")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=128, help="Texts per encoder forward pass")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--output", default=None, help="Write the report here as well as to stdout")
+    parser.add_argument("--baseline", default=None, help="Earlier report to compare against")
+    parser.add_argument("--max-quality-drop", type=float, default=0.01, help="Absolute recall/MRR drop allowed")
+    parser.add_argument("--max-latency-increase", type=float, default=0.2, help="Relative p99 increase allowed")
+    parser.add_argument("--max-throughput-drop", type=float, default=0.2, help="Relative ingest throughput drop allowed")
+    args = parser.parse_args()
+    set_stream(sys.stderr)
+
+    if args.corpus:
+        corpus = synthetic_corpus.load(args.corpus)
+    else:
+        corpus = synthetic_corpus.generate(args.users, args.chunks_per_user, args.queries_per_user, args.seed)
+        if args.save_corpus:
+            corpus = synthetic_corpus.save(args.save_corpus, corpus)
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        encoder = TimedEncoder(create_encoder(args.model, args.backend))
+        store = VectorStore(
+            store_dir=store_dir,
+            encoder=encoder,
+            retrieval_mode=args.retrieval_mode,
+            codec=args.codec
+        )
+        if args.shard_cache_mb is not None:
+            store.shards.budget_bytes = args.shard_cache_mb * 1024 * 1024
+
+        rss_before = process_rss()
+        queries, ingest_stats = ingest(store, corpus, args)
+        rss_after = process_rss()
+
+        quality, latency = evaluate(store, queries, args.k)
+        usage = store.memory_usage()
+
+        report = {
+            "config": {
+                "model": args.model,
+                "backend": args.backend,
+                "codec": store.codec,
+                "retrieval_mode": store.retrieval_mode,
+                "corpus": args.corpus or "generated",
+                "users": usage["users"],
+                "chunks": usage["chunks"],
+                "queries": len(queries),
+                "rechunk": args.chunk_size if args.rechunk else None,
+                "k": args.k,
+                "seed": args.seed
+            },
+            "quality": quality,
+            "ingest": ingest_stats,
+            "memory": {
+                "rss_growth_bytes": rss_after - rss_before,
+                "peak_rss_bytes": peak_rss(),
+                "store": usage
+            },
+            "latency": latency
+        }
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(report, json.load(f), args)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+    if report.get("comparison", {}).get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
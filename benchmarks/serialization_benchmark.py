@@ -0,0 +1,129 @@
+"""
+Session history serialisation benchmark.
+
+Serves the same chat session through two minimal apps: the previous setup
+(generic dict response model, default JSON encoder, no compression) and the
+current one (typed ChatSession contract, document rendered by orjson through
+MongoJSONResponse, GZip middleware). Requests are driven straight through
+the ASGI interface, so the timings are server time only.
+
+Usage:
+    python -m benchmarks.serialization_benchmark --messages 400 --requests 200
+"""
+import json
+import time
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from backend.models import ChatSession
+from backend.utils.responses import MongoJSONResponse
+from benchmarks.encoder_benchmark import SAMPLE_SENTENCES
+
+
+def build_session(messages: int) -> dict:
+    start = datetime(2024, 1, 1)
+    return {
+        "_id": ObjectId(),
+        "user_id": str(ObjectId()),
+        "title": "Questions about my blood results",
+        "created_at": start,
+        "updated_at": start + timedelta(minutes=messages),
+        "messages": [
+            {
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": " ".join(SAMPLE_SENTENCES[(i + j) % len(SAMPLE_SENTENCES)] for j in range(1 + i % 2 * 6)),
+                "timestamp": start + timedelta(minutes=i)
+            }
+            for i in range(messages)
+        ]
+    }
+
+
+def baseline_app(session: dict) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/session", response_model=dict)
+    async def get_session():
+        doc = dict(session)
+        doc["id"] = str(doc.pop("_id"))
+        return doc
+
+    return app
+
+
+def current_app(session: dict, minimum_size: int) -> FastAPI:
+    app = FastAPI(default_response_class=ORJSONResponse)
+    app.add_middleware(GZipMiddleware, minimum_size=minimum_size, compresslevel=6)
+
+    @app.get("/session", response_model=ChatSession)
+    async def get_session():
+        return MongoJSONResponse(dict(session))
+
+    return app
+
+
+async def _request(app: FastAPI) -> dict:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/session", "raw_path": b"/session",
+        "root_path": "", "query_string": b"", "server": ("bench", 80), "client": ("bench", 1),
+        "headers": [(b"accept-encoding", b"gzip")]
+    }
+    response = {"body": b"", "headers": {}}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["headers"] = {k.decode(): v.decode() for k, v in message["headers"]}
+        else:
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response
+
+
+async def _measure(app: FastAPI, requests: int) -> dict:
+    await _request(app)  # warm-up
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = await _request(app)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "ms_per_request": round(elapsed / requests * 1000, 3),
+        "wire_bytes": len(response["body"]),
+        "content_encoding": response["headers"].get("content-encoding", "identity")
+    }
+
+
+def measure(app: FastAPI, requests: int) -> dict:
+    return asyncio.run(_measure(app, requests))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=400)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--gzip-min-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    session = build_session(args.messages)
+    report = {
+        "baseline": measure(baseline_app(session), args.requests),
+        "current": measure(current_app(session, args.gzip_min_size), args.requests)
+    }
+    report["speedup"] = round(report["baseline"]["ms_per_request"] / report["current"]["ms_per_request"], 2)
+    report["bytes_ratio"] = round(report["current"]["wire_bytes"] / report["baseline"]["wire_bytes"], 3)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Synthetic multi-tenant medical corpus with labelled queries.
+
+Each chunk mentions a drug with a dosage, a lab code with a value, or a
+narrative finding. Queries are generated for a known target chunk, either
+as exact-term lookups ("What dose of Metformin am I taking?") or as
+paraphrases without the rare term, so retrieval quality can be measured.
+"""
+import re
+import json
+import random
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+DRUGS = [
+    "Metformin", "Lisinopril", "Atorvastatin", "Levothyroxine", "Amlodipine",
+    "Omeprazole", "Losartan", "Simvastatin", "Gabapentin", "Hydrochlorothiazide",
+    "Sertraline", "Montelukast", "Rosuvastatin", "Escitalopram", "Pantoprazole",
+    "Furosemide", "Prednisone", "Tamsulosin", "Clopidogrel", "Warfarin",
+    "Apixaban", "Insulin glargine", "Empagliflozin", "Sitagliptin", "Carvedilol",
+]
+
+LABS = [
+    ("HbA1c", "%", (4.5, 11.0)), ("LDL-C", "mg/dL", (60, 220)), ("HDL-C", "mg/dL", (25, 90)),
+    ("TSH", "mIU/L", (0.2, 8.0)), ("eGFR", "mL/min", (20, 120)), ("ALT", "U/L", (8, 120)),
+    ("AST", "U/L", (8, 110)), ("CRP", "mg/L", (0.1, 40)), ("Ferritin", "ng/mL", (10, 600)),
+    ("Vitamin-D", "ng/mL", (8, 80)), ("Creatinine", "mg/dL", (0.5, 3.0)), ("PSA", "ng/mL", (0.1, 12)),
+]
+
+FINDINGS = [
+    ("mild degenerative changes in the lumbar spine", "Is there anything wrong with my back?"),
+    ("sinus rhythm with no acute ischaemic changes", "What did the heart tracing show?"),
+    ("clear lung fields with no consolidation", "Are my lungs okay on the x-ray?"),
+    ("fatty infiltration of the liver", "What did the scan say about my liver?"),
+    ("small benign cyst in the left kidney", "Was anything found in my kidneys?"),
+    ("normal left ventricular function", "How is my heart pumping?"),
+    ("iron deficiency pattern on blood film", "Why am I so tired according to my bloods?"),
+    ("elevated blood pressure on repeated readings", "Is my blood pressure a concern?"),
+]
+
+FILLER = [
+    "Patient seen in clinic today.", "Reviewed with the consultant.",
+    "Advised to continue current management.", "Follow-up arranged in three months.",
+    "Discussed lifestyle modification including diet and exercise.",
+    "No new symptoms reported since last visit.",
+]
+
+
+# The sentence in each chunk that a query is about
+FACT = re.compile(r"(?:Current medication|Laboratory result|Imaging/assessment report): [^\n]*?\.(?=\s|$)")
+
+
+def fact(text: str) -> Optional[str]:
+    """The labelled fact in a synthetic chunk, or None"""
+    match = FACT.search(text)
+    return match.group(0) if match else None
+
+
+def _chunk(rng: random.Random) -> Tuple[str, str, str]:
+    """Return (text, exact query, paraphrase query) for one synthetic chunk"""
+    kind = rng.random()
+    filler = " ".join(rng.sample(FILLER, 2))
+
+    if kind < 0.4:
+        drug = rng.choice(DRUGS)
+        dose = rng.choice([2.5, 5, 10, 20, 25, 40, 50, 100, 250, 500, 850, 1000])
+        frequency = rng.choice(["once daily", "twice daily", "at night", "every morning"])
+        text = f"{filler} Current medication: {drug} {dose}mg {frequency}."
+        return text, f"What dose of {drug} am I taking?", "What medication am I currently prescribed and how often?"
+
+    if kind < 0.8:
+        code, unit, (low, high) = rng.choice(LABS)
+        value = round(rng.uniform(low, high), 1)
+        text = f"{filler} Laboratory result: {code} {value} {unit}."
+        return text, f"What was my {code} result?", "What did my latest blood test show?"
+
+    finding, paraphrase = rng.choice(FINDINGS)
+    text = f"{filler} Imaging/assessment report: {finding}."
+    return text, f"Does my report mention {finding}?", paraphrase
+
+
+def generate(
+    users: int,
+    chunks_per_user: int,
+    queries_per_user: int = 5,
+    seed: int = 7
+) -> Iterator[Tuple[str, List[Dict], List[Dict]]]:
+    """
+    Generate a corpus user by user
+
+    Args:
+        users: Number of tenants
+        chunks_per_user: Chunks owned by each tenant
+        queries_per_user: Labelled queries per tenant
+        seed: Random seed
+
+    Yields:
+        (user_id, chunks, queries) where each query has "query", "kind"
+        ("exact" or "paraphrase"), "target" (index into chunks) and
+        "relevant" (indices of every chunk the query is a valid answer for)
+    """
+    rng = random.Random(seed)
+    for u in range(users):
+        user_id = f"user{u:07d}"
+        chunks, labels = [], []
+        docs = max(1, chunks_per_user // 8)
+        for i in range(chunks_per_user):
+            text, exact, paraphrase = _chunk(rng)
+            chunks.append({
+                "text": text,
+                "source": f"{user_id}_report_{i % docs}.pdf",
+                "chunk_id": i // docs,
+                "total_chunks": 8
+            })
+            labels.append((exact, paraphrase))
+
+        queries = []
+        for _ in range(min(queries_per_user, chunks_per_user)):
+            target = rng.randrange(chunks_per_user)
+            exact, paraphrase = labels[target]
+            kind = "exact" if rng.random() < 0.6 else "paraphrase"
+            query = exact if kind == "exact" else paraphrase
+            column = 0 if kind == "exact" else 1
+            queries.append({
+                "query": query,
+                "kind": kind,
+                "target": target,
+                "relevant": [i for i, label in enumerate(labels) if label[column] == query]
+            })
+
+        yield user_id, chunks, queries
+
+
+def save(path: str, corpus: Iterable[Tuple[str, List[Dict], List[Dict]]]) -> Iterator[Tuple[str, List[Dict], List[Dict]]]:
+    """
+    Write a corpus to JSON lines (one user per line) while passing it through
+
+    Args:
+        path: Output file
+        corpus: (user_id, chunks, queries) as yielded by generate()
+    """
+    with open(path, "w") as f:
+        for user_id, chunks, queries in corpus:
+            f.write(json.dumps({"user_id": user_id, "chunks": chunks, "queries": queries}) + "\n")
+            yield user_id, chunks, queries
+
+
+def load(path: str) -> Iterator[Tuple[str, List[Dict], List[Dict]]]:
+    """Read a corpus written by save(), one user at a time"""
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            yield record["user_id"], record["chunks"], record["queries"]
@@ -0,0 +1,74 @@
+"""
+Embedding parity between the ONNX Runtime encoders and PyTorch.
+
+The ONNX backends replace sentence-transformers at query and ingestion
+time, so their embeddings must point the same way as the reference model's
+or stored vectors and new queries stop matching. Skipped unless both
+onnxruntime and sentence-transformers are installed.
+
+Run with:
+    python -m pytest tests/test_encoder_parity.py
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("sentence_transformers")
+
+from backend.utils.encoders import SentenceTransformerEncoder, ONNXEncoder
+
+MODEL = "all-MiniLM-L6-v2"
+
+TEXTS = [
+    "Patient reports intermittent chest pain radiating to the left arm.",
+    "HbA1c 7.8% indicates suboptimal glycaemic control.",
+    "Metformin 500mg twice daily with meals.",
+    "LDL cholesterol 162 mg/dL, HDL 38 mg/dL, triglycerides 210 mg/dL.",
+    "No known drug allergies. Penicillin tolerated in the past.",
+    "Blood pressure 148/92 mmHg on two separate readings.",
+    "MRI of the lumbar spine shows mild disc bulge at L4-L5.",
+    "Recommend follow-up TSH and free T4 in six weeks.",
+    "Complete blood count within normal limits.",
+    "Patient advised to reduce sodium intake and increase physical activity.",
+    "What was my last cholesterol result?",
+    "Summarise the radiology report. " * 40,
+]
+
+
+def cosines(reference: np.ndarray, candidate: np.ndarray) -> np.ndarray:
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    return (reference * candidate).sum(axis=1)
+
+
+@pytest.fixture(scope="module")
+def reference_embeddings() -> np.ndarray:
+    return SentenceTransformerEncoder(MODEL).encode(TEXTS, batch_size=4)
+
+
+@pytest.fixture(scope="module")
+def onnx_dir(tmp_path_factory) -> str:
+    return str(tmp_path_factory.mktemp("onnx"))
+
+
+@pytest.mark.parametrize("quantize, min_cosine, mean_cosine", [
+    (False, 0.999, 0.9995),
+    (True, 0.97, 0.99),
+])
+def test_onnx_matches_torch(reference_embeddings, onnx_dir, quantize, min_cosine, mean_cosine):
+    encoder = ONNXEncoder(MODEL, cache_dir=onnx_dir, quantize=quantize)
+    embeddings = encoder.encode(TEXTS, batch_size=4)
+
+    assert embeddings.shape == reference_embeddings.shape
+    result = cosines(reference_embeddings, embeddings)
+    assert result.min() >= min_cosine
+    assert result.mean() >= mean_cosine
+
+
+def test_onnx_single_and_batched_agree(onnx_dir):
+    # Padding inside a batch must not change a text's embedding
+    encoder = ONNXEncoder(MODEL, cache_dir=onnx_dir)
+    batched = encoder.encode(TEXTS, batch_size=len(TEXTS))
+    single = np.vstack([encoder.encode([text]) for text in TEXTS])
+
+    assert cosines(batched, single).min() >= 0.9999